@@ -1,34 +1,39 @@
-import gc
+import logging
 import os
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Literal, Optional
 
 from dotenv import load_dotenv
-from util.supabase_client_creator import get_supabase_client
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sentence_transformers import SentenceTransformer
 import asyncio
 import controllers.auth as auth
-from huggingface_hub import snapshot_download
+import controllers.admin as admin
+from util.model_artifacts import MODEL_PATH, ensure_model_artifacts
+from util.profiler import SlowRequestProfiler, install_profile_signal_handler, PROFILE_SLOW_REQUESTS_MS
+from util.logging_config import RequestIdMiddleware, configure_logging, log_payload
+from util.embedding_output import (base64_body, encode_all, iter_base64_body, iter_binary_body,
+                                   iter_embedding_chunks, iter_json_body, json_body)
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Texts per model.encode call. Bounds memory per request and lets concurrent
+# requests take turns on the model between batches.
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+# Larger requests are rejected with 413
+EMBED_MAX_TEXTS = int(os.environ.get("EMBED_MAX_TEXTS", "100000"))
+# Requests with more texts than this are streamed batch by batch unless "stream" says otherwise
+EMBED_STREAM_THRESHOLD = int(os.environ.get("EMBED_STREAM_THRESHOLD", "1024"))
 
 
-MODEL_PATH = "embedding_model/danishbert-cosine-embeddings"
 # The API will use a regular synchronous function (def) for this endpoint,
 # which FastAPI automatically runs in a thread pool to avoid blocking the event loop.
 # Default is 40 threads for per worker - 40 concurrenct requests.
 
-HF_TOKEN = os.environ.get("HF_TOKEN")
-
-os.makedirs("embedding_model", exist_ok=True)
-
-snapshot_download(
-    repo_id="heizetagram/danishbert-cosine-embeddings",
-    local_dir="embedding_model",
-    local_dir_use_symlinks=False,
-    use_auth_token=True
-)
-
 app = FastAPI(
     title="Sentence Transformer Embedding Service",
     description="Generates embeddings for input text using a fine-tuned Sentence Transformer model."
@@ -42,29 +47,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Off unless PROFILE_SLOW_REQUESTS_MS is set; kill -USR2 and /admin/profile (with ADMIN_TOKEN) need no setup
+if PROFILE_SLOW_REQUESTS_MS:
+    app.add_middleware(SlowRequestProfiler)
+app.add_middleware(RequestIdMiddleware)
 
 model: SentenceTransformer = None
+# One forward pass at a time: torch already uses every core for a batch
+_encode_lock = threading.Lock()
 
 
 @app.on_event("startup")
 def startup_event():
     """Load the Sentence Transformer model on app startup."""
     global model
-    print("Running script...")
-    print(f"Loading SentenceTransformer model from: {MODEL_PATH}...")
+    install_profile_signal_handler()
+    logger.info(f"Loading SentenceTransformer model from: {MODEL_PATH}...")
     try:
-        # Load the local fine-tuned model
-        model = SentenceTransformer(MODEL_PATH)
+        # Load the local fine-tuned model; only files failing their checksum are downloaded
+        model = SentenceTransformer(ensure_model_artifacts())
         total_params = sum(p.numel() for p in model.parameters())
-        print(f"Model loaded with {total_params} parameters.")
-    except Exception as e:
-        print(f"Error loading model: {e}")
+        logger.info(f"Model loaded with {total_params} parameters.")
+    except Exception:
+        logger.exception("Error loading model")
         # Re-raise the exception
         # For simplicity here, we assume a successful load or the app will fail fast
         raise
 
 
 app.include_router(auth.router)
+app.include_router(admin.router)
 
 # --- Pydantic Models ---
 
@@ -73,6 +85,14 @@ class EmbedRequest(BaseModel):
     """Schema for the incoming embedding request."""
     # Pydantic automatically validates that 'texts' is a list of strings
     texts: List[str]
+    format: Literal["json", "binary", "base64"] = Field(
+        "json", description="json: {\"embeddings\": [[...]]}; binary: raw little-endian vectors, one after another; base64: those bytes base64-encoded in JSON.")
+    dtype: Literal["float32", "float16"] = Field(
+        "float32", description="Element type of binary and base64 output (json is rounded to it).")
+    batch_size: Optional[int] = Field(
+        None, gt=0, description="Texts per model.encode call, at most EMBED_BATCH_SIZE.")
+    stream: Optional[bool] = Field(
+        None, description="Stream the response batch by batch. Defaults to true above EMBED_STREAM_THRESHOLD texts.")
 
 
 class EmbedResponse(BaseModel):
@@ -82,11 +102,23 @@ class EmbedResponse(BaseModel):
 
 
 # --- API ENDPOINT ---
+
+def encode_batch(texts: List[str]):
+    with _encode_lock:
+        return model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+# response_model documents the json format; the endpoint returns a Response, so
+# FastAPI does not validate or re-encode the vectors.
 @app.post("/embed", response_model=EmbedResponse)
-def embed_text(request_data: EmbedRequest) -> Dict[str, Any]:
+def embed_text(request_data: EmbedRequest) -> Response:
     """
     Generates embedding vectors for the provided list of texts.
 
+    Texts are encoded EMBED_BATCH_SIZE at a time. Binary output has the headers
+    X-Embedding-Count, X-Embedding-Dim and X-Embedding-Dtype; read it with
+    np.frombuffer(body, "<f4").reshape(count, dim) ("<f2" for float16).
+
     Since this is a synchronous function (def), FastAPI runs it in a background 
     thread to prevent the CPU-intensive operation from blocking the main event loop.
     """
@@ -95,41 +127,44 @@ def embed_text(request_data: EmbedRequest) -> Dict[str, Any]:
             status_code=503, detail="Embedding model not loaded")
 
     texts = request_data.texts
-    print(f"this is text obj: {texts}")
+    if len(texts) > EMBED_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {EMBED_MAX_TEXTS} texts per request")
+    log_payload(logger, "Embed request", texts, texts=len(texts))
+
+    batch_size = min(request_data.batch_size or EMBED_BATCH_SIZE, EMBED_BATCH_SIZE)
+    dim = model.get_sentence_embedding_dimension()
+    dtype = request_data.dtype
+    headers = {"X-Embedding-Count": str(len(texts)), "X-Embedding-Dim": str(dim), "X-Embedding-Dtype": dtype}
+    media_type = "application/octet-stream" if request_data.format == "binary" else "application/json"
+    stream = request_data.stream if request_data.stream is not None else len(texts) > EMBED_STREAM_THRESHOLD
+
+    if stream:
+        # Starlette runs this generator in the thread pool, one batch at a time. An error
+        # after the first batch can only end the stream early; the client sees a short body.
+        chunks = iter_embedding_chunks(encode_batch, texts, batch_size, dtype)
+        if request_data.format == "binary":
+            body = iter_binary_body(chunks)
+        elif request_data.format == "base64":
+            body = iter_base64_body(chunks, dtype, len(texts), dim)
+        else:
+            body = iter_json_body(chunks)
+        return StreamingResponse(body, media_type=media_type, headers=headers)
+
     try:
         # (CPU-bound)
-        embeddings = model.encode(texts)
-        print(embeddings.shape)  # output dimension size
-        response = {"embeddings": embeddings}
-
-        del embeddings
-        gc.collect()
-
-        return response
-
+        embeddings = encode_all(encode_batch, texts, batch_size, dim, dtype)
     except Exception as e:
-        print(f"Encoding error: {e}")
+        logger.exception("Encoding error")
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred during embedding generation: {str(e)}"
         )
 
-# fetch_similiar_items  rpc call on supabase
-
-
-async def fetch_similar_votings_from_supabase(embedding: EmbedResponse, match_count: int, match_threshold: float):
-    supabase = await get_supabase_client()
-    params = {
-        "query_embedding": embedding,
-        "match_count": match_count,
-        "match_threshold": match_threshold,
-    }
-    reponse = (supabase.rpc("fetch_similar_items", params).execute())
-
-    print(reponse)
-
+    if request_data.format == "binary":
+        return Response(embeddings.tobytes(), media_type=media_type, headers=headers)
+    if request_data.format == "base64":
+        return Response(base64_body(embeddings, dtype), media_type=media_type, headers=headers)
+    return Response(json_body(embeddings), media_type=media_type, headers=headers)
 
 # uvicorn application:app --reload --host 0.0.0.0 --port 5001
 # used for running the script
-
-# fetch similar items
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Recall@k and latency of the IVF (ANN) index compared with exact search.
+
+Uses the stored embeddings from Supabase by default, or a synthetic
+clustered corpus with --synthetic N (runs offline).
+
+    python -m folketingetApi.benchmarks.ann_recall --k 10 --nprobe 1 2 4 8 16 32
+    python -m folketingetApi.benchmarks.ann_recall --synthetic 100000
+"""
+import argparse
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from folketingetApi.util.ivf_index import IVFIndex
+
+load_dotenv()
+
+
+def load_matrix(args) -> np.ndarray:
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        centers = rng.normal(size=(max(1, args.synthetic // 200), args.dim))
+        matrix = centers[rng.integers(len(centers), size=args.synthetic)] + rng.normal(0, 0.6, size=(args.synthetic, args.dim))
+        matrix = matrix.astype(np.float32)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    from folketingetApi.repositories.search_backends import SearchCorpus
+    return SearchCorpus.load_from_supabase().matrix
+
+
+def exact_top_k(matrix, query, k):
+    scores = matrix @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def ann_top_k(index, matrix, query, k, nprobe):
+    ids, scores = index.search(matrix, query, nprobe)
+    if len(ids) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[top], scores[top]
+    return ids[np.argsort(-scores)]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--noise", type=float, default=0.05, help="Std. dev. of noise added to sampled query vectors")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of Supabase")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    matrix = load_matrix(args)
+    print(f"Corpus: {matrix.shape[0]} x {matrix.shape[1]}")
+
+    index, build_seconds = timed(IVFIndex.build, matrix, args.n_lists)
+    print(f"Built IVF index with {index.n_lists} lists in {build_seconds:.2f}s")
+
+    rng = np.random.default_rng(args.seed)
+    queries = matrix[rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)]
+    queries = queries + rng.normal(0, args.noise, size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact_results, exact_latencies = [], []
+    for query in queries:
+        ids, seconds = timed(exact_top_k, matrix, query, args.k)
+        exact_results.append(set(ids.tolist()))
+        exact_latencies.append(seconds)
+
+    print(f"\n{'method':<12} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'speedup':>8}")
+    exact_p50 = np.percentile(exact_latencies, 50) * 1000
+    print(f"{'exact':<12} {1.0:>10.3f} {exact_p50:>9.3f} {np.percentile(exact_latencies, 95) * 1000:>9.3f} {1.0:>7.1f}x")
+
+    for nprobe in args.nprobe:
+        recalls, latencies = [], []
+        for query, expected in zip(queries, exact_results):
+            ids, seconds = timed(ann_top_k, index, matrix, query, args.k, nprobe)
+            recalls.append(len(expected & set(ids.tolist())) / args.k)
+            latencies.append(seconds)
+        p50 = np.percentile(latencies, 50) * 1000
+        print(f"{'nprobe=' + str(nprobe):<12} {np.mean(recalls):>10.3f} {p50:>9.3f} "
+              f"{np.percentile(latencies, 95) * 1000:>9.3f} {exact_p50 / p50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Local stand-in for the Supabase REST API (PostgREST), for offline load tests.
+
+Serves the tables and RPCs the API uses from generated fixture rows (or a JSON
+file of exported rows), with a configurable delay per request:
+
+- POST /rest/v1/rpc/fetch_similar_items_v2 ranks the fixtures by cosine similarity
+- POST /rest/v1/rpc/get_user_saved_votes, save_user_afstemning, delete_user_afstemning
+- GET  /rest/v1/afstemninger_bert_v2 (select / order / offset / limit) for the local backends
+- GET  /rest/v1/data_versions
+
+    python -m folketingetApi.benchmarks.fake_supabase --port 54321 --rows 2000 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+EMBEDDING_DIM = 768
+EMBEDDING_COLUMN = "embedding_v5"
+WORDS = ["lov", "forslag", "skat", "klima", "energi", "landbrug", "sundhed", "skole", "forsvar", "udlændinge",
+         "pension", "bolig", "transport", "miljø", "beskæftigelse", "kommune", "region", "ændring", "afgift", "støtte"]
+
+
+def generate_rows(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Rows shaped like afstemninger_bert_v2, with unit-length embeddings stored as JSON strings."""
+    rng = np.random.default_rng(seed)
+    words = random.Random(seed)
+    embeddings = rng.normal(size=(count, EMBEDDING_DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    rows = []
+    for i in range(count):
+        title = " ".join(words.choices(WORDS, k=8))
+        resume = " ".join(words.choices(WORDS, k=90))
+        rows.append({
+            "afstemning_id": i + 1,
+            "sag_id": 10000 + i,
+            "titel": f"Forslag til lov om {title}",
+            "titelkort": f"L {i % 250 + 1} {title[:40]}",
+            "resume": resume,
+            "konklusion": "Forslaget blev vedtaget." if i % 3 else "Forslaget blev forkastet.",
+            "afstemning_dato": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00",
+            "sagstrin_titel": "3. behandling",
+            "vedtaget": bool(i % 3),
+            "type_id": 1,
+            "opdateringsdato": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}T12:00:00",
+            "embedding_text": f"{title}. {resume}",
+            EMBEDDING_COLUMN: json.dumps([round(float(x), 6) for x in embeddings[i]]),
+        })
+    return rows
+
+
+def create_app(rows: List[Dict[str, Any]], latency_ms: float = 0.0, jitter_ms: float = 0.0) -> Starlette:
+    index_by_id = {row["afstemning_id"]: i for i, row in enumerate(rows)}
+    public_rows = [{k: v for k, v in row.items() if k != EMBEDDING_COLUMN} for row in rows]
+    matrix = np.array([json.loads(row[EMBEDDING_COLUMN]) for row in rows], dtype=np.float32)
+    saved_votes: Dict[str, List[int]] = defaultdict(list)
+
+    async def delay():
+        wait = latency_ms + (random.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+        if wait > 0:
+            await asyncio.sleep(wait / 1000)
+
+    async def rpc(request: Request):
+        await delay()
+        name = request.path_params["name"]
+        params = await request.json()
+
+        if name == "fetch_similar_items_v2":
+            query = np.asarray(params["query_embedding"], dtype=np.float32)
+            scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+            order = np.argsort(-scores)[:int(params.get("match_count", 10))]
+            threshold = float(params.get("match_threshold", 0.0))
+            return JSONResponse([{**public_rows[i], "similarity": float(scores[i])}
+                                 for i in order if scores[i] > threshold])
+        if name == "get_user_saved_votes":
+            return JSONResponse([public_rows[index_by_id[vid]] for vid in saved_votes[params["user_id"]]
+                                 if vid in index_by_id])
+        if name == "save_user_afstemning":
+            votes = saved_votes[params["p_user_id"]]
+            if params["p_afstemning_id"] not in votes:
+                votes.append(params["p_afstemning_id"])
+            return JSONResponse(None)
+        if name == "delete_user_afstemning":
+            votes = saved_votes[params["p_user_id"]]
+            if params["p_afstemning_id"] in votes:
+                votes.remove(params["p_afstemning_id"])
+            return JSONResponse(None)
+        return JSONResponse({"message": f"Could not find the function public.{name}"}, status_code=404)
+
+    async def table(request: Request):
+        await delay()
+        name = request.path_params["name"]
+        if name == "data_versions":
+            return JSONResponse([{"version": "fixture-1"}])
+        if name != "afstemninger_bert_v2":
+            return JSONResponse({"message": f"relation public.{name} does not exist"}, status_code=404)
+
+        columns = request.query_params.get("select", "*").split(",")
+        offset = int(request.query_params.get("offset", 0))
+        limit: Optional[str] = request.query_params.get("limit")
+        page = rows[offset:offset + int(limit)] if limit else rows[offset:]
+        if columns != ["*"]:
+            page = [{column: row.get(column) for column in columns} for row in page]
+        return JSONResponse(page)
+
+    return Starlette(routes=[
+        Route("/rest/v1/rpc/{name}", rpc, methods=["POST"]),
+        Route("/rest/v1/{name}", table, methods=["GET"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--fixtures", help="JSON file with exported rows instead of generated ones")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        with open(args.fixtures, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    else:
+        rows = generate_rows(args.rows, args.seed)
+
+    import uvicorn
+
+    uvicorn.run(create_app(rows, args.latency_ms, args.jitter_ms), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
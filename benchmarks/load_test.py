@@ -0,0 +1,272 @@
+"""
+Offline load test of the search API against a local Supabase stand-in.
+
+Starts benchmarks/fake_supabase.py and the controllers/search.py app (with a
+stub embedding model unless --real-model) as subprocesses, drives each
+scenario with --concurrency parallel clients for --duration seconds and
+reports p50/p95/p99 latency and requests per second. Results are written as
+JSON (to the committed baseline, or --output) so changes show in review, and
+--compare exits non-zero when p95 or throughput regress by more than
+--tolerance; a comparison run only writes a report when --output is given.
+
+    python -m folketingetApi.benchmarks.load_test
+    python -m folketingetApi.benchmarks.load_test --concurrency 32 --supabase-latency-ms 30 --model-latency-ms 15
+    python -m folketingetApi.benchmarks.load_test --compare folketingetApi/benchmarks/baselines/load_test.json
+
+The auth endpoints need Supabase Auth and are not covered.
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "load_test.json")
+QUERIES = ["klima", "skat på arbejde", "L 123", "grøn omstilling af landbruget", "forsvarsforlig", "folkeskolen",
+           "udlændinge og integration", "pension", "boligstøtte", "kollektiv trafik", "sundhedsvæsenet",
+           "afgift på benzin", "energiafgift", "kommunernes økonomi", "miljøbeskyttelse", "børnepasning"]
+# Fake key; the Supabase client only checks that one is set
+FAKE_SUPABASE_KEY = "fake-service-role-key"
+
+
+class StubEncoder:
+    """Deterministic stand-in for the SentenceTransformer; latency_ms simulates the forward pass."""
+
+    def __init__(self, latency_ms: float = 0.0, dim: int = 768):
+        self.latency = latency_ms / 1000
+        self.dim = dim
+
+    def parameters(self):
+        return []
+
+    def tokenize(self, texts):
+        return {"input_ids": [text.split() for text in texts]}
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        self.tokenize(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = np.stack([
+            np.random.default_rng(int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)).normal(size=self.dim)
+            for text in texts
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def serve_app(port: int, real_model: bool, model_latency_ms: float):
+    """Entry point of the API subprocess."""
+    import uvicorn
+    import folketingetApi.services.search_service as search_service
+
+    if not real_model:
+        search_service.ensure_model_artifacts = lambda: search_service.MODEL_PATH
+        search_service.load_encoder = lambda path, backend: StubEncoder(model_latency_ms)
+        search_service.set_torch_threads = lambda threads: None
+
+    from folketingetApi.controllers.search import app
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until(check: Callable[[], bool], timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{what} did not start within {timeout:.0f}s")
+
+
+def scenarios() -> Dict[str, Callable[[int], Tuple[str, str, Dict[str, Any]]]]:
+    """Name -> function of a request counter returning (method, path, request kwargs)."""
+    unique = itertools.count()
+    return {
+        "health": lambda i: ("GET", "/health", {}),
+        # A small set of repeated queries: served from the result cache after the first round
+        "search_cached": lambda i: ("POST", "/search", {"json": {"query_text": QUERIES[i % len(QUERIES)], "match_count": 20}}),
+        # Every query is new: embedding plus a fetch_similar_items_v2 call
+        "search_uncached": lambda i: ("POST", "/search", {"json": {"query_text": f"{QUERIES[i % len(QUERIES)]} {next(unique)}", "match_count": 20}}),
+        "search_paged": lambda i: ("POST", "/search", {"json": {"query_text": QUERIES[i % len(QUERIES)], "page_size": 20}}),
+        "saved_votes": lambda i: ("GET", "/vote/saved-votings", {"headers": {"Authorization": f"Bearer user-{i % 50}"}}),
+        "save_vote": lambda i: ("POST", "/vote/save-voting", {"json": {"voting_id": i % 2000 + 1},
+                                                             "headers": {"Authorization": f"Bearer user-{i % 50}"}}),
+    }
+
+
+async def run_scenario(clients, make_request, duration: float) -> Dict[str, Any]:
+    """Every client is one user sending requests back to back."""
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def user(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, path, kwargs = make_request(next(counter))
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(client) for client in clients))
+    elapsed = time.perf_counter() - started
+
+    values = np.array(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+async def run_load(base_url: str, names: List[str], concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    import httpx
+
+    results = {}
+    # One connection per user: users sharing a pool queue behind each other's
+    # requests, which on a small machine dominates the tail of fast endpoints
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    async with contextlib.AsyncExitStack() as stack:
+        clients = [await stack.enter_async_context(httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30))
+                   for _ in range(concurrency)]
+        for name, make_request in scenarios().items():
+            if name not in names:
+                continue
+            if warmup:
+                await run_scenario(clients, make_request, warmup)
+            results[name] = await run_scenario(clients, make_request, duration)
+            print(f"{name:<16} {results[name]['requests']:>8} {results[name]['errors']:>7} {results[name]['rps']:>9.1f} "
+                  f"{results[name]['p50_ms']:>9.2f} {results[name]['p95_ms']:>9.2f} {results[name]['p99_ms']:>9.2f}")
+    return results
+
+
+def compare(results: Dict[str, Any], baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {previous['rps']} -> {current['rps']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--scenarios", default=",".join(scenarios()), help="Comma-separated subset")
+    parser.add_argument("--rows", type=int, default=2000, help="Fixture rows served by the fake Supabase")
+    parser.add_argument("--supabase-latency-ms", type=float, default=10)
+    parser.add_argument("--model-latency-ms", type=float, default=5, help="Simulated forward pass of the stub model")
+    parser.add_argument("--search-backend", default="rpc", choices=["rpc", "local", "ann"])
+    parser.add_argument("--real-model", action="store_true", help="Load the real model instead of the stub")
+    parser.add_argument("--output", help=f"Report path (default: {os.path.relpath(BASELINE_PATH)} unless --compare)")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--serve-app", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_app:
+        serve_app(args.serve_app, args.real_model, args.model_latency_ms)
+        return
+    # A comparison run must not overwrite the baseline it compares against
+    output = args.output or (None if args.compare else BASELINE_PATH)
+    if output and args.compare and os.path.abspath(output) == os.path.abspath(args.compare):
+        parser.error("--output and --compare must be different files")
+
+    import httpx
+
+    supabase_port, app_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        "SUPABASE_URL": f"http://127.0.0.1:{supabase_port}",
+        "SUPABASE_KEY": FAKE_SUPABASE_KEY,
+        "SUPABASE_ANON_KEY": FAKE_SUPABASE_KEY,
+        "SEARCH_BACKEND": args.search_backend,
+        "HF_HUB_OFFLINE": "1",
+    }
+    module = "folketingetApi.benchmarks"
+    processes = [
+        subprocess.Popen([sys.executable, "-m", f"{module}.fake_supabase", "--port", str(supabase_port),
+                          "--rows", str(args.rows), "--latency-ms", str(args.supabase_latency_ms)], env=env),
+        subprocess.Popen([sys.executable, "-m", f"{module}.load_test", "--serve-app", str(app_port),
+                          "--model-latency-ms", str(args.model_latency_ms)] + (["--real-model"] if args.real_model else []),
+                         env=env, stdout=subprocess.DEVNULL),
+    ]
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        # /ready does not touch Supabase with the rpc backend, so wait for it separately
+        wait_until(lambda: httpx.get(f"{env['SUPABASE_URL']}/rest/v1/data_versions").status_code == 200, 60,
+                   "The fake Supabase")
+        wait_until(lambda: httpx.get(f"{base_url}/ready").status_code == 200, 180, "The API")
+        print(f"{'scenario':<16} {'requests':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        results = asyncio.run(run_load(base_url, args.scenarios.split(","), args.concurrency, args.duration, args.warmup))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    cached, uncached = results.get("search_cached"), results.get("search_uncached")
+    if cached and uncached and cached["p95_ms"] >= uncached["p95_ms"]:
+        # Cache hits skip the model and the database, so this means the machine (or the load generator) is saturated
+        print(f"WARNING search_cached p95 ({cached['p95_ms']} ms) is not below search_uncached "
+              f"({uncached['p95_ms']} ms); do not record this run as a baseline")
+
+    report = {
+        "settings": {key: getattr(args, key) for key in ["concurrency", "duration", "rows", "supabase_latency_ms",
+                                                         "model_latency_ms", "search_backend", "real_model"]},
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Memory, latency and top-k agreement of quantized first-pass scans with exact rescoring.
+
+Uses the stored embeddings from Supabase by default, or a synthetic
+clustered corpus with --synthetic N. The search backends create a Supabase
+client on import, so SUPABASE_URL / SUPABASE_KEY must be set either way
+(any value works with --synthetic).
+
+    python -m folketingetApi.benchmarks.quantization --k 10
+    python -m folketingetApi.benchmarks.quantization --synthetic 30000 --backend ann
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from folketingetApi.repositories.search_backends import (  # noqa: E402
+    AnnSearchBackend,
+    LocalVectorSearchBackend,
+    SearchCorpus,
+)
+from folketingetApi.benchmarks.ann_recall import load_matrix  # noqa: E402
+
+
+def make_loader(rows, matrix):
+    # Each backend gets its own corpus object, since quantizing replaces the matrix
+    return lambda: SearchCorpus(list(rows), matrix.copy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backend", choices=["local", "ann"], default="local")
+    parser.add_argument("--noise", type=float, default=0.05, help="Std. dev. of noise added to sampled query vectors")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic vectors instead of Supabase")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        matrix = load_matrix(args)
+        rows = [{"afstemning_id": i} for i in range(len(matrix))]
+    else:
+        corpus = SearchCorpus.load_from_supabase()
+        matrix, rows = corpus.matrix, corpus.rows
+    print(f"Corpus: {matrix.shape[0]} x {matrix.shape[1]}")
+
+    rng = np.random.default_rng(args.seed)
+    queries = matrix[rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)]
+    queries = queries + rng.normal(0, args.noise, size=queries.shape).astype(np.float32)
+
+    backend_class = AnnSearchBackend if args.backend == "ann" else LocalVectorSearchBackend
+    reference = None
+    print(f"\n{'quantization':<13} {'RAM MB':>8} {'p50 ms':>9} {'p95 ms':>9} {'top-' + str(args.k) + ' same':>11} {'overlap':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for kind in ["none", "float16", "int8"]:
+            extra = {"index_path": f"{tmp_dir}/ivf_index.npz"} if args.backend == "ann" else {}
+            backend = backend_class(loader=make_loader(rows, matrix), quantization=kind,
+                                    vectors_path=f"{tmp_dir}/embeddings_{kind}.npy", **extra)
+            corpus = backend.corpus
+            ram = corpus.quantized.nbytes if corpus.quantized is not None else corpus.matrix.nbytes
+
+            results, latencies = [], []
+            for query in queries:
+                started = time.perf_counter()
+                found = backend.search_sync("", query, args.k, -1.0)
+                latencies.append(time.perf_counter() - started)
+                results.append([row["afstemning_id"] for row in found])
+
+            if reference is None:
+                reference = results
+            same = np.mean([a == b for a, b in zip(results, reference)])
+            overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(results, reference)])
+            print(f"{kind:<13} {ram / 1e6:>8.1f} {np.percentile(latencies, 50) * 1000:>9.3f} "
+                  f"{np.percentile(latencies, 95) * 1000:>9.3f} {same * 100:>10.1f}% {overlap * 100:>7.1f}%")
+
+
+if __name__ == "__main__":
+    main()
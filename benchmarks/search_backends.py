@@ -0,0 +1,78 @@
+"""
+Compares the Supabase RPC search backend with the local NumPy backend.
+
+Query vectors are taken from the corpus itself (with a little noise), so no
+embedding model is needed. Requires SUPABASE_URL / SUPABASE_KEY.
+
+    python -m folketingetApi.benchmarks.search_backends --queries 50 --match-count 20
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from folketingetApi.repositories.search_backends import (  # noqa: E402
+    LocalVectorSearchBackend,
+    SearchCorpus,
+    SupabaseRpcSearchBackend,
+)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+async def run(backend, queries, match_count, match_threshold):
+    latencies, results = [], []
+    for query_text, embedding in queries:
+        started = time.perf_counter()
+        results.append(await backend.search(query_text, embedding, match_count, match_threshold))
+        latencies.append(time.perf_counter() - started)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--match-count", type=int, default=20)
+    parser.add_argument("--match-threshold", type=float, default=0.5)
+    parser.add_argument("--noise", type=float, default=0.05, help="Std. dev. of noise added to sampled query vectors")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    corpus = SearchCorpus.load_from_supabase()
+    print(f"Loaded {len(corpus)} rows ({corpus.matrix.nbytes / 1e6:.1f} MB matrix) in {time.perf_counter() - started:.2f}s")
+
+    rng = np.random.default_rng(args.seed)
+    picks = rng.choice(len(corpus), size=min(args.queries, len(corpus)), replace=False)
+    queries = []
+    for i in picks:
+        vector = corpus.matrix[i] + rng.normal(0, args.noise, corpus.matrix.shape[1]).astype(np.float32)
+        queries.append((corpus.rows[i].get("titel") or "", vector.tolist()))
+
+    backends = {
+        "rpc": SupabaseRpcSearchBackend(),
+        "local": LocalVectorSearchBackend(loader=lambda: corpus),
+    }
+    results = {}
+    print(f"\n{'backend':<8} {'p50 ms':>9} {'p95 ms':>9} {'mean ms':>9}")
+    for name, backend in backends.items():
+        latencies, results[name] = asyncio.run(run(backend, queries, args.match_count, args.match_threshold))
+        print(f"{name:<8} {percentile(latencies, 50):>9.2f} {percentile(latencies, 95):>9.2f} {np.mean(latencies) * 1000:>9.2f}")
+
+    overlaps = []
+    for rpc_rows, local_rows in zip(results["rpc"], results["local"]):
+        rpc_ids = {row["afstemning_id"] for row in rpc_rows}
+        local_ids = {row["afstemning_id"] for row in local_rows}
+        if rpc_ids or local_ids:
+            overlaps.append(len(rpc_ids & local_ids) / max(len(rpc_ids), len(local_ids)))
+    print(f"\nResult overlap local vs rpc: {np.mean(overlaps) * 100:.1f}% over {len(overlaps)} queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Serialization time and payload size of a /search response, before and after
+the orjson path, field projection and compression.
+
+"before" is what FastAPI did with response_model=List[Dict[str, Any]]:
+pydantic validation, jsonable_encoder and json.dumps. Rows come from the
+fixtures of benchmarks/fake_supabase.py, so nothing is fetched.
+
+    python -m folketingetApi.benchmarks.serialization --rows 1000
+"""
+import argparse
+import gzip
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+from folketingetApi.benchmarks.fake_supabase import EMBEDDING_COLUMN, generate_rows
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+APP_FIELDS = ["afstemning_id", "titel", "titelkort", "afstemning_dato", "vedtaget", "similarity"]
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+
+    from folketingetApi.services.search_service import dumps_json, project_fields
+
+    rows: List[Dict[str, Any]] = [
+        {**{k: v for k, v in row.items() if k != EMBEDDING_COLUMN}, "similarity": 0.5 + i / (2 * args.rows)}
+        for i, row in enumerate(generate_rows(args.rows))
+    ]
+    adapter = TypeAdapter(List[Dict[str, Any]])
+
+    def before():
+        return json.dumps(jsonable_encoder(adapter.validate_python(rows)), ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    cases = {
+        "before (pydantic + json)": before,
+        "orjson": lambda: dumps_json(rows),
+        "orjson + fields": lambda: dumps_json(project_fields(rows, APP_FIELDS)),
+    }
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'':<26} {'ms':>8} {'bytes':>10} {'gzip':>10} {'br':>10}")
+    for name, fn in cases.items():
+        seconds = best_of(fn, args.repeat)
+        body = fn()
+        gzipped = len(gzip.compress(body, 5))
+        brotlied = len(brotli.compress(body, quality=4)) if brotli is not None else "-"
+        print(f"{name:<26} {seconds * 1000:>8.2f} {len(body):>10} {gzipped:>10} {brotlied:>10}")
+
+
+if __name__ == "__main__":
+    main()
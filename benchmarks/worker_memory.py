@@ -0,0 +1,107 @@
+"""
+Per-worker memory with the model loaded in every worker vs. once before forking.
+
+Forks --workers processes twice: once where every worker loads the model itself
+(the plain `uvicorn --workers N` layout) and once where the parent loads it,
+freezes the GC and then forks (gunicorn.conf.py). Each worker encodes a few
+queries so the numbers include inference, and RSS / PSS are read from
+/proc/<pid>/smaps_rollup while all workers are alive (Linux only). PSS splits
+shared pages between the processes using them, so the summed PSS is the real
+footprint.
+
+    python -m folketingetApi.benchmarks.worker_memory --workers 4
+    python -m folketingetApi.benchmarks.worker_memory --workers 4 --synthetic-mb 440
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+
+import numpy as np
+
+from folketingetApi.util.model_artifacts import MODEL_PATH
+
+SAMPLE_TEXTS = ["klima", "skat", "Forslag til lov om ændring af lov om indkomstskat for personer."]
+
+
+def read_memory_mb(pid: int) -> dict:
+    """Rss and Pss of a process in MB."""
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                memory[name] = int(value.split()[0]) / 1024
+    return memory
+
+
+def load_model(args):
+    if args.synthetic_mb:
+        # Stand-in for the weights: read-only data of the same size
+        return np.random.default_rng(0).random(args.synthetic_mb * 1024 * 1024 // 8)
+
+    from folketingetApi.util.embedding_backends import load_encoder
+
+    return load_encoder(args.model_path, args.backend, device="cpu")
+
+
+def run_workload(model):
+    if isinstance(model, np.ndarray):
+        return float(model.sum())
+    return model.encode(SAMPLE_TEXTS)
+
+
+def worker(args, model, ready, done):
+    if model is None:
+        model = load_model(args)
+    run_workload(model)
+    ready.set()
+    done.wait()
+
+
+def measure(args, preload: bool) -> list:
+    ctx = multiprocessing.get_context("fork")
+    model = None
+    if preload:
+        model = load_model(args)
+        gc.freeze()
+
+    done = ctx.Event()
+    processes = []
+    for _ in range(args.workers):
+        ready = ctx.Event()
+        process = ctx.Process(target=worker, args=(args, model, ready, done))
+        process.start()
+        processes.append((process, ready))
+
+    for _, ready in processes:
+        ready.wait()
+    memory = [read_memory_mb(os.getpid())] + [read_memory_mb(process.pid) for process, _ in processes]
+
+    done.set()
+    for process, _ in processes:
+        process.join()
+    gc.unfreeze()
+    return memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--backend", default=os.environ.get("INFERENCE_BACKEND", "torch"))
+    parser.add_argument("--synthetic-mb", type=int, default=0, help="Use an N MB array instead of the model")
+    args = parser.parse_args()
+
+    print(f"{'layout':<12} {'worker RSS MB':>14} {'worker PSS MB':>14} {'total PSS MB':>13}")
+    # Per-worker loading first, so the parent has nothing loaded yet
+    for layout, preload in [("per-worker", False), ("preload", True)]:
+        parent, *workers = measure(args, preload)
+        rss = np.mean([m["Rss"] for m in workers])
+        pss = np.mean([m["Pss"] for m in workers])
+        total = parent["Pss"] + sum(m["Pss"] for m in workers)
+        print(f"{layout:<12} {rss:>14.1f} {pss:>14.1f} {total:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from dotenv import load_dotenv
+from folketingetApi.util.profiler import sample_stacks
+
+load_dotenv()
+
+# Operator endpoints. They only exist when ADMIN_TOKEN is set, and every call
+# must send it in the X-Admin-Token header.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+router = APIRouter(
+    prefix="/admin"
+)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+@router.post("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile(seconds: float = Query(10, gt=0, le=120), interval_ms: float = Query(5, ge=1, le=1000)):
+    """
+    Samples every thread of the worker that answers for `seconds` and returns
+    collapsed stacks (flamegraph.pl / speedscope input).
+    """
+    try:
+        # Sampling runs on a pool thread so the event loop keeps serving (and is sampled)
+        stacks = await run_in_threadpool(sample_stacks, seconds, interval_ms)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks)
@@ -1,18 +1,18 @@
 # This should be moved into a separate file
+import logging
 from fastapi import HTTPException, APIRouter, Header
-from folketingetApi.util.supabase_client_creator import get_supabase_client
 from dotenv import load_dotenv
 from typing import Optional
 from folketingetApi.services.saved_votings_service import VoteRequest, get_uid_from_token, save_user_voting, fetch_user_saved_votings, delete_user_saved_voting
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 router = APIRouter(
     prefix="/vote"
 )
 
-supabase = get_supabase_client()
-
 @router.get("/saved-votings")
 async def get_saved_votings(Authorization: Optional[str] = Header(None)):
     if not Authorization or not Authorization.startswith("Bearer "):
@@ -25,7 +25,7 @@ async def get_saved_votings(Authorization: Optional[str] = Header(None)):
             "user_id": user_id
         }
 
-        response = fetch_user_saved_votings(params)
+        response = await fetch_user_saved_votings(params)
         
         if response.data is None:
              return []
@@ -33,7 +33,7 @@ async def get_saved_votings(Authorization: Optional[str] = Header(None)):
             return response.data
 
     except Exception as e:
-        print(f"Error: {e}")
+        logger.warning(f"Error fetching saved votings: {e}")
         raise HTTPException(status_code=400, detail=f"Database error: {e}")
     
 @router.post("/save-voting")
@@ -49,12 +49,12 @@ async def save_voting(payload: VoteRequest, Authorization: Optional[str] = Heade
             "p_afstemning_id": payload.voting_id
         }
 
-        save_user_voting(params)
+        await save_user_voting(params)
 
         return {"status": "success", "message": f"Vote {payload.voting_id} saved for user {user_id}"}
 
     except Exception as e:
-        print(f"Error saving vote: {e}")
+        logger.warning(f"Error saving vote: {e}")
         raise HTTPException(status_code=400, detail=f"Database error: {e}")
     
 @router.delete("/delete-voting")
@@ -70,10 +70,10 @@ async def delete_voting(payload: VoteRequest, Authorization: Optional[str] = Hea
             "p_afstemning_id": payload.voting_id
         }
 
-        delete_user_saved_voting(params)
+        await delete_user_saved_voting(params)
 
         return {"status": "success", "message": f"Vote {payload.voting_id} removed for user {user_id}"}
 
     except Exception as e:
-        print(f"Error deleting vote: {e}")
+        logger.warning(f"Error deleting vote: {e}")
         raise HTTPException(status_code=400, detail=f"Database error: {e}")
\ No newline at end of file
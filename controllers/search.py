@@ -1,23 +1,50 @@
-import gc
-from typing import List, Dict, Any
+import time
+IMPORT_STARTED = time.perf_counter()  # Startup timing includes importing the dependencies below
+import logging
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import HTTPException
-from sentence_transformers import SentenceTransformer
 import folketingetApi.controllers.auth as auth
 import folketingetApi.controllers.saved_votings as saved_votings
-from folketingetApi.services.search_service import get_model, fetch_similar_items_from_supabase, SearchRequest, startup_event
+import folketingetApi.controllers.admin as admin
+from folketingetApi.util.supabase_client_creator import close_async_supabase_clients
+from folketingetApi.util.logging_config import RequestIdMiddleware, REQUEST_ID_HEADER, configure_logging, dropped_log_records, log_payload
+from folketingetApi.util.compression import CompressionMiddleware
+from folketingetApi.util.metrics import CallbackMetric, MetricsMiddleware, render_metrics, track_gc_pauses
+from folketingetApi.util.profiler import SlowRequestProfiler, install_profile_signal_handler, PROFILE_SLOW_REQUESTS_MS
+from folketingetApi.services.search_service import get_model, embed_query, fetch_similar_items_from_backend, get_cached_search_results, cache_search_results, paginate_search_results, parse_search_cursor, get_cursor_results, iter_ndjson, dumps_json, project_fields, lexical_search, is_keyword_query, reciprocal_rank_fusion, encoding_stats, search_stage_seconds, embedding_cache_stats, SearchRequest, SearchResult, startup_event, start_background_startup, record_startup_phase, startup_state, HYBRID_SEARCH, MODEL_LOAD_MODE, STARTUP_RETRY_AFTER_SECONDS
 
 # --- Configuration ---
 load_dotenv()  # Load environment variables
+configure_logging()
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 20  # Page size when a cursor is sent without page_size
+
+# Under gunicorn with preload_app (gunicorn.conf.py) this runs once in the master
+# process and the forked workers share the loaded model copy-on-write.
+if MODEL_LOAD_MODE == "preload":
+    record_startup_phase("import", IMPORT_STARTED)
+    startup_event()
+
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON response rendered with orjson; records serialization time as the 'serialize' search stage."""
+
+    def render(self, content: Any) -> bytes:
+        with search_stage_seconds.time("serialize"):
+            return dumps_json(content)
 
-startup_event()
 
 # --- FastAPI App Setup ---
 app = FastAPI(
     title="Sentence Transformer Embedding Service",
-    description="Generates embeddings and performs similarity search via Supabase."
+    description="Generates embeddings and performs similarity search via Supabase.",
+    default_response_class=TimedJSONResponse,
 )
 
 app.add_middleware(
@@ -26,55 +53,157 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Retry-After", REQUEST_ID_HEADER],
 )
+# Inside the metrics middleware, so response sizes are the bytes actually sent
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+if PROFILE_SLOW_REQUESTS_MS:
+    app.add_middleware(SlowRequestProfiler)
+app.add_middleware(RequestIdMiddleware)  # Outermost, so every log line of a request carries its id
+track_gc_pauses()
+CallbackMetric("log_records_dropped_total", "Log records dropped because the log writer fell behind.",
+               lambda: {(): dropped_log_records()}, kind="counter")
+
+@app.on_event("startup")
+def start_model_loading():
+    """Load the model without blocking the server from accepting connections."""
+    install_profile_signal_handler()
+    if startup_state["status"] == "ready":
+        return  # Preloaded before the worker was forked
+    record_startup_phase("import", IMPORT_STARTED)
+    if MODEL_LOAD_MODE == "eager":
+        startup_event()
+    else:
+        start_background_startup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close the shared Supabase connection pool."""
+    await close_async_supabase_clients()
 
 # Include other controller endpoints
 app.include_router(auth.router)
 app.include_router(saved_votings.router)
+app.include_router(admin.router)
 
 # --- API Endpoint ---
 
 
-@app.post("/search", response_model=List[Dict[str, Any]])
-async def search_similar_items(request_data: SearchRequest, model: SentenceTransformer = Depends(get_model)) -> List[Dict[str, Any]]:
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: per-stage latency, cache hit counters and payload sizes of this worker."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def stats():
+    """Encode queue depth, wait times and embedding cache hit rates of this worker."""
+    return {"encoding": encoding_stats(), "embedding_cache": embedding_cache_stats()}
+
+
+@app.get("/health")
+async def health():
+    """Liveness probe: the process is up, whether or not the model is loaded."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the model is loaded and the search backend warmed up."""
+    if startup_state["status"] == "ready":
+        return startup_state
+    return JSONResponse(status_code=503, content=startup_state,
+                        headers={"Retry-After": str(STARTUP_RETRY_AFTER_SECONDS)})
+
+
+async def run_search(query_text: str, match_count: int, match_threshold: float) -> List[Dict[str, Any]]:
     """
-    Handles the end-to-end process: embeds the query and searches Supabase for similar items.
+    Embeds the query and searches the configured backend, using the result cache when possible.
     """
-    if model is None:
-        raise HTTPException(
-            status_code=503, detail="Embedding model not loaded")
+    # Repeat searches are answered without embedding or a database round trip
+    cached_items, data_version = await get_cached_search_results(query_text, match_count, match_threshold)
+    if cached_items is not None:
+        return cached_items
 
-    query_text = request_data.query_text
-    match_count = request_data.match_count or 1000
+    lexical_items: List[Dict[str, Any]] = []
+    if HYBRID_SEARCH:
+        lexical_items = await lexical_search(query_text, match_count)
+        # Bill numbers and short keyword queries are answered without the model
+        if lexical_items and is_keyword_query(query_text):
+            lexical_items = [{"similarity": None, **row} for row in lexical_items]
+            cache_search_results(query_text, match_count, match_threshold, lexical_items, data_version)
+            return lexical_items
 
     try:
-        # Note: model.encode returns a numpy array for a list of texts (even one text)
-        # We take the first (and only) embedding vector and convert it to a list of floats
-        embedding_array = model.encode([query_text])[0]
-        print(type(model.encode([query_text])))
-        query_embedding: List[float] = embedding_array.tolist()
-
-        # Clean up memory
-        del embedding_array
-        gc.collect()
+        # Concurrent queries are batched into a single model.encode call
+        query_embedding: List[float] = await embed_query(query_text)
 
+    except HTTPException:
+        raise  # Overload (429/503) is passed through as-is
     except Exception as e:
-        print(f"Encoding error: {e}")
+        logger.exception("Encoding error")
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred during embedding generation: {str(e)}"
         )
 
-    # Search Supabase (I/O-bound, so we must await the async function)
+    # Search the configured backend (Supabase RPC or local index)
     # The result will be a list of dicts (votings with titel, id etc.)
-    similar_items = await fetch_similar_items_from_supabase(
+    similar_items = await fetch_similar_items_from_backend(
         query_text=query_text,
         embedding=query_embedding,
         match_count=match_count,
-        match_threshold=request_data.match_threshold
+        match_threshold=match_threshold
     )
-    print(len(similar_items))
-    # Return the results directly to the React Native app
+    if lexical_items:
+        similar_items = reciprocal_rank_fusion([similar_items, lexical_items], match_count)
+    log_payload(logger, "Search results", similar_items, query=query_text, results=len(similar_items))
+    cache_search_results(query_text, match_count, match_threshold, similar_items, data_version)
     return similar_items
 
+
+# response_model only documents the schema: the endpoint returns a Response, so
+# FastAPI does not validate or re-encode the (up to 1000) rows.
+@app.post("/search", response_model=List[SearchResult])
+async def search_similar_items(request_data: SearchRequest, accept: Optional[str] = Header(None),
+                               model=Depends(get_model)):
+    """
+    Handles the end-to-end process: embeds the query and searches Supabase for similar items.
+
+    With page_size the results come in pages, and X-Next-Cursor holds the cursor
+    for the next page. With stream=true (or Accept: application/x-ndjson) every
+    result is streamed as newline-delimited JSON. With fields only those fields
+    of each row are returned.
+    """
+    if model is None:
+        raise HTTPException(
+            status_code=503, detail="Embedding model not loaded")
+
+    if request_data.cursor:
+        # Continue a previous search: the ranked list is already computed
+        similar_items = get_cursor_results(request_data.cursor)
+    else:
+        similar_items = await run_search(
+            request_data.query_text,
+            request_data.match_count or 1000,
+            request_data.match_threshold
+        )
+
+    if request_data.stream or (accept and "application/x-ndjson" in accept):
+        offset = parse_search_cursor(request_data.cursor)[1] if request_data.cursor else 0
+        rows = project_fields(similar_items[offset:], request_data.fields)
+        return StreamingResponse(iter_ndjson(rows), media_type="application/x-ndjson")
+
+    if request_data.page_size or request_data.cursor:
+        page_size = request_data.page_size or DEFAULT_PAGE_SIZE
+        page, next_cursor = paginate_search_results(similar_items, page_size, request_data.cursor)
+        headers = {"X-Total-Count": str(len(similar_items))}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return TimedJSONResponse(project_fields(page, request_data.fields), headers=headers)
+
+    # Return the results directly to the React Native app
+    return TimedJSONResponse(project_fields(similar_items, request_data.fields))
+
 # uvicorn folketingetApi.controllers.search:app --reload --host 0.0.0.0 --port 5001
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Embedding server: one process that owns the model and encodes for every API worker.
+
+Start it before (or next to) the API and point the workers at its socket:
+
+    python embedding_server.py --socket /run/folketinget/embed.sock
+    EMBEDDING_SERVER_SOCKET=/run/folketinget/embed.sock uvicorn folketingetApi.controllers.search:app --workers 4
+
+The API workers then never import torch; they send query texts over the Unix
+socket and get float32 vectors back (see util/embedding_sidecar.py for the format).
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from util.embedding_backends import load_encoder, set_torch_threads
+from util.embedding_sidecar import EmbeddingServer
+from util.logging_config import configure_logging
+from util.model_artifacts import ensure_model_artifacts, model_version
+
+load_dotenv()
+logger = logging.getLogger("embedding_server")
+
+# torch, torch-int8, onnx or onnx-int8 (see util/embedding_backends.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+EMBEDDING_SERVER_SOCKET = os.environ.get("EMBEDDING_SERVER_SOCKET", "/tmp/folketinget-embed.sock")
+# The server is the only process doing inference, so by default it uses every core
+EMBEDDING_SERVER_THREADS = int(os.environ.get("EMBEDDING_SERVER_THREADS", str(os.cpu_count() or 1)))
+EMBEDDING_SERVER_MAX_BATCH_SIZE = int(os.environ.get("EMBEDDING_SERVER_MAX_BATCH_SIZE", "64"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=EMBEDDING_SERVER_SOCKET)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_SERVER_THREADS)
+    parser.add_argument("--max-batch-size", type=int, default=EMBEDDING_SERVER_MAX_BATCH_SIZE)
+    args = parser.parse_args()
+    configure_logging()
+
+    set_torch_threads(args.threads)
+    model = load_encoder(ensure_model_artifacts(), INFERENCE_BACKEND, device="cpu")
+    tokenizer = getattr(model, "tokenizer", None)
+    info = {
+        "model_version": model_version(),
+        "backend": INFERENCE_BACKEND,
+        "dim": model.get_sentence_embedding_dimension(),
+        "do_lower_case": bool(getattr(tokenizer, "do_lower_case", False)),
+        "threads": args.threads,
+    }
+    logger.info(f"Model loaded ({info['model_version']}, {INFERENCE_BACKEND} backend, {args.threads} threads)")
+
+    asyncio.run(EmbeddingServer(model, info, args.max_batch_size).serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Exports the embedding model for the ONNX inference backends and validates every backend.
+
+Writes <model>-onnx/onnx/model.onnx and the dynamically int8-quantized
+<model>-onnx/onnx/model_qint8_<config>.onnx, then encodes a set of Danish
+sample sentences with each backend and compares them with the PyTorch
+reference. Exits non-zero when a backend falls below --min-cosine.
+
+    python export_model.py
+    python export_model.py --validate-only --min-cosine 0.98
+
+Requires: pip install "optimum[onnxruntime]"
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from util.embedding_backends import (
+    INFERENCE_BACKENDS,
+    ONNX_QUANTIZATION_CONFIG,
+    load_encoder,
+    onnx_model_path,
+)
+from util.model_artifacts import MODEL_PATH
+
+SAMPLE_TEXTS = [
+    "klima",
+    "skat",
+    "L 123",
+    "Forslag til lov om ændring af lov om indkomstskat for personer.",
+    "Forslag til folketingsbeslutning om en grøn omstilling af landbruget og reduktion af CO2-udledningen.",
+    "Socialdemokratiet og Venstre stemte for forslaget om flere penge til ældreplejen.",
+    "Lov om ændring af udlændingeloven (skærpede krav for opnåelse af permanent opholdstilladelse).",
+    "Beretning om forsvarets materielanskaffelser og forsinkelser på nye fregatter.",
+]
+
+
+def export_onnx(model_path: str):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    target = onnx_model_path(model_path)
+    print(f"Exporting ONNX model to {target}...")
+    # Loading a PyTorch checkpoint with backend="onnx" converts it on the fly
+    model = SentenceTransformer(model_path, backend="onnx", device="cpu")
+    model.save_pretrained(target)
+
+    print(f"Exporting int8 ONNX model ({ONNX_QUANTIZATION_CONFIG})...")
+    export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION_CONFIG, target)
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return np.sum(reference * candidate, axis=1)
+
+
+def validate(model_path: str, min_cosine: float) -> bool:
+    reference = load_encoder(model_path, "torch", device="cpu").encode(SAMPLE_TEXTS)
+    ok = True
+
+    print(f"\n{'backend':<12} {'min cos':>8} {'mean cos':>9} {'ms/text':>8}")
+    for backend in INFERENCE_BACKENDS:
+        model = load_encoder(model_path, backend)
+        model.encode(SAMPLE_TEXTS[:1])  # warm up
+        started = time.perf_counter()
+        embeddings = model.encode(SAMPLE_TEXTS)
+        ms_per_text = (time.perf_counter() - started) * 1000 / len(SAMPLE_TEXTS)
+
+        agreement = cosine_agreement(reference, embeddings)
+        status = "" if agreement.min() >= min_cosine else "  FAILED"
+        ok = ok and not status
+        print(f"{backend:<12} {agreement.min():>8.4f} {agreement.mean():>9.4f} {ms_per_text:>8.2f}{status}")
+
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--validate-only", action="store_true")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.model_path):
+        sys.exit(f"Model not found at {args.model_path}")
+
+    if not args.validate_only:
+        export_onnx(args.model_path)
+
+    sys.exit(0 if validate(args.model_path, args.min_cosine) else 1)
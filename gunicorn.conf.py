@@ -0,0 +1,40 @@
+"""
+Multi-worker serving with the model loaded once and shared between workers.
+
+Run from the parent directory of the repo:
+
+    gunicorn -c folketingetApi/gunicorn.conf.py folketingetApi.controllers.search:app
+
+The app (model, search corpus and BM25 index) is imported in the master
+process, then the workers are forked and share those pages copy-on-write.
+"""
+import gc
+import multiprocessing
+import os
+
+# Must be set before the app is imported so controllers/search.py loads the model at import
+os.environ.setdefault("MODEL_LOAD_MODE", "preload")
+
+bind = os.environ.get("BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# The search service splits the cores between the workers' torch thread pools
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Loading the model happens before the workers exist, so the default is plenty
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the garbage collector's generations.
+    # Otherwise the first collection in each worker writes to every object header
+    # and the shared pages get copied after all.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Connection pools must not be shared between processes
+    from folketingetApi.util.supabase_client_creator import get_supabase_client
+
+    get_supabase_client.cache_clear()
@@ -1,29 +1,22 @@
-import requests
-import json
 import os
 import time
-import gc
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional
 import torch  # Import torch for GPU detection and management
 from util.supabase_client_creator import get_supabase_client
 from starlette.concurrency import run_in_threadpool
 import asyncio
-from huggingface_hub import snapshot_download
+from contextlib import aclosing
 
 from dotenv import load_dotenv
 from supabase.client import create_client, Client
-from sentence_transformers import SentenceTransformer
-
-HF_TOKEN = os.environ.get("HF_TOKEN")
-
-os.makedirs("embedding_model", exist_ok=True)
-
-snapshot_download(
-    repo_id="heizetagram/danishbert-cosine-embeddings",
-    local_dir="embedding_model",
-    local_dir_use_symlinks=False,
-    use_auth_token=True
-)
+from util.batch_uploader import UPLOAD_MAX_BATCH_SIZE, BatchUploader
+from util.cache import ContentHashEmbeddingCache
+from util.embedding_backends import load_encoder
+from util.import_checkpoint import ImportCheckpoint, normalize_timestamp
+from util.import_pipeline import PipelineStats, run_import_pipeline
+from util.logging_config import configure_logging
+from util.model_artifacts import MODEL_PATH, ROOT_DIR, ensure_model_artifacts, model_version
+from util.odata_fetcher import ODataFetcher, ODataFetchError
 
 # CUDA GPU CHECKS
 print(f"CUDA Available: {torch.cuda.is_available()}")
@@ -37,17 +30,37 @@ if torch.cuda.is_available():
 
 # --- Configuration ---
 load_dotenv()
+configure_logging()  # For the util modules; this script's own progress output is printed
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
-# Assumes you have the model locally
-MODEL_PATH = "embedding_model/danishbert-cosine-embeddings"
+# torch, torch-int8, onnx or onnx-int8 (see util/embedding_backends.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
 API_BASE_URL = "https://oda.ft.dk/api/Afstemning"
-BATCH_SIZE = 100  # Size of each upload batch to Supabase
 TARGET_TABLE = "afstemninger_bert_v2"  # The new table
+DATA_VERSION_TABLE = "data_versions"  # Read by the search API to invalidate its result cache
+# Embeddings of earlier runs, keyed by a hash of the model version and embedding_text,
+# so only new or changed texts are encoded. An empty value turns the cache off.
+IMPORT_EMBEDDING_CACHE_PATH = os.environ.get(
+    "IMPORT_EMBEDDING_CACHE_PATH", os.path.join(ROOT_DIR, "embedding_cache", "import_embeddings.sqlite"))
+IMPORT_EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("IMPORT_EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+# "delta" fetches only votes updated since the last run (see util/import_checkpoint.py),
+# "full" fetches every vote again
+IMPORT_MODE = os.environ.get("IMPORT_MODE", "delta").lower()
+IMPORT_CHECKPOINT_PATH = os.environ.get(
+    "IMPORT_CHECKPOINT_PATH", os.path.join(ROOT_DIR, "import_state", f"{TARGET_TABLE}.json"))
+# Rows that kept failing to upload; replayed at the start of the next run
+IMPORT_DEAD_LETTER_PATH = os.environ.get(
+    "IMPORT_DEAD_LETTER_PATH", os.path.join(ROOT_DIR, "import_state", f"{TARGET_TABLE}.dead_letter.jsonl"))
 
 # OData Query to fetch all votes of type 1 or 3
-# We expand Sagstrin and Sag to get title, resume, and afstemningskonklusion
-API_QUERY = f"{API_BASE_URL}?$inlinecount=allpages&$orderby=opdateringsdato desc&$expand=Sagstrin,Sagstrin/Sag &$filter=(typeid eq 1 or typeid eq 3)"
+# We expand Sagstrin and Sag to get title, resume, and afstemningskonklusion.
+# Oldest update first, so the checkpoint cursor only moves forward; id breaks ties.
+API_QUERY = f"{API_BASE_URL}?$inlinecount=allpages&$orderby=opdateringsdato,id&$expand=Sagstrin,Sagstrin/Sag &$filter=(typeid eq 1 or typeid eq 3)"
+
+
+def build_query(update_filter: Optional[str]) -> str:
+    """API_QUERY narrowed to the votes matching an opdateringsdato condition."""
+    return f"{API_QUERY} and {update_filter}" if update_filter else API_QUERY
 
 # --- Initialization ---
 try:
@@ -72,10 +85,14 @@ else:
 
 try:
     # Load the Sentence Transformer model and explicitly assign the device
-    # This moves the model weights to the GPU for processing
-    model = SentenceTransformer(MODEL_PATH, device=DEVICE)
+    # This moves the model weights to the GPU for processing (torch backend only,
+    # the int8 and ONNX backends always run on CPU)
+    if INFERENCE_BACKEND != "torch":
+        DEVICE = "cpu"
+    # Verified against model_manifest.json; only missing or corrupt files are downloaded
+    model = load_encoder(ensure_model_artifacts(), INFERENCE_BACKEND, device=DEVICE)
     print(
-        f"Embedding model loaded from: {MODEL_PATH} and assigned to {DEVICE}.")
+        f"Embedding model loaded from: {MODEL_PATH} ({INFERENCE_BACKEND} backend) and assigned to {DEVICE}.")
 except Exception as e:
     print(f"Error loading model on {DEVICE}: {e}")
     # Note: If the model fails to load on 'cuda' or 'mps',
@@ -85,194 +102,196 @@ except Exception as e:
 
 # --- Functions ---
 
-async def get_latest_voting_date_from_db():
+async def get_latest_update_from_db() -> Optional[str]:
+    """Newest opdateringsdato in TARGET_TABLE, to start delta imports on a table filled before checkpoints."""
     supabase = get_supabase_client()
 
     response = await run_in_threadpool(
-        lambda: supabase.rpc("fetch_latest_voting", {"tbl_name": TARGET_TABLE}).execute()
+        lambda: supabase.table(TARGET_TABLE).select("opdateringsdato")
+        .order("opdateringsdato", desc=True, nullsfirst=False).limit(1).execute()
     )
 
-    return response.data
+    if response.data and response.data[0].get("opdateringsdato"):
+        return normalize_timestamp(response.data[0]["opdateringsdato"])
+    return None
 
-def fetch_all_afstemninger(latest_result) -> List[Dict[str, Any]]:
-    all_records = []
-    skip = 0
+async def fetch_afstemninger_pages(query_url: str) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Yields the votes page by page, ODATA_CONCURRENCY pages at a time (see util/odata_fetcher.py).
+    Raises ODataFetchError if a page keeps failing; the checkpoint then lets the next run resume.
+    """
     total_count = None
-
-    print("Starting data retrieval from the Folketing API...")
-
-    while True:
-        url = f"{API_QUERY}&$skip={skip}"
-
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API Error at skip={skip}: {e}")
-            break
-
-        if total_count is None:
-            total_count = int(data.get('odata.count', 0))
-            print(f"Found a total of {total_count} votes to fetch.")
-        
-        records = data.get('value', [])
-
-        if not records:
-            break
-
-        if latest_result:
-            filtered_records = []
-            latest_date = latest_result[0]['afstemning_dato']
-            for record in records:
-                record_date = record.get('Sagstrin', {}).get('dato')
-                if record_date and record_date > latest_date:
-                    filtered_records.append(record)
-            
-            if not filtered_records:
-                break
-            
-            all_records.extend(filtered_records)
-        else:
-            all_records.extend(records)
-
-        skip += len(records)
-
-        print(f"Fetched {skip}/{total_count} records...")
-
-        if len(records) < 100 or skip >= total_count:
-            break
-
-    print(f"Retrieval complete. Total records: {len(all_records)}")
-    return all_records
-
-def prepare_and_embed_data(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Prepares data and generates embeddings."""
-    processed_records = []
-    texts_to_embed = []
-
-    print("Starting data preparation and embedding...")
-
-    for record in records:
-        sagstrin = record.get('Sagstrin', {})
-        sag = sagstrin.get('Sag', {})
-
-        # 1. Extract relevant fields
-        afstemning_id = record.get('id')
-        konklusion_afstemning = record.get('konklusion', '')
-        sag_id = sag.get('id')
-        titel = sag.get('titel', '')
-        titelkort = sag.get('titelkort', '')
-        resume = sag.get('resume', '')
-        opdateringsdato = record.get('opdateringsdato')
-        type_id = record.get('typeid')
-
-        # NEW FIELDS ADDED
-        afstemning_dato = sagstrin.get('dato')       # Date from Sagstrin
-        sagstrin_titel = sagstrin.get('titel', '')   # Title from Sagstrin
-        vedtaget = record.get('vedtaget')            # Boolean from Afstemning
-
-        # 2. Combine text fields for embedding
-        embedding_text = f"{titel}. {titelkort}. {resume}."
-
-        texts_to_embed.append(embedding_text)
-
-        # Store the pre-processed data (without embedding yet)
-        processed_records.append({
-            'afstemning_id': afstemning_id,
-            'sag_id': sag_id,
-            'titel': titel,
-            'titelkort': titelkort,
-            'resume': resume,
-            'konklusion': konklusion_afstemning,
-
-            # NEW FIELDS ADDED HERE
-            'afstemning_dato': afstemning_dato,
-            'sagstrin_titel': sagstrin_titel,
-            'vedtaget': vedtaget,
-            'type_id': type_id,
-
-            'opdateringsdato': opdateringsdato,
-            'embedding_text': embedding_text,
-            'embedding_v5': None  # Placeholder
-        })
-
-    # 3. Generate embeddings
+    fetcher = ODataFetcher(query_url)
+
+    print(f"Starting data retrieval from the Folketing API ({fetcher.concurrency} concurrent requests)...")
+
+    # aclosing: leaving the loop early cancels the page requests still in flight
+    async with aclosing(fetcher.pages()) as pages:
+        async for page in pages:
+            if total_count is None:
+                total_count = page.total_count
+                print(f"Found a total of {total_count} votes to fetch.")
+
+            records = page.records
+            yield records
+
+            print(f"Fetched {page.skip + len(records)}/{total_count} records...")
+
+    print(f"Retrieval complete ({fetcher.requests} requests, {fetcher.retries} retried)")
+
+def prepare_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Turns an API record into a table row; the embedding is added by the embed stage."""
+    sagstrin = record.get('Sagstrin', {})
+    sag = sagstrin.get('Sag', {})
+
+    # 1. Extract relevant fields
+    afstemning_id = record.get('id')
+    konklusion_afstemning = record.get('konklusion', '')
+    sag_id = sag.get('id')
+    titel = sag.get('titel', '')
+    titelkort = sag.get('titelkort', '')
+    resume = sag.get('resume', '')
+    opdateringsdato = record.get('opdateringsdato')
+    type_id = record.get('typeid')
+
+    # NEW FIELDS ADDED
+    afstemning_dato = sagstrin.get('dato')       # Date from Sagstrin
+    sagstrin_titel = sagstrin.get('titel', '')   # Title from Sagstrin
+    vedtaget = record.get('vedtaget')            # Boolean from Afstemning
+
+    # 2. Combine text fields for embedding
+    embedding_text = f"{titel}. {titelkort}. {resume}."
+
+    return {
+        'afstemning_id': afstemning_id,
+        'sag_id': sag_id,
+        'titel': titel,
+        'titelkort': titelkort,
+        'resume': resume,
+        'konklusion': konklusion_afstemning,
+
+        # NEW FIELDS ADDED HERE
+        'afstemning_dato': afstemning_dato,
+        'sagstrin_titel': sagstrin_titel,
+        'vedtaget': vedtaget,
+        'type_id': type_id,
+
+        'opdateringsdato': opdateringsdato,
+        'embedding_text': embedding_text,
+        'embedding_v5': None  # Placeholder
+    }
+
+def encode_with_model(texts: List[str]):
     # IMPORTANT: Pass the determined DEVICE to ensure the GPU is used for encoding
-    try:
-        embeddings = model.encode(
-            texts_to_embed, show_progress_bar=True, device=DEVICE)
-    except Exception as e:
-        print(f"Error during embedding: {e}")
-        return []
+    return model.encode(texts, batch_size=len(texts), show_progress_bar=False, device=DEVICE)
 
-    # 4. Assign embeddings to records
-    for i, embedding in enumerate(embeddings):
-        # Convert numpy array to standard Python list of floats
-        processed_records[i]['embedding_v5'] = embedding.tolist()
 
-    print("Embedding complete.")
-    del embeddings, texts_to_embed
-    gc.collect()  # Free up memory
-    if DEVICE.startswith('cuda'):
-        torch.cuda.empty_cache()  # Clear GPU memory cache
+# Backends differ in the last decimals, so they do not share entries
+embedding_cache = ContentHashEmbeddingCache(
+    IMPORT_EMBEDDING_CACHE_PATH, f"{model_version()}:{INFERENCE_BACKEND}", IMPORT_EMBEDDING_CACHE_MAX_ENTRIES
+) if IMPORT_EMBEDDING_CACHE_PATH else None
 
-    return processed_records
 
+def embed_texts(texts: List[str]):
+    """Generates embeddings for one batch of the import, encoding only texts not seen before."""
+    if embedding_cache is None:
+        return encode_with_model(texts)
+    return embedding_cache.encode(texts, encode_with_model)
 
-def save_to_supabase_in_batches(data: List[Dict[str, Any]]):
-    """Saves the prepared data to Supabase in batches."""
-    total_records = len(data)
 
-    print(f"Starting upload to Supabase in batches of {BATCH_SIZE}...")
+def upload_batch(batch: List[Dict[str, Any]]):
+    """
+    Saves one batch of prepared rows to Supabase. Errors are raised for the uploader,
+    which retries, throttles on 429 and dead-letters rows that keep failing.
+    """
+    # Upsert ensures existing records (same afstemning_id) are updated
+    response = supabase.table(TARGET_TABLE).upsert(
+        batch,
+        on_conflict='afstemning_id',
+        returning='minimal'  # The rows are not needed back; saves sending every embedding twice
+    ).execute()
+    return response
 
-    for i in range(0, total_records, BATCH_SIZE):
-        batch = data[i:i + BATCH_SIZE]
 
-        try:
-            # Upsert ensures existing records (same afstemning_id) are updated
-            response = supabase.table(TARGET_TABLE).upsert(
-                batch,
-                on_conflict='afstemning_id'
-            ).execute()
+# Several batches in flight, sized by payload and latency, rate limited (see util/batch_uploader.py)
+uploader = BatchUploader(upload_batch, dead_letter_path=IMPORT_DEAD_LETTER_PATH)
 
-            # Check for errors in response
-            if response.data is None or 'error' in response.data:
-                print(
-                    f"Error in Supabase batch {i//BATCH_SIZE + 1}: {response.data}")
 
-            print(
-                f"Uploaded batch {i // BATCH_SIZE + 1}. Records saved: {len(batch)}.")
+async def run_import(query_url: str, stats: PipelineStats, checkpoint: ImportCheckpoint):
+    replayed = await uploader.replay_dead_letters()
+    if replayed:
+        print(f"Uploaded {replayed} rows from the dead-letter file of an earlier run.")
+        stats.uploaded += replayed
 
-        except Exception as e:
-            print(
-                f"Critical error during Supabase upload of batch {i//BATCH_SIZE + 1}: {e}")
+    # Embedded batches are passed whole; the uploader regroups them
+    await run_import_pipeline(
+        fetch_afstemninger_pages(query_url), prepare_record, embed_texts, uploader,
+        upload_batch_size=UPLOAD_MAX_BATCH_SIZE, stats=stats, on_uploaded=checkpoint.commit)
 
-        time.sleep(1)  # Wait 1 second between batches to avoid rate-limiting
 
-    print("Upload to Supabase finished.")
+def bump_data_version():
+    """Marks TARGET_TABLE as changed so the search API drops its cached results."""
+    version = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    try:
+        supabase.table(DATA_VERSION_TABLE).upsert(
+            {"table_name": TARGET_TABLE, "version": version},
+            on_conflict='table_name'
+        ).execute()
+        print(f"Data version of {TARGET_TABLE} set to {version}.")
+    except Exception as e:
+        print(f"Error updating data version: {e}")
 
 
 # --- Main Execution ---
 if __name__ == "__main__":
     start_time = time.time()
 
-    latest_result = asyncio.run(get_latest_voting_date_from_db())
-    if latest_result and 'afstemning_dato' in latest_result[0] and latest_result[0]['afstemning_dato']:
-        print(f"Latest voting date found in DB: {latest_result[0]['afstemning_dato']}")
+    checkpoint = ImportCheckpoint(IMPORT_CHECKPOINT_PATH)
+    if IMPORT_MODE == "full":
+        print("Full import: fetching every vote.")
+        checkpoint.reset()
+    elif checkpoint.run is not None:
+        print(f"Resuming unfinished import from {checkpoint.run['cursor'] or checkpoint.run['since'] or 'the start'} "
+              f"({checkpoint.run['rows']} rows already uploaded).")
+    elif checkpoint.high_water_mark:
+        print(f"Delta import: votes updated after {checkpoint.high_water_mark}.")
     else:
-        print("No voting date found in DB")
-
-    # 1. Fetch all votes
-    all_afstemninger = fetch_all_afstemninger(latest_result)
-
-    if all_afstemninger:
-        # 2. Prepare data and generate embeddings
-        embedded_data = prepare_and_embed_data(all_afstemninger)
+        checkpoint.high_water_mark = asyncio.run(get_latest_update_from_db())
+        if checkpoint.high_water_mark:
+            # Rows that failed in a run whose checkpoint was lost may be older than this;
+            # IMPORT_MODE=full picks them up
+            print(f"WARNING: no checkpoint at {IMPORT_CHECKPOINT_PATH}; delta import from the newest update "
+                  f"in DB: {checkpoint.high_water_mark}")
+        else:
+            print("No checkpoint and no data in DB: fetching every vote.")
+    checkpoint.begin()
 
-        # 3. Save to Supabase in batches
-        if embedded_data:
-            save_to_supabase_in_batches(embedded_data)
+    # Fetch, embed and upload run at the same time; only a few batches are in memory at once
+    stats = PipelineStats()
+    try:
+        asyncio.run(run_import(build_query(checkpoint.odata_filter()), stats, checkpoint))
+    except ODataFetchError as e:
+        # The batches before the failed page are already uploaded and stay; the next run resumes after them
+        print(f"Aborting import after {stats.uploaded} rows, checkpoint saved at {checkpoint.run['cursor']}: {e}")
+        if stats.uploaded:
+            bump_data_version()
+        exit(1)
+
+    if checkpoint.finish():
+        print(f"Import finished: {stats.summary()}. High-water mark: {checkpoint.high_water_mark}")
+    else:
+        print(f"Import finished with failed rows: {stats.summary()}. The next run resumes from "
+              f"{checkpoint.run['cursor'] or checkpoint.run['since'] or 'the start'} to fetch them again.")
+    print(f"Upload: {uploader.summary()}")
+    if uploader.rows_dead_lettered:
+        print(f"{uploader.rows_dead_lettered} rows failed and were written to {IMPORT_DEAD_LETTER_PATH}; "
+              f"they are retried on the next run.")
+    if embedding_cache is not None:
+        print(f"Embedding cache: {embedding_cache.stats()}")
+    if stats.uploaded:
+        bump_data_version()
 
     end_time = time.time()
     print(f"\n--- Script finished in {end_time - start_time:.2f} seconds. ---")
+    if uploader.rows_dead_lettered:
+        exit(1)  # Flags the scheduled run; the rows are retried on the next one
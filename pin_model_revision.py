@@ -0,0 +1,62 @@
+"""
+Pins model_manifest.json to a commit of the model's Hugging Face repo.
+
+Resolves --revision (a branch, tag or commit; default main) to its commit sha,
+downloads the manifest's files at that commit and checks them against the
+recorded sha256 checksums. Only if every file matches is the sha written to
+the manifest, so the pinned revision is the one the checksums describe.
+
+    python pin_model_revision.py
+    python pin_model_revision.py --revision main
+
+Requires network access to the hub (and HF_TOKEN for a private repo).
+"""
+import argparse
+import json
+import sys
+import tempfile
+
+from util.model_artifacts import HF_TOKEN, MANIFEST_PATH, load_manifest, verify_artifacts
+
+
+def resolve_revision(repo_id: str, revision: str) -> str:
+    from huggingface_hub import HfApi
+
+    return HfApi(token=HF_TOKEN).model_info(repo_id, revision=revision).sha
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--revision", default="main", help="Branch, tag or commit to pin (default: main)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="Manifest to update")
+    args = parser.parse_args()
+
+    from huggingface_hub import snapshot_download
+
+    manifest = load_manifest(args.manifest)
+    sha = resolve_revision(manifest["repo_id"], args.revision)
+    print(f"{manifest['repo_id']}@{args.revision} is commit {sha}, verifying its files...")
+
+    with tempfile.TemporaryDirectory() as download_dir:
+        snapshot_download(
+            repo_id=manifest["repo_id"],
+            revision=sha,
+            local_dir=download_dir,
+            allow_patterns=list(manifest["files"]),
+            token=HF_TOKEN,
+        )
+        problems = verify_artifacts(download_dir, manifest, full=True)
+
+    if problems:
+        print(f"Files at {sha} do not match {args.manifest}: {', '.join(problems)}")
+        sys.exit(1)
+
+    manifest["revision"] = sha
+    with open(args.manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"Pinned {args.manifest} to {sha}")
+
+
+if __name__ == "__main__":
+    main()
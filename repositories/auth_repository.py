@@ -1,33 +1,37 @@
 import os
-from supabase import create_client, Client
-from folketingetApi.util.supabase_client_creator import get_supabase_client
+from folketingetApi.util.supabase_client_creator import get_async_supabase_client
 
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 anon_key:str = os.environ.get("SUPABASE_ANON_KEY")
 
-# Public client (for reading user session)
-supabase_public: Client = create_client(url, anon_key)
 
-# Admin client (for deleting)
-supabase_admin: Client = create_client(url, key)
+# Client for sign-up/login. Kept apart from the data client because it holds
+# the session of the last user that signed in.
+async def get_auth_client():
+    return await get_async_supabase_client(key, name="auth")
 
-try:
-    supabase: Client = create_client(url, key)
-except Exception as e:
-    raise RuntimeError(f"Failed to create Supabase Client {e}")
+# Public client (for reading user session)
+async def get_public_client():
+    return await get_async_supabase_client(anon_key, name="public")
 
-supabase = get_supabase_client()
+# Admin client (for deleting)
+async def get_admin_client():
+    return await get_async_supabase_client(key, name="admin")
 
 
 async def sign_up_supabase(params):
-    return supabase.auth.sign_up(params)
+    supabase = await get_auth_client()
+    return await supabase.auth.sign_up(params)
 
 async def login_supabase(params):
-    return supabase.auth.sign_in_with_password(params)
+    supabase = await get_auth_client()
+    return await supabase.auth.sign_in_with_password(params)
 
 async def get_user_supabase(access_token):
-    return supabase_public.auth.get_user(access_token)
+    supabase_public = await get_public_client()
+    return await supabase_public.auth.get_user(access_token)
 
 async def delete_user_supabase(user_id):
-    return supabase_admin.auth.admin.delete_user(user_id)
\ No newline at end of file
+    supabase_admin = await get_admin_client()
+    return await supabase_admin.auth.admin.delete_user(user_id)
@@ -1,12 +1,13 @@
-from folketingetApi.util.supabase_client_creator import get_supabase_client
+from folketingetApi.util.supabase_client_creator import get_async_supabase_client
 
-supabase = get_supabase_client()
+async def save_user_voting_db(params):
+    supabase = await get_async_supabase_client()
+    return await supabase.rpc('save_user_afstemning', params).execute()
 
-def save_user_voting_db(params):
-    return supabase.rpc('save_user_afstemning', params).execute()
+async def fetch_user_saved_votings_db(params):
+    supabase = await get_async_supabase_client()
+    return await supabase.rpc('get_user_saved_votes', params).execute()
 
-def fetch_user_saved_votings_db(params):
-    return supabase.rpc('get_user_saved_votes', params).execute()
-
-def delete_user_saved_voting_db(params):
-    return supabase.rpc('delete_user_afstemning', params).execute()
\ No newline at end of file
+async def delete_user_saved_voting_db(params):
+    supabase = await get_async_supabase_client()
+    return await supabase.rpc('delete_user_afstemning', params).execute()
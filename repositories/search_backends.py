@@ -0,0 +1,399 @@
+import json
+import logging
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from folketingetApi.repositories.search_repository import (
+    EMBEDDING_COLUMN,
+    fetch_search_rows_page,
+    fetch_similar_items,
+)
+from folketingetApi.util.bm25 import BM25Index
+from folketingetApi.util.ivf_index import IVFIndex, matrix_fingerprint
+from folketingetApi.util.quantization import QUANTIZATION_KINDS, QuantizedMatrix
+
+logger = logging.getLogger(__name__)
+
+# "rpc" calls fetch_similar_items_v2 in Supabase, "local" searches an in-memory copy
+# exactly and "ann" searches the in-memory copy through an IVF index
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "rpc").lower()
+LOCAL_SEARCH_PAGE_SIZE = int(os.environ.get("LOCAL_SEARCH_PAGE_SIZE", "1000"))
+
+# ANN index settings. More probed lists means higher recall and slower searches.
+ANN_INDEX_PATH = os.environ.get(
+    "ANN_INDEX_PATH", os.path.join(os.path.dirname(__file__), "..", "search_index", "ivf_index.npz"))
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "8"))
+ANN_N_LISTS = int(os.environ["ANN_N_LISTS"]) if os.environ.get("ANN_N_LISTS") else None
+
+# Quantized first-pass scan for the local/ann backends ("none", "float16" or "int8").
+# The top match_count * SEARCH_RESCORE_FACTOR candidates are rescored with the
+# full-precision vectors, which are then memory-mapped from SEARCH_VECTORS_PATH
+# instead of kept in RAM.
+SEARCH_QUANTIZATION = os.environ.get("SEARCH_QUANTIZATION", "none").lower()
+SEARCH_RESCORE_FACTOR = int(os.environ.get("SEARCH_RESCORE_FACTOR", "4"))
+SEARCH_VECTORS_PATH = os.environ.get(
+    "SEARCH_VECTORS_PATH", os.path.join(os.path.dirname(__file__), "..", "search_index", "embeddings_f32.npy"))
+# Text columns indexed for lexical (BM25) search
+LEXICAL_FIELDS = ("titel", "titelkort", "resume", "sagstrin_titel")
+
+# Candidates slightly below the threshold are rescored too, since approximate
+# scores can be off by a little in either direction
+QUANTIZATION_MARGIN = 0.05
+
+
+class SearchBackend:
+    """Interface for similarity search over the votings table."""
+    name = "base"
+
+    async def search(self, query_text: str, embedding: List[float], match_count: int, match_threshold: float) -> List[Dict[str, Any]]:
+        """Return up to match_count rows with similarity above match_threshold, best first."""
+        raise NotImplementedError
+
+    def warm_up(self):
+        """Prepare the backend before the first request (optional)."""
+
+    def on_data_version_changed(self, data_version: Optional[str]):
+        """Called when the import job has written new data (optional)."""
+
+
+class SupabaseRpcSearchBackend(SearchBackend):
+    """Runs the search in Postgres through the fetch_similar_items_v2 RPC."""
+    name = "rpc"
+
+    async def search(self, query_text, embedding, match_count, match_threshold):
+        params = {
+            "query_text": query_text,
+            "query_embedding": embedding,
+            "match_count": match_count,
+            "match_threshold": match_threshold,
+        }
+        response = await fetch_similar_items(params)
+        return response.data
+
+
+def load_search_rows(include_embeddings: bool = True, page_size: int = LOCAL_SEARCH_PAGE_SIZE) -> List[Dict[str, Any]]:
+    """Every row of the search table, fetched page by page."""
+    rows = []
+    offset = 0
+    while True:
+        page = fetch_search_rows_page(offset, page_size, include_embeddings).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+        offset += page_size
+    return rows
+
+
+def parse_embedding(value) -> np.ndarray:
+    # pgvector columns come back from PostgREST as a '[0.1,0.2,...]' string
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+class SearchCorpus:
+    """Snapshot of the search table: row metadata plus a contiguous, L2-normalized float32 matrix."""
+
+    def __init__(self, rows: List[Dict[str, Any]], matrix: np.ndarray):
+        self.rows = rows
+        self.matrix = matrix
+        # Set by backends that search through an ANN index
+        self.index: Optional[IVFIndex] = None
+        # Set when a quantized copy is used for the first-pass scan
+        self.quantized: Optional[QuantizedMatrix] = None
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "SearchCorpus":
+        rows = [row for row in rows if row.get(EMBEDDING_COLUMN) is not None]
+        if not rows:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+
+        matrix = np.empty((len(rows), len(parse_embedding(rows[0][EMBEDDING_COLUMN]))), dtype=np.float32)
+        for i, row in enumerate(rows):
+            matrix[i] = parse_embedding(row.pop(EMBEDDING_COLUMN))
+
+        return cls(rows, normalize_rows(matrix))
+
+    @classmethod
+    def load_from_supabase(cls, page_size: int = LOCAL_SEARCH_PAGE_SIZE) -> "SearchCorpus":
+        return cls.from_rows(load_search_rows(page_size=page_size))
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def top_k_above_threshold(scores: np.ndarray, match_count: int, match_threshold: float) -> np.ndarray:
+    """Indices of the match_count highest scores above match_threshold, best first."""
+    candidates = np.flatnonzero(scores > match_threshold)
+    if len(candidates) > match_count:
+        # Partial sort: only the top match_count need to be ordered
+        top = np.argpartition(-scores[candidates], match_count - 1)[:match_count]
+        candidates = candidates[top]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def normalize_query_vector(embedding) -> np.ndarray:
+    query = np.asarray(embedding, dtype=np.float32)
+    return query / (np.linalg.norm(query) or 1.0)
+
+
+def rank_rows(corpus: SearchCorpus, query: np.ndarray, match_count: int, match_threshold: float,
+              ids: Optional[np.ndarray] = None):
+    """
+    Score the corpus (or only the given row ids) against a normalized query.
+
+    Returns (row ids, exact cosine scores) for the best match_count rows above
+    match_threshold. With a quantized corpus the scan uses the compact copy and
+    only the best candidates are rescored at full precision.
+    """
+    if corpus.quantized is not None:
+        approx = corpus.quantized.scores(query, ids)
+        keep = top_k_above_threshold(approx, match_count * SEARCH_RESCORE_FACTOR, match_threshold - QUANTIZATION_MARGIN)
+        # Sorted ids read the memory-mapped vectors front to back
+        ids = np.sort(keep if ids is None else ids[keep])
+
+    scores = corpus.matrix @ query if ids is None else corpus.matrix[ids] @ query
+    top = top_k_above_threshold(scores, match_count, match_threshold)
+    return (top if ids is None else ids[top]), scores[top]
+
+
+def quantize_corpus(corpus: SearchCorpus, kind: str, vectors_path: str) -> SearchCorpus:
+    """Attach a quantized copy and move the full-precision vectors to a memory-mapped file."""
+    if kind == "none" or len(corpus) == 0:
+        return corpus
+    if kind not in QUANTIZATION_KINDS:
+        raise RuntimeError(f"Unknown SEARCH_QUANTIZATION '{kind}', expected one of {QUANTIZATION_KINDS}")
+
+    corpus.quantized = QuantizedMatrix.from_matrix(corpus.matrix, kind)
+    try:
+        os.makedirs(os.path.dirname(vectors_path) or ".", exist_ok=True)
+        tmp_path = f"{vectors_path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, corpus.matrix)
+        os.replace(tmp_path, vectors_path)
+        corpus.matrix = np.load(vectors_path, mmap_mode="r")
+    except OSError as e:
+        logger.warning(f"Could not memory-map full-precision vectors, keeping them in RAM: {e}")
+
+    logger.info(f"Quantized search corpus to {kind}: {corpus.quantized.nbytes / 1e6:.1f} MB in RAM")
+    return corpus
+
+
+class LocalVectorSearchBackend(SearchBackend):
+    """
+    Exact cosine search over an in-memory copy of the table.
+
+    The corpus is loaded from Supabase on first use and reloaded in the
+    background when the data version changes; searches keep using the old
+    snapshot until the new one is ready.
+    """
+    name = "local"
+
+    def __init__(self, loader=SearchCorpus.load_from_supabase, quantization: str = SEARCH_QUANTIZATION,
+                 vectors_path: str = SEARCH_VECTORS_PATH):
+        self._loader = loader
+        self.quantization = quantization
+        self.vectors_path = vectors_path
+        self._corpus: Optional[SearchCorpus] = None
+        self._lock = threading.Lock()
+        # Called with the new corpus after every (re)load
+        self.load_listeners = []
+
+    @property
+    def corpus(self) -> SearchCorpus:
+        if self._corpus is None:
+            with self._lock:
+                if self._corpus is None:
+                    self._corpus = self._load()
+        return self._corpus
+
+    def _load(self) -> SearchCorpus:
+        started = time.perf_counter()
+        corpus = self._loader()
+        logger.info(f"Local search corpus loaded: {len(corpus)} rows in {time.perf_counter() - started:.2f}s")
+        corpus = quantize_corpus(corpus, self.quantization, self.vectors_path)
+        for listener in self.load_listeners:
+            listener(corpus)
+        return corpus
+
+    def _reload(self):
+        try:
+            corpus = self._load()
+        except Exception as e:
+            logger.warning(f"Reloading local search corpus failed, keeping the old one: {e}")
+            return
+        self._corpus = corpus
+
+    def warm_up(self):
+        self.corpus
+
+    def on_data_version_changed(self, data_version):
+        if self._corpus is not None:
+            threading.Thread(target=self._reload, name="search-corpus-reload", daemon=True).start()
+
+    async def search(self, query_text, embedding, match_count, match_threshold):
+        # NumPy releases the GIL, so the scan runs in the thread pool
+        return await run_in_threadpool(self.search_sync, query_text, embedding, match_count, match_threshold)
+
+    def search_sync(self, query_text, embedding, match_count, match_threshold):
+        corpus = self.corpus
+        if len(corpus) == 0:
+            return []
+
+        ids, scores = rank_rows(corpus, normalize_query_vector(embedding), match_count, match_threshold)
+
+        return [
+            {**corpus.rows[i], "similarity": float(score)}
+            for i, score in zip(ids, scores)
+        ]
+
+
+class AnnSearchBackend(LocalVectorSearchBackend):
+    """
+    Approximate cosine search through an IVF index over the in-memory corpus.
+
+    The index is saved to ANN_INDEX_PATH and reused at startup as long as it was
+    built from exactly the same rows; otherwise it is rebuilt from the stored
+    embeddings and saved again.
+    """
+    name = "ann"
+
+    def __init__(self, loader=SearchCorpus.load_from_supabase, index_path: str = ANN_INDEX_PATH,
+                 nprobe: int = ANN_NPROBE, n_lists: Optional[int] = ANN_N_LISTS, **kwargs):
+        super().__init__(loader, **kwargs)
+        self.index_path = index_path
+        self.nprobe = nprobe
+        self.n_lists = n_lists
+
+    def _load(self) -> SearchCorpus:
+        corpus = super()._load()
+        corpus.index = self._load_or_build_index(corpus)
+        return corpus
+
+    def _load_or_build_index(self, corpus: SearchCorpus) -> IVFIndex:
+        fingerprint = matrix_fingerprint(corpus.matrix, [row.get("afstemning_id") for row in corpus.rows])
+
+        if os.path.exists(self.index_path):
+            try:
+                index = IVFIndex.load(self.index_path)
+                if index.fingerprint == fingerprint:
+                    logger.info(f"Loaded ANN index with {index.n_lists} lists from {self.index_path}")
+                    return index
+                logger.info("ANN index on disk is out of date, rebuilding")
+            except Exception as e:
+                logger.warning(f"Could not load ANN index, rebuilding: {e}")
+
+        started = time.perf_counter()
+        index = IVFIndex.build(corpus.matrix, n_lists=self.n_lists, fingerprint=fingerprint)
+        logger.info(f"Built ANN index with {index.n_lists} lists in {time.perf_counter() - started:.2f}s")
+        try:
+            index.save(self.index_path)
+        except OSError as e:
+            logger.warning(f"Could not save ANN index to {self.index_path}: {e}")
+        return index
+
+    def search_sync(self, query_text, embedding, match_count, match_threshold, nprobe: Optional[int] = None):
+        corpus = self.corpus
+        if len(corpus) == 0:
+            return []
+
+        query = normalize_query_vector(embedding)
+        candidates = corpus.index.candidates(query, nprobe or self.nprobe)
+        ids, scores = rank_rows(corpus, query, match_count, match_threshold, ids=candidates)
+
+        return [
+            {**corpus.rows[i], "similarity": float(score)}
+            for i, score in zip(ids, scores)
+        ]
+
+
+def lexical_document(row: Dict[str, Any]) -> str:
+    return " ".join(str(row.get(field) or "") for field in LEXICAL_FIELDS)
+
+
+class LexicalSearchIndex:
+    """
+    BM25 index over the text columns of the search table.
+
+    Loads its own copy of the rows (without embeddings), or follows the local
+    backend's corpus when one is in use so the rows are only held once.
+    """
+
+    def __init__(self, row_loader=lambda: load_search_rows(include_embeddings=False), follows_backend: bool = False):
+        self._row_loader = row_loader
+        self.follows_backend = follows_backend
+        self._state = None
+        self._lock = threading.Lock()
+
+    def _build(self, rows):
+        started = time.perf_counter()
+        index = BM25Index.build([lexical_document(row) for row in rows])
+        logger.info(f"BM25 index built over {len(rows)} rows in {time.perf_counter() - started:.2f}s")
+        return rows, index
+
+    @property
+    def state(self):
+        if self._state is None:
+            with self._lock:
+                if self._state is None:
+                    rows = self._row_loader()
+                    # Loading the backend corpus may already have rebuilt this index
+                    if self._state is None:
+                        self._state = self._build(rows)
+        return self._state
+
+    def rebuild(self, rows=None):
+        try:
+            self._state = self._build(rows if rows is not None else self._row_loader())
+        except Exception as e:
+            logger.warning(f"Rebuilding BM25 index failed, keeping the old one: {e}")
+
+    def warm_up(self):
+        self.state
+
+    def on_data_version_changed(self, data_version):
+        # When following the backend, the backend's reload rebuilds this index
+        if self._state is not None and not self.follows_backend:
+            threading.Thread(target=self.rebuild, name="bm25-reload", daemon=True).start()
+
+    def search_sync(self, query_text: str, match_count: int) -> List[Dict[str, Any]]:
+        rows, index = self.state
+        ids, scores = index.search(query_text, match_count)
+        return [{**rows[i], "bm25_score": float(score)} for i, score in zip(ids, scores)]
+
+    async def search(self, query_text: str, match_count: int) -> List[Dict[str, Any]]:
+        return await run_in_threadpool(self.search_sync, query_text, match_count)
+
+
+@lru_cache(maxsize=1)
+def get_lexical_index() -> LexicalSearchIndex:
+    backend = get_search_backend()
+    if isinstance(backend, LocalVectorSearchBackend):
+        lexical_index = LexicalSearchIndex(lambda: backend.corpus.rows, follows_backend=True)
+        backend.load_listeners.append(lambda corpus: lexical_index.rebuild(corpus.rows))
+        return lexical_index
+    return LexicalSearchIndex()
+
+
+@lru_cache(maxsize=1)
+def get_search_backend() -> SearchBackend:
+    backends = {
+        "rpc": SupabaseRpcSearchBackend,
+        "local": LocalVectorSearchBackend,
+        "ann": AnnSearchBackend,
+    }
+    if SEARCH_BACKEND not in backends:
+        raise RuntimeError(f"Unknown SEARCH_BACKEND '{SEARCH_BACKEND}', expected one of {sorted(backends)}")
+    logger.info(f"Using '{SEARCH_BACKEND}' search backend")
+    return backends[SEARCH_BACKEND]()
@@ -1,6 +1,35 @@
-from folketingetApi.util.supabase_client_creator import get_supabase_client
+from folketingetApi.util.supabase_client_creator import get_supabase_client, get_async_supabase_client
 
-supabase = get_supabase_client()
+SEARCH_TABLE = "afstemninger_bert_v2"
+# One row per table, bumped by import_data.py after each successful import
+DATA_VERSION_TABLE = "data_versions"  # supabase/migrations/20251001000000_create_data_versions.sql
+# Columns returned to the app. Mirrors what fetch_similar_items_v2 returns (every
+# column written by import_data.py except the vector itself, plus 'similarity').
+RESULT_COLUMNS = [
+    "afstemning_id", "sag_id", "titel", "titelkort", "resume", "konklusion",
+    "afstemning_dato", "sagstrin_titel", "vedtaget", "type_id", "opdateringsdato",
+    "embedding_text",
+]
+EMBEDDING_COLUMN = "embedding_v5"
 
-def fetch_similar_items(params):
-    return supabase.rpc("fetch_similar_items_v2", params).execute
\ No newline at end of file
+async def fetch_similar_items(params):
+    client = await get_async_supabase_client()
+    return await client.rpc("fetch_similar_items_v2", params).execute()
+
+async def fetch_data_version():
+    client = await get_async_supabase_client()
+    return await client.table(DATA_VERSION_TABLE).select("version").eq("table_name", SEARCH_TABLE).limit(1).execute()
+
+def fetch_search_rows_page(offset, limit, include_embeddings=True):
+    """One page of the search table (optionally with the stored embeddings), in a stable order.
+    Runs in a loader thread at startup or after an import, never per request."""
+    # Looked up per call so a worker forked after preloading gets its own connection pool
+    supabase = get_supabase_client()
+    columns = ",".join(RESULT_COLUMNS + ([EMBEDDING_COLUMN] if include_embeddings else []))
+    return (
+        supabase.table(SEARCH_TABLE)
+        .select(columns)
+        .order("afstemning_id")
+        .range(offset, offset + limit - 1)
+        .execute()
+    )
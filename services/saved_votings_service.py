@@ -7,11 +7,11 @@ class VoteRequest(BaseModel):
 def get_uid_from_token(token):
     return token.split(" ")[1]
 
-def save_user_voting(params):
-    return save_user_voting_db(params)
+async def save_user_voting(params):
+    return await save_user_voting_db(params)
 
-def fetch_user_saved_votings(params):
-    return fetch_user_saved_votings_db(params)
+async def fetch_user_saved_votings(params):
+    return await fetch_user_saved_votings_db(params)
 
-def delete_user_saved_voting(params):
-    return delete_user_saved_voting_db(params)
\ No newline at end of file
+async def delete_user_saved_voting(params):
+    return await delete_user_saved_voting_db(params)
@@ -1,29 +1,174 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+import unicodedata
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Optional, List, Callable, Tuple, Iterator, TYPE_CHECKING
 from starlette.concurrency import run_in_threadpool
 from fastapi import HTTPException
-from sentence_transformers import SentenceTransformer
-from folketingetApi.repositories.search_repository import fetch_similar_items
+from folketingetApi.repositories.search_repository import RESULT_COLUMNS, fetch_data_version
+from folketingetApi.repositories.search_backends import get_search_backend, get_lexical_index, SEARCH_BACKEND
+from folketingetApi.util.bm25 import is_case_number_query, tokenize_danish
+from folketingetApi.util.cache import LRUTTLCache, SQLiteVectorCache
+from folketingetApi.util.admission import AdmissionController, AdmissionRejected
+from folketingetApi.util.embedding_backends import load_encoder, set_torch_threads
+from folketingetApi.util.embedding_sidecar import connect_embedding_server
+from folketingetApi.util.metrics import Histogram, CallbackMetric
+from folketingetApi.util.model_artifacts import MODEL_PATH, ensure_model_artifacts, model_version
 from typing import Dict, Any
+import numpy as np
 
-MODEL_PATH = "folketingetApi/embedding_model/danishbert-cosine-embeddings"
-model: Optional[SentenceTransformer] = None
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# torch, torch-int8, onnx or onnx-int8 (see util/embedding_backends.py)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch").lower()
+MODEL_VERSION = model_version()
+model: Optional["SentenceTransformer"] = None
+
+# "background" loads the model in a thread so the server accepts connections
+# (and answers /ready with 503) while it loads; "eager" blocks startup instead;
+# "preload" loads it while the app is imported, before gunicorn forks workers.
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "background").lower()
+STARTUP_RETRY_AFTER_SECONDS = 5
+
+# Encode in embedding_server.py over this Unix socket instead of loading the model
+# in every API worker. The workers then never import torch.
+EMBEDDING_SERVER_SOCKET = os.environ.get("EMBEDDING_SERVER_SOCKET")
+EMBEDDING_SERVER_WAIT_SECONDS = float(os.environ.get("EMBEDDING_SERVER_WAIT_SECONDS", "120"))
+
+# Startup progress reported by /ready: status is starting, ready or failed
+startup_state: Dict[str, Any] = {"status": "starting", "error": None, "timings_ms": {}}
+
+# --- Metrics (served on /metrics) ---
+
+# tokenize, forward, embedding_server, encode_queue, embed, lexical, search_<backend>, serialize
+search_stage_seconds = Histogram("search_stage_seconds", "Time spent in each stage of a search.", ["stage"])
+encode_batch_size = Histogram("encode_batch_size", "Texts per model.encode call.",
+                              buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+search_result_count = Histogram("search_result_count", "Rows returned by a search.",
+                                buckets=(0, 1, 10, 50, 100, 250, 500, 1000, 5000))
+_tokenize_time = threading.local()
+
+# Micro-batching of query embeddings. Concurrent /search requests are collected for
+# at most EMBED_BATCH_WINDOW_MS (or until EMBED_MAX_BATCH_SIZE queries are waiting)
+# and encoded together in one forward pass instead of one pass per request.
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH_SIZE = int(os.environ.get("EMBED_MAX_BATCH_SIZE", "32"))
+
+# Admission control for queries that need the model. ENCODE_MAX_CONCURRENCY
+# queries are encoded at a time (one full batch by default), ENCODE_MAX_QUEUE
+# more may wait up to ENCODE_DEADLINE_MS; beyond that requests fail fast with
+# 429/503 and Retry-After instead of slowing every request down.
+ENCODE_MAX_CONCURRENCY = int(os.environ.get("ENCODE_MAX_CONCURRENCY", str(EMBED_MAX_BATCH_SIZE)))
+ENCODE_MAX_QUEUE = int(os.environ.get("ENCODE_MAX_QUEUE", "128"))
+ENCODE_DEADLINE_MS = float(os.environ.get("ENCODE_DEADLINE_MS", "2000"))
+# The batcher runs one forward pass at a time per worker, so each worker gets an
+# equal share of the cores instead of every worker starting one thread per core.
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", "0")) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+# Query-embedding cache. ~3 KB per 768-dim float32 vector, so the default
+# 10k entries stays around 30 MB per worker. EMBEDDING_CACHE_PATH enables an
+# optional SQLite tier that all uvicorn workers on the host share.
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.environ.get("EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH")
+
+# Search-result cache. The search table only changes when import_data.py runs,
+# so results are kept until the data-version marker it writes changes. The
+# marker is re-read at most every DATA_VERSION_POLL_SECONDS; the TTL is only a
+# safety net in case the marker cannot be read.
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "128"))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "3600"))
+DATA_VERSION_POLL_SECONDS = float(os.environ.get("DATA_VERSION_POLL_SECONDS", "60"))
+
+# Cursor pagination. The ranked result list is kept this long after the first page.
+SEARCH_CURSOR_TTL_SECONDS = float(os.environ.get("SEARCH_CURSOR_TTL_SECONDS", "300"))
+SEARCH_CURSOR_MAX_ENTRIES = int(os.environ.get("SEARCH_CURSOR_MAX_ENTRIES", "1000"))
+NDJSON_ROWS_PER_CHUNK = 50
+
+# Fields a client can ask for with `fields`: the table columns plus the scores the search adds
+SEARCH_RESULT_FIELDS = RESULT_COLUMNS + ["similarity", "bm25_score", "rrf_score"]
+# orjson writes numpy values and non-string keys; anything else unknown goes through str()
+JSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Hybrid search: BM25 over titel/titelkort/resume/sagstrin_titel fused with the
+# vector results by reciprocal-rank fusion. Queries of at most
+# HYBRID_LEXICAL_ONLY_MAX_TOKENS plain words with lexical hits skip the model.
+HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "0") == "1"
+HYBRID_LEXICAL_ONLY_MAX_TOKENS = int(os.environ.get("HYBRID_LEXICAL_ONLY_MAX_TOKENS", "2"))
+RRF_K = 60
 
 # --- Pydantic Models ---
 
+def record_startup_phase(phase: str, started: float):
+    """Store how long a startup phase took, measured from a time.perf_counter() value."""
+    startup_state["timings_ms"][phase] = round((time.perf_counter() - started) * 1000, 1)
+
+
 def startup_event():
-    """Load the Sentence Transformer model on app startup."""
+    """Verify the model files, load the model and warm up the search backend."""
     global model
-    print("Running script...")
-    print(f"Loading SentenceTransformer model from: {MODEL_PATH}...")
+    started = time.perf_counter()
     try:
-        model = SentenceTransformer(MODEL_PATH)
-        total_params = sum(p.numel() for p in model.parameters())
-        print(f"Model loaded with {total_params} parameters.")
-        print(f"Deployed via workflow file")
+        if EMBEDDING_SERVER_SOCKET:
+            logger.info(f"Connecting to the embedding server at {EMBEDDING_SERVER_SOCKET}...")
+            phase_started = time.perf_counter()
+            model = connect_embedding_server(EMBEDDING_SERVER_SOCKET, MODEL_VERSION, INFERENCE_BACKEND,
+                                             EMBEDDING_SERVER_WAIT_SECONDS)
+            record_startup_phase("connect_embedding_server", phase_started)
+        else:
+            logger.info(f"Loading SentenceTransformer model from: {MODEL_PATH} ({INFERENCE_BACKEND} backend)...")
+            phase_started = time.perf_counter()
+            model_path = ensure_model_artifacts()
+            record_startup_phase("verify_artifacts", phase_started)
+
+            phase_started = time.perf_counter()
+            set_torch_threads(TORCH_NUM_THREADS)
+            loaded_model = instrument_model(load_encoder(model_path, INFERENCE_BACKEND))
+            record_startup_phase("load_model", phase_started)
+            total_params = sum(p.numel() for p in loaded_model.parameters())
+            logger.info(f"Model loaded with {total_params} parameters.")
+            model = loaded_model
+
+        phase_started = time.perf_counter()
+        get_search_backend().warm_up()
+        record_startup_phase("warm_up_search_backend", phase_started)
+        if HYBRID_SEARCH:
+            phase_started = time.perf_counter()
+            get_lexical_index().warm_up()
+            record_startup_phase("warm_up_lexical_index", phase_started)
     except Exception as e:
-        print(f"Error loading model: {e}")
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
+        logger.exception("Error loading model")
         raise
+    finally:
+        record_startup_phase("total", started)
+
+    startup_state["status"] = "ready"
+    logger.info("Startup finished", extra={"timings_ms": startup_state["timings_ms"]})
+
+
+def start_background_startup() -> threading.Thread:
+    """Run startup_event in a daemon thread; failures are reported through /ready."""
+    def run():
+        try:
+            startup_event()
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=run, name="model-loader", daemon=True)
+    thread.start()
+    return thread
 
 class SearchRequest(BaseModel):
     """Schema for the incoming search request."""
@@ -34,39 +179,460 @@ class SearchRequest(BaseModel):
     match_count: Optional[int] = Field(
         None, description="The maximum number of similar items to return. If no explicit value is specified, will return all above match_threshold")
     match_threshold: float = Field(
-        0.5, description="The minimum similarity score for a match.")
+        0.5, description="The minimum similarity score for a match. Not applied to keyword-only results (see SearchResult.similarity).")
+    page_size: Optional[int] = Field(
+        None, gt=0, description="Return results in pages of this size. The cursor for the next page is sent in the X-Next-Cursor header.")
+    cursor: Optional[str] = Field(
+        None, description="Cursor from a previous X-Next-Cursor header. Continues that search instead of running a new one.")
+    stream: bool = Field(
+        False, description="Stream all results as newline-delimited JSON (application/x-ndjson).")
+    fields: Optional[List[str]] = Field(
+        None, description="Only return these fields of each result, e.g. [\"afstemning_id\", \"titel\", \"similarity\"].")
+
+    @field_validator("fields")
+    @classmethod
+    def check_fields(cls, fields: Optional[List[str]]) -> Optional[List[str]]:
+        unknown = sorted(set(fields or []) - set(SEARCH_RESULT_FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}, expected some of {SEARCH_RESULT_FIELDS}")
+        return fields
+
+
+class SearchResult(BaseModel):
+    """
+    Schema of one search result: the afstemninger columns plus the scores.
+
+    Only documents the response; rows are returned as-is and may hold any of SEARCH_RESULT_FIELDS.
+    """
+    model_config = ConfigDict(extra="allow")
+
+    afstemning_id: Optional[int] = None
+    titel: Optional[str] = None
+    similarity: Optional[float] = Field(
+        None, description="Cosine similarity to the query. null when the row was found by keyword (BM25) search "
+                          "alone, i.e. a short keyword query or bill number with HYBRID_SEARCH on; "
+                          "match_threshold is not applied to those rows, rank them by bm25_score instead.")
+    bm25_score: Optional[float] = Field(
+        None, description="BM25 keyword score, present when HYBRID_SEARCH is on and the row matched the keywords.")
+    rrf_score: Optional[float] = Field(
+        None, description="Reciprocal-rank fusion score of the vector and keyword rankings (hybrid search).")
+
+# --- Query Embedding (Batched) ---
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent embedding requests and encodes them in a single call.
+
+    The first queued text opens a batch window; everything that arrives before the
+    window closes (or until max_batch_size is reached) is encoded together in the
+    thread pool, and each caller's future is resolved with its own vector.
+    Under light load a query waits at most window_ms before being encoded.
+    """
+
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int, window_ms: float):
+        self._encode_fn = encode_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def encode(self, text: str) -> np.ndarray:
+        """Queue a text for the next batch and wait for its embedding."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        # (Re)start the worker if it is not running on the current event loop
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                # Window closed, but take anything that is already waiting
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            # Callers that gave up (e.g. client disconnected) are dropped from the batch
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            # Identical queries in the same window are only encoded once
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+
+            try:
+                embeddings = await run_in_threadpool(self._encode_fn, unique_texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            vectors = dict(zip(unique_texts, embeddings))
+            for text, future in batch:
+                if not future.done():
+                    future.set_result(vectors[text])
+
+
+def instrument_model(loaded_model):
+    """Time the tokenizer separately so encode_texts can report tokenize and forward apart."""
+    tokenize = getattr(loaded_model, "tokenize", None)
+    if tokenize is None:
+        return loaded_model
+
+    def timed_tokenize(texts):
+        started = time.perf_counter()
+        try:
+            return tokenize(texts)
+        finally:
+            _tokenize_time.seconds = getattr(_tokenize_time, "seconds", 0.0) + time.perf_counter() - started
+
+    loaded_model.tokenize = timed_tokenize
+    return loaded_model
+
+
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """Encode a batch of texts with the loaded model or the embedding server (run in a thread)."""
+    _tokenize_time.seconds = 0.0
+    started = time.perf_counter()
+    embeddings = get_model().encode(texts, batch_size=len(texts))
+    elapsed = time.perf_counter() - started
+
+    encode_batch_size.observe(len(texts))
+    if EMBEDDING_SERVER_SOCKET:
+        search_stage_seconds.observe(elapsed, "embedding_server")
+    else:
+        search_stage_seconds.observe(_tokenize_time.seconds, "tokenize")
+        search_stage_seconds.observe(elapsed - _tokenize_time.seconds, "forward")
+    return embeddings
+
+
+embedding_batcher = EmbeddingBatcher(
+    encode_texts,
+    max_batch_size=EMBED_MAX_BATCH_SIZE,
+    window_ms=EMBED_BATCH_WINDOW_MS,
+)
+
+encode_admission = AdmissionController(ENCODE_MAX_CONCURRENCY, ENCODE_MAX_QUEUE, ENCODE_DEADLINE_MS / 1000)
+
+
+embedding_cache = LRUTTLCache(EMBEDDING_CACHE_MAX_ENTRIES, EMBEDDING_CACHE_TTL_SECONDS)
+embedding_disk_cache: Optional[SQLiteVectorCache] = (
+    SQLiteVectorCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES * 10, EMBEDDING_CACHE_TTL_SECONDS)
+    if EMBEDDING_CACHE_PATH else None
+)
+
+
+def normalize_query(query_text: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    text = " ".join(unicodedata.normalize("NFKC", query_text).split())
+    # Only fold case when the tokenizer lowercases anyway, so a cached vector
+    # is always identical to what the model would have produced.
+    tokenizer = getattr(model, "tokenizer", None)
+    if getattr(tokenizer, "do_lower_case", False):
+        text = text.lower()
+    return text
+
+
+def embedding_cache_key(query_text: str) -> str:
+    """Cache key from the normalized query text and the model identity."""
+    # Backends differ in the last decimals, so they do not share entries
+    return f"{MODEL_VERSION}:{INFERENCE_BACKEND}\x00{normalize_query(query_text)}"
+
+
+async def embed_query(query_text: str) -> List[float]:
+    """Embed a single search query, served from cache when possible."""
+    with search_stage_seconds.time("embed"):
+        return await _embed_query(query_text)
+
+
+async def _embed_query(query_text: str) -> List[float]:
+    key = embedding_cache_key(query_text)
+    disk_key = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    embedding = embedding_cache.get(key)
+    if embedding is None and embedding_disk_cache is not None:
+        embedding = embedding_disk_cache.get(disk_key)
+        if embedding is not None:
+            embedding_cache.set(key, embedding)
+
+    if embedding is None:
+        # Only cache misses need the model, so only they count against the limit
+        try:
+            queued = time.perf_counter()
+            async with encode_admission.slot():
+                search_stage_seconds.observe(time.perf_counter() - queued, "encode_queue")
+                embedding = np.asarray(await embedding_batcher.encode(query_text), dtype=np.float32)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail,
+                                headers={"Retry-After": str(e.retry_after)})
+        # Cached vectors are shared between requests, so make them immutable
+        embedding.setflags(write=False)
+        embedding_cache.set(key, embedding)
+        if embedding_disk_cache is not None:
+            embedding_disk_cache.set(disk_key, embedding)
 
-# --- Supabase Search Function (Async) ---
+    return embedding.tolist()
 
-async def fetch_similar_items_from_supabase(query_text: str, embedding: List[float], match_count: int, match_threshold: float) -> List[Dict[str, Any]]:
+
+def encoding_stats() -> Dict[str, Any]:
+    """Admission queue depth and wait times for the encode path."""
+    return {**encode_admission.stats(), "torch_threads": None if EMBEDDING_SERVER_SOCKET else TORCH_NUM_THREADS}
+
+
+def embedding_cache_stats() -> Dict[str, Any]:
+    stats = {"memory": embedding_cache.stats()}
+    if embedding_disk_cache is not None:
+        stats["disk"] = embedding_disk_cache.stats()
+    return stats
+
+# --- Search Result Cache ---
+
+search_result_cache = LRUTTLCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+_data_version: Optional[str] = None
+_data_version_checked_at: float = 0.0
+_data_version_lock: Optional[asyncio.Lock] = None
+
+
+async def get_data_version() -> Optional[str]:
     """
-    Connects to Supabase and calls the 'fetch_similar_items' RPC function.
+    Return the current data version of the search table.
+
+    The marker is polled at most every DATA_VERSION_POLL_SECONDS. When it changes,
+    every cached search result is dropped.
     """
+    global _data_version, _data_version_checked_at, _data_version_lock
+
+    loop = asyncio.get_running_loop()
+    if loop.time() - _data_version_checked_at < DATA_VERSION_POLL_SECONDS:
+        return _data_version
+
+    if _data_version_lock is None:
+        _data_version_lock = asyncio.Lock()
+
+    async with _data_version_lock:
+        # Another request may have refreshed it while we waited for the lock
+        if loop.time() - _data_version_checked_at < DATA_VERSION_POLL_SECONDS:
+            return _data_version
+        try:
+            response = await fetch_data_version()
+            version = response.data[0]["version"] if response.data else None
+        except Exception as e:
+            logger.warning(f"Could not read data version, keeping {_data_version}: {e}")
+            version = _data_version
+
+        if version != _data_version:
+            logger.info(f"Data version changed from {_data_version} to {version}. Clearing search result cache.")
+            search_result_cache.clear()
+            # The first marker read at startup describes data the backend already has
+            if _data_version is not None:
+                get_search_backend().on_data_version_changed(version)
+                if HYBRID_SEARCH:
+                    get_lexical_index().on_data_version_changed(version)
+            _data_version = version
+        _data_version_checked_at = loop.time()
+
+    return _data_version
+
+
+def search_cache_key(query_text: str, match_count: int, match_threshold: float, data_version: Optional[str]):
+    return (normalize_query(query_text), match_count, match_threshold, data_version)
+
+
+async def get_cached_search_results(query_text: str, match_count: int, match_threshold: float) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+    """
+    Return cached results for this search (None on a miss) and the data version
+    they were looked up under. Pass that version to cache_search_results.
+    """
+    data_version = await get_data_version()
+    return search_result_cache.get(search_cache_key(query_text, match_count, match_threshold, data_version)), data_version
+
+
+def cache_search_results(query_text: str, match_count: int, match_threshold: float, results: List[Dict[str, Any]],
+                         data_version: Optional[str]):
+    # Stored under the version the lookup saw, not the latest one: if an import
+    # lands while the search is in flight, its rows may predate the new version
+    key = search_cache_key(query_text, match_count, match_threshold, data_version)
+    search_result_cache.set(key, results)
+
+# --- Pagination and Streaming ---
+
+# Maps a cursor token to the ranked result list of one search. The list is the
+# same object held by the result cache, so a cursor only costs a reference.
+search_cursor_cache = LRUTTLCache(SEARCH_CURSOR_MAX_ENTRIES, SEARCH_CURSOR_TTL_SECONDS)
+
+
+def paginate_search_results(results: List[Dict[str, Any]], page_size: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Slice one page out of a ranked result list.
+
+    Returns the page and the cursor for the next page (None on the last page).
+    A new cursor token is issued for the first page and reused for the rest.
+    """
+    token, offset = parse_search_cursor(cursor) if cursor else (None, 0)
+    if token is None and offset + page_size < len(results):
+        token = secrets.token_urlsafe(12)
+        search_cursor_cache.set(token, results)
+
+    page = results[offset:offset + page_size]
+    next_offset = offset + page_size
+    next_cursor = f"{token}.{next_offset}" if token and next_offset < len(results) else None
+    return page, next_cursor
+
+
+def parse_search_cursor(cursor: str) -> Tuple[str, int]:
     try:
-        # Parameters for the Supabase RPC function
-        params = {
-            "query_text": query_text,
-            "query_embedding": embedding,
-            "match_count": match_count,
-            "match_threshold": match_threshold,
-        }
-
-        response = await run_in_threadpool(
-            fetch_similar_items(params)
-        )
-        print(response)
-        print(response.data)
-        return response.data
-        # The data property contains the result from the RPC call. This will be returned to caller.
+        token, offset = cursor.rsplit(".", 1)
+        return token, max(0, int(offset))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed cursor.")
+
 
+def get_cursor_results(cursor: str) -> List[Dict[str, Any]]:
+    """The ranked result list a cursor points into."""
+    token, _ = parse_search_cursor(cursor)
+    results = search_cursor_cache.get(token)
+    if results is None:
+        raise HTTPException(status_code=410, detail="Cursor expired. Start the search again.")
+    return results
+
+
+def dumps_json(content: Any, option: int = 0) -> bytes:
+    """UTF-8 JSON bytes via orjson (several times faster than json.dumps on result rows)."""
+    return orjson.dumps(content, default=str, option=JSON_OPTIONS | option)
+
+
+def project_fields(results: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Keep only the requested fields of each row; all of them when fields is None."""
+    if not fields:
+        return results
+    return [{field: row[field] for field in fields if field in row} for row in results]
+
+
+def iter_ndjson(results: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """Serialize rows as newline-delimited JSON, a few rows per chunk."""
+    for start in range(0, len(results), NDJSON_ROWS_PER_CHUNK):
+        chunk = results[start:start + NDJSON_ROWS_PER_CHUNK]
+        yield b"".join(dumps_json(row, orjson.OPT_APPEND_NEWLINE) for row in chunk)
+
+# --- Hybrid (Lexical + Semantic) Search ---
+
+def is_keyword_query(query_text: str) -> bool:
+    """
+    Queries that BM25 alone answers well: a few plain words.
+
+    Case numbers ("L 123") always go through the vector search too: Sag.nummer
+    is not in the table, so BM25 can only match them where a text quotes them.
+    """
+    if is_case_number_query(query_text):
+        return False
+    words = query_text.split()
+    return 0 < len(words) <= HYBRID_LEXICAL_ONLY_MAX_TOKENS and len(tokenize_danish(query_text)) > 0
+
+
+async def lexical_search(query_text: str, match_count: int) -> List[Dict[str, Any]]:
+    """BM25 search over the text columns, best first."""
+    try:
+        with search_stage_seconds.time("lexical"):
+            return await get_lexical_index().search(query_text, match_count)
     except Exception as e:
-        print(f"Supabase RPC error: {e}")
+        # Lexical search is an extra signal, the vector search still answers
+        logger.warning(f"Lexical search error: {e}")
+        return []
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], match_count: int, k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked lists by summing 1 / (k + rank) per row.
+
+    Rows are matched on afstemning_id and keep the fields from every list they
+    appear in, so 'similarity' is None for rows found only by BM25.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    scores: Dict[Any, float] = {}
+    for results in result_lists:
+        for rank, row in enumerate(results):
+            row_id = row.get("afstemning_id")
+            fused[row_id] = {**fused.get(row_id, {"similarity": None}), **row}
+            scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (k + rank + 1)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:match_count]
+    return [{**fused[row_id], "rrf_score": scores[row_id]} for row_id in ranked]
+
+# --- Cache and Admission Metrics ---
+
+def _cache_stat(field: str) -> Dict[Tuple[str, ...], float]:
+    caches = {"embedding_memory": embedding_cache, "search_results": search_result_cache,
+              "search_cursors": search_cursor_cache}
+    if embedding_disk_cache is not None:
+        caches["embedding_disk"] = embedding_disk_cache
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    return {(name,): values[field] for name, values in stats.items() if field in values}
+
+
+CallbackMetric("cache_hits_total", "Cache lookups that found an entry.", lambda: _cache_stat("hits"),
+               ["cache"], kind="counter")
+CallbackMetric("cache_misses_total", "Cache lookups that found nothing.", lambda: _cache_stat("misses"),
+               ["cache"], kind="counter")
+CallbackMetric("cache_entries", "Entries currently held by each in-memory cache.", lambda: _cache_stat("entries"),
+               ["cache"])
+CallbackMetric("encode_queue_depth", "Queries waiting for an encode slot.",
+               lambda: {(): encode_admission.queue_depth})
+CallbackMetric("encode_in_flight", "Queries holding an encode slot.", lambda: {(): encode_admission.in_flight})
+CallbackMetric("encode_rejected_total", "Queries rejected by admission control.",
+               lambda: {("queue_full",): encode_admission.rejected_queue_full,
+                        ("deadline",): encode_admission.rejected_deadline},
+               ["reason"], kind="counter")
+
+# --- Search Function (Async) ---
+
+async def fetch_similar_items_from_backend(query_text: str, embedding: List[float], match_count: int, match_threshold: float) -> List[Dict[str, Any]]:
+    """
+    Runs the similarity search on the configured backend (SEARCH_BACKEND):
+    the Supabase 'fetch_similar_items_v2' RPC or the local in-memory index.
+    """
+    try:
+        backend = get_search_backend()
+        with search_stage_seconds.time(f"search_{SEARCH_BACKEND}"):
+            similar_items = await backend.search(query_text, embedding, match_count, match_threshold)
+        search_result_count.observe(len(similar_items))
+        return similar_items
+        # The result is a list of rows with a 'similarity' score. This will be returned to caller.
+
+    except Exception as e:
+        logger.exception("Similarity search error")
         raise HTTPException(
             status_code=500,
-            detail=f"An error occurred during Supabase similarity search: {str(e)}"
+            detail=f"An error occurred during similarity search: {str(e)}"
         )
 
 def get_model():
     if model is None:
-        raise RuntimeError("Model not loaded")
-    return model
\ No newline at end of file
+        # Still loading (or failed to load); tell clients when to try again
+        raise HTTPException(
+            status_code=503,
+            detail="Model is not loaded yet" if startup_state["status"] != "failed" else "Model failed to load",
+            headers={"Retry-After": str(STARTUP_RETRY_AFTER_SECONDS)},
+        )
+    return model
@@ -0,0 +1,14 @@
+-- Version marker per table, written by import_data.py after each import and
+-- polled by the search API (repositories/search_repository.py) to invalidate
+-- its result cache. table_name is the upsert key (on_conflict='table_name').
+create table if not exists public.data_versions (
+    table_name text primary key,
+    version text not null
+);
+
+-- The import writes with the service role key, which bypasses RLS; everyone may read
+alter table public.data_versions enable row level security;
+
+drop policy if exists "data_versions are readable" on public.data_versions;
+create policy "data_versions are readable" on public.data_versions
+    for select using (true);
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import folketingetApi.services.search_service as search_service
+from folketingetApi.util.admission import AdmissionController, AdmissionRejected
+
+
+async def hold(controller, release: asyncio.Event):
+    async with controller.slot():
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_immediately():
+    controller = AdmissionController(max_concurrency=1, max_queue=1, deadline_seconds=5)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(controller, release))
+    waiter = asyncio.create_task(hold(controller, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with controller.slot():
+            pass
+
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+    assert controller.stats()["queue_depth"] == 1
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert controller.stats()["admitted"] == 2
+    assert controller.stats()["rejected_queue_full"] == 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_past_their_deadline_are_rejected():
+    controller = AdmissionController(max_concurrency=1, max_queue=10, deadline_seconds=0.02)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(controller, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with controller.slot():
+            pass
+
+    assert rejected.value.status_code == 503
+    assert controller.stats()["queue_depth"] == 0
+    release.set()
+    await holder
+    assert controller.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_embed_query_turns_overload_into_retry_after(monkeypatch):
+    controller = AdmissionController(max_concurrency=1, max_queue=0, deadline_seconds=5)
+    monkeypatch.setattr(search_service, "encode_admission", controller)
+    search_service.embedding_cache.clear()
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(controller, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as rejected:
+        await search_service.embed_query("klimaforandringer")
+
+    assert rejected.value.status_code == 429
+    assert "Retry-After" in rejected.value.headers
+    release.set()
+    await holder
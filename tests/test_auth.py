@@ -6,14 +6,14 @@ from fastapi import HTTPException
 import folketingetApi.repositories.auth_repository as auth_repository
 from folketingetApi.controllers.auth import delete_user, sign_up_with_email, login
 from folketingetApi.services.auth_service import DeleteUserRequest, UserCredentials
-from supabase import create_client
+from supabase import acreate_client
 
 # Testing with overriding supabase client
-@pytest.fixture
-def supabase_admin():
+@pytest_asyncio.fixture
+async def supabase_admin():
     url = os.environ.get("SUPABASE_URL")
     service_role_key = os.environ.get("SUPABASE_KEY")
-    return create_client(url, service_role_key)
+    return await acreate_client(url, service_role_key)
 
 @pytest.fixture(scope="module")
 def shared_credentials():
@@ -25,8 +25,10 @@ def shared_credentials():
 @pytest.fixture(autouse=True)
 def override_supabase(monkeypatch, supabase_admin):
     # Replace the supabase client inside auth.py
+    async def get_admin_client():
+        return supabase_admin
 
-    monkeypatch.setattr(auth_repository, "supabase", supabase_admin)
+    monkeypatch.setattr(auth_repository, "get_auth_client", get_admin_client)
 
 # ----- Integration tests -----
 
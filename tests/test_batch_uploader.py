@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from folketingetApi.util.batch_uploader import (
+    FATAL,
+    RATE_LIMITED,
+    RETRY,
+    AdaptiveBatchSize,
+    BatchUploader,
+    classify_upload_error,
+)
+from folketingetApi.util.import_pipeline import run_import_pipeline
+
+
+class APIError(Exception):
+    """Shaped like postgrest's APIError."""
+
+    def __init__(self, code, message=""):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+async def chunks(rows, size=50):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def make_rows(count):
+    return [{"afstemning_id": i, "embedding_v5": [0.5] * 8} for i in range(count)]
+
+
+def uploader_for(upsert, **kwargs):
+    options = dict(concurrency=4, batch_size=20, min_batch_size=5, max_batch_size=200, rate_per_second=1000,
+                   backoff_seconds=0.001, max_retries=3)
+    options.update(kwargs)
+    return BatchUploader(upsert, **options)
+
+
+def test_errors_are_classified():
+    assert classify_upload_error(APIError(429)) == RATE_LIMITED
+    assert classify_upload_error(APIError(None, "API rate limit exceeded")) == RATE_LIMITED
+    assert classify_upload_error(APIError(503)) == RETRY
+    assert classify_upload_error(APIError("57014", "canceling statement due to statement timeout")) == RETRY
+    assert classify_upload_error(APIError("23502", "null value in column")) == FATAL
+
+
+@pytest.mark.asyncio
+async def test_batches_run_concurrently_and_commit_in_order():
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    uploaded, committed = [], []
+
+    def upsert(rows):
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.01 if rows[0]["afstemning_id"] % 40 else 0.05)  # Some batches finish late
+        with lock:
+            active["now"] -= 1
+            uploaded.extend(row["afstemning_id"] for row in rows)
+
+    uploader = uploader_for(upsert)
+    await uploader.upload_all(chunks(make_rows(400)), lambda rows, failed: committed.extend(
+        row["afstemning_id"] for row in rows))
+
+    assert sorted(uploaded) == list(range(400))
+    assert committed == list(range(400))
+    assert 1 < active["max"] <= 4
+
+
+@pytest.mark.asyncio
+async def test_rate_limits_are_retried_and_slow_down_the_bucket():
+    calls = {"count": 0}
+
+    def upsert(rows):
+        calls["count"] += 1
+        if calls["count"] <= 2:
+            raise APIError(429, "Too Many Requests")
+
+    uploader = uploader_for(upsert, concurrency=1)
+    await uploader.upload_all(chunks(make_rows(40)))
+
+    assert uploader.rows_uploaded == 40
+    assert uploader.bucket.throttled == 2
+    assert uploader.bucket.rate < uploader.bucket.max_rate
+
+
+@pytest.mark.asyncio
+async def test_bad_rows_are_isolated_into_the_dead_letter_file(tmp_path):
+    dead_letter = tmp_path / "dead.jsonl"
+    stored = []
+
+    def upsert(rows):
+        if any(row["afstemning_id"] == 13 for row in rows):
+            raise APIError("23502", "null value in column")
+        stored.extend(row["afstemning_id"] for row in rows)
+
+    uploader = uploader_for(upsert, dead_letter_path=str(dead_letter))
+    failures = []
+    await uploader.upload_all(chunks(make_rows(100)), lambda rows, failed: failures.append(failed))
+
+    assert sorted(stored) == [i for i in range(100) if i != 13]
+    assert sum(failures) == 1
+    lines = [json.loads(line) for line in dead_letter.read_text().splitlines()]
+    assert [line["row"]["afstemning_id"] for line in lines] == [13]
+
+    # The next run replays it
+    replayer = uploader_for(lambda rows: stored.extend(row["afstemning_id"] for row in rows),
+                            dead_letter_path=str(dead_letter))
+    assert await replayer.replay_dead_letters() == 1
+    assert stored[-1] == 13
+    assert not dead_letter.exists()
+
+
+@pytest.mark.asyncio
+async def test_retryable_errors_give_up_into_the_dead_letter_file(tmp_path):
+    def upsert(rows):
+        raise APIError(503, "Service Unavailable")
+
+    uploader = uploader_for(upsert, dead_letter_path=str(tmp_path / "dead.jsonl"), max_retries=2)
+    await uploader.upload_all(chunks(make_rows(10)))
+
+    assert uploader.rows_dead_lettered == 10
+    assert (uploader.requests, uploader.retries) == (3, 2)
+
+
+def test_batch_size_follows_latency_and_payload():
+    size = AdaptiveBatchSize(100, minimum=10, maximum=1000, max_bytes=100_000, target_seconds=1)
+    size.observe_latency(100, 0.1)
+    assert size.current() == 125
+    size.observe_latency(125, 3)
+    assert size.current() == 62
+    size.observe_rows(10, 50_000)  # 5 kB rows: 20 fit in max_bytes
+    assert size.current() == 20
+
+
+@pytest.mark.asyncio
+async def test_pipeline_counts_failed_rows_separately():
+    def upsert(rows):
+        if any(row["afstemning_id"] == 7 for row in rows):
+            raise APIError("22P02", "invalid input syntax")
+
+    async def pages():
+        yield [{"id": i} for i in range(30)]
+
+    stats = await run_import_pipeline(
+        pages(), lambda record: {"afstemning_id": record["id"], "embedding_text": "x"},
+        lambda texts: np.ones((len(texts), 2)), uploader_for(upsert), upload_batch_size=100)
+
+    assert (stats.uploaded, stats.failed) == (29, 1)
+
+
+@pytest.mark.asyncio
+async def test_schema_wide_errors_are_not_bisected_row_by_row(tmp_path):
+    def upsert(rows):
+        raise APIError("PGRST204", "Could not find the 'embedding_v6' column")
+
+    uploader = uploader_for(upsert, dead_letter_path=str(tmp_path / "dead.jsonl"), batch_size=64, min_batch_size=64)
+    await uploader.upload_all(chunks(make_rows(64), size=64))
+
+    assert uploader.requests == 3  # The batch and its two halves
+    assert uploader.rows_dead_lettered == 64
@@ -0,0 +1,58 @@
+from folketingetApi.util.bm25 import BM25Index, is_case_number_query, tokenize_danish
+
+# ----- Unit tests -----
+
+DOCUMENTS = [
+    "Forslag til lov om klima og energi",
+    "L 123 Forslag til lov om ændring af skatteloven",
+    "Beslutningsforslag om klimaet i landbruget",
+    "Skatterne for personer med lave indkomster",
+]
+
+
+def test_tokenizer_keeps_case_numbers_and_drops_stopwords():
+    tokens = tokenize_danish("Forslag til lov om L 123 og skatterne")
+
+    assert "l123" in tokens
+    assert "til" not in tokens and "og" not in tokens
+    assert "skat" in tokens
+
+
+def test_tokenizer_stems_inflected_forms_together():
+    assert tokenize_danish("klimaet") == tokenize_danish("klima")
+    assert tokenize_danish("skatterne") == tokenize_danish("skat")
+
+
+def test_bm25_finds_case_number():
+    index = BM25Index.build(DOCUMENTS)
+
+    ids, scores = index.search("L 123", 5)
+
+    assert ids.tolist() == [1]
+    assert scores[0] > 0
+
+
+def test_bm25_ranks_all_matching_documents():
+    index = BM25Index.build(DOCUMENTS)
+
+    ids, _ = index.search("klima", 5)
+
+    assert sorted(ids.tolist()) == [0, 2]
+    assert index.search("ukendt ord", 5)[0].tolist() == []
+
+
+def test_is_case_number_query():
+    assert is_case_number_query(" L 123 ")
+    assert is_case_number_query("B45")
+    assert not is_case_number_query("klima L 123")
+    assert is_case_number_query("l 123")
+
+
+def test_case_number_digits_do_not_match_other_numbers():
+    assert tokenize_danish("L 123") == ["l123"]
+    assert tokenize_danish("l 123") == ["l123"]
+
+    index = BM25Index.build(["Budget 2023 afsat 123 mio", "L 123 Forslag til lov om skat"])
+    ids, _ = index.search("l 123", 5)
+
+    assert ids.tolist() == [1]
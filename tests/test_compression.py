@@ -0,0 +1,69 @@
+import gzip
+import json
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import folketingetApi.util.compression as compression
+from folketingetApi.util.compression import CompressionMiddleware, negotiate_encoding
+
+
+def test_negotiate_encoding_honours_q_values(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert negotiate_encoding("gzip, deflate, br") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("*") == "gzip"
+
+    monkeypatch.setattr(compression, "brotli", object())
+    assert negotiate_encoding("gzip, br") == "br"
+    assert negotiate_encoding("gzip, br;q=0.5") == "gzip"
+
+
+def compressed_app(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+    rows = [{"afstemning_id": i, "titel": "Forslag til lov om ændring af skatteloven"} for i in range(200)]
+
+    @app.get("/small")
+    async def small():
+        return {"status": "ok"}
+
+    @app.get("/large")
+    async def large():
+        return JSONResponse(rows)
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse((json.dumps(row).encode() + b"\n" for row in rows), media_type="application/x-ndjson")
+
+    return TestClient(app), rows
+
+
+def test_large_responses_are_gzipped_and_small_ones_are_not(monkeypatch):
+    client, rows = compressed_app(monkeypatch)
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert int(large.headers["content-length"]) < len(json.dumps(rows)) / 5
+    assert large.json() == rows  # httpx decompresses
+
+    plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.json() == rows
+
+
+def test_streamed_responses_are_compressed_chunk_by_chunk(monkeypatch):
+    client, rows = compressed_app(monkeypatch)
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert [json.loads(line) for line in lines] == rows
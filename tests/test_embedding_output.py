@@ -0,0 +1,60 @@
+import base64
+import json
+
+import numpy as np
+
+from folketingetApi.util.embedding_output import (
+    base64_body,
+    encode_all,
+    iter_base64_body,
+    iter_binary_body,
+    iter_embedding_chunks,
+    iter_json_body,
+    json_body,
+)
+
+
+def fake_encode(calls):
+    def encode(texts):
+        calls.append(len(texts))
+        return np.array([[len(text), 0.5, -1.0] for text in texts], dtype=np.float32)
+    return encode
+
+
+TEXTS = [f"tekst {'x' * i}" for i in range(10)]
+
+
+def test_encode_all_encodes_in_batches_into_one_array():
+    calls = []
+
+    matrix = encode_all(fake_encode(calls), TEXTS, batch_size=4, dim=3)
+
+    assert calls == [4, 4, 2]
+    assert matrix.shape == (10, 3) and matrix.dtype == np.dtype("<f4")
+    assert matrix[9].tolist() == [15.0, 0.5, -1.0]
+
+
+def test_streamed_bodies_match_the_buffered_ones():
+    for dtype in ("float32", "float16"):
+        matrix = encode_all(fake_encode([]), TEXTS, batch_size=4, dim=3, dtype=dtype)
+
+        def chunks():
+            return iter_embedding_chunks(fake_encode([]), TEXTS, 4, dtype)
+
+        assert b"".join(iter_binary_body(chunks())) == matrix.tobytes()
+        assert json.loads(b"".join(iter_json_body(chunks()))) == json.loads(json_body(matrix))
+        # 3 float16 values are 6 bytes, so batch boundaries do not fall on base64 groups
+        assert json.loads(b"".join(iter_base64_body(chunks(), dtype, 10, 3))) == json.loads(base64_body(matrix, dtype))
+
+
+def test_binary_output_is_little_endian_float16():
+    matrix = encode_all(fake_encode([]), TEXTS[:2], batch_size=8, dim=3, dtype="float16")
+    document = json.loads(base64_body(matrix, "float16"))
+
+    decoded = np.frombuffer(base64.b64decode(document["data"]), "<f2").reshape(document["count"], document["dim"])
+    assert decoded.tolist() == [[6.0, 0.5, -1.0], [7.0, 0.5, -1.0]]
+
+
+def test_empty_input_gives_empty_documents():
+    assert json.loads(b"".join(iter_json_body(iter([])))) == {"embeddings": []}
+    assert json.loads(json_body(np.empty((0, 3), dtype=np.float32))) == {"embeddings": []}
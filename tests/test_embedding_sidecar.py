@@ -0,0 +1,172 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from folketingetApi.util.embedding_sidecar import (
+    EmbeddingServer,
+    RemoteEncoder,
+    connect_embedding_server,
+    frame,
+    pack_embeddings,
+    pack_encode_request,
+    unpack_embeddings,
+    unpack_encode_request,
+)
+from folketingetApi.util.embedding_sidecar import _LENGTH, _recv_exactly
+
+INFO = {"model_version": "model@abc", "backend": "torch", "dim": 3, "do_lower_case": True}
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=None):
+        self.calls.append(list(texts))
+        if "boom" in texts:
+            raise ValueError("boom")
+        return np.array([[len(text), 1.0, -1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / "embed.sock")
+    model = FakeModel()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(EmbeddingServer(model, INFO).serve(socket_path))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.01)
+    yield socket_path, model
+
+    def stop():
+        task.cancel()
+        task.add_done_callback(lambda _: loop.stop())
+
+    loop.call_soon_threadsafe(stop)
+    thread.join(timeout=5)
+
+
+def test_protocol_round_trip():
+    texts = ["klima", "", "grøn omstilling"]
+    assert unpack_encode_request(pack_encode_request(texts)) == texts
+
+    embeddings = np.arange(6, dtype=np.float32).reshape(2, 3)
+    np.testing.assert_array_equal(unpack_embeddings(pack_embeddings(embeddings)), embeddings)
+
+
+def test_remote_encoder_returns_vectors_in_request_order(server):
+    socket_path, model = server
+    encoder = RemoteEncoder(socket_path)
+
+    embeddings = encoder.encode(["skat", "ø", "skat"])
+
+    np.testing.assert_array_equal(embeddings[:, 0], [4, 1, 4])
+    assert model.calls == [["skat", "ø"]]  # Duplicates are encoded once
+    assert encoder.tokenizer.do_lower_case is True
+
+
+def test_server_errors_are_raised_and_the_connection_is_reused(server):
+    socket_path, _ = server
+    encoder = RemoteEncoder(socket_path)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        encoder.encode(["boom"])
+    assert encoder.encode(["ok"]).shape == (1, 3)
+
+
+def test_connect_checks_the_served_model(server):
+    socket_path, _ = server
+
+    assert connect_embedding_server(socket_path, "model@abc", "torch", wait_seconds=1).info() == INFO
+    with pytest.raises(RuntimeError, match="expected model@def"):
+        connect_embedding_server(socket_path, "model@def", "torch", wait_seconds=1)
+
+
+class ScriptedServer:
+    """
+    Unix socket server that reads requests and acts per request number:
+    "answer", "close" (hang up without answering) or "stall" (never answer).
+    """
+
+    def __init__(self, socket_path, actions):
+        self.actions = list(actions)
+        self.requests = 0
+        self.released = threading.Event()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socket_path)
+        self.listener.listen()
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+    def handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(_recv_exactly(conn, _LENGTH.size))
+                    _recv_exactly(conn, length)
+                except ConnectionError:
+                    return
+                action = self.actions[self.requests]
+                self.requests += 1
+                if action == "close":
+                    return
+                if action == "stall":
+                    self.released.wait()
+                    return
+                conn.sendall(frame(pack_embeddings(np.ones((1, 3), dtype=np.float32))))
+
+    def close(self):
+        self.released.set()
+        self.listener.close()
+
+
+def test_a_pooled_connection_closed_before_answering_is_retried_once(tmp_path):
+    server = ScriptedServer(str(tmp_path / "embed.sock"), ["answer", "close", "answer"])
+    encoder = RemoteEncoder(str(tmp_path / "embed.sock"), timeout=5)
+    try:
+        encoder.encode(["a"])
+        assert encoder.encode(["b"]).shape == (1, 3)
+        assert server.requests == 3
+    finally:
+        server.close()
+
+
+def test_a_fresh_connection_closed_before_answering_is_not_retried(tmp_path):
+    server = ScriptedServer(str(tmp_path / "embed.sock"), ["close", "answer"])
+    encoder = RemoteEncoder(str(tmp_path / "embed.sock"), timeout=5)
+    try:
+        with pytest.raises(ConnectionError):
+            encoder.encode(["a"])
+        assert server.requests == 1
+    finally:
+        server.close()
+
+
+def test_a_stalled_server_times_out_without_a_retry(tmp_path):
+    server = ScriptedServer(str(tmp_path / "embed.sock"), ["answer", "stall", "answer"])
+    encoder = RemoteEncoder(str(tmp_path / "embed.sock"), timeout=0.2)
+    try:
+        encoder.encode(["a"])
+        started = time.monotonic()
+        with pytest.raises(socket.timeout):
+            encoder.encode(["b"])
+        assert time.monotonic() - started < 1
+        assert server.requests == 2  # The stalled request was not sent again
+    finally:
+        server.close()
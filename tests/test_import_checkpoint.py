@@ -0,0 +1,83 @@
+from folketingetApi.util.import_checkpoint import ImportCheckpoint, normalize_timestamp, odata_datetime
+
+
+def rows(*dates):
+    return [{"afstemning_id": i, "opdateringsdato": date} for i, date in enumerate(dates)]
+
+
+def test_timestamps_from_the_api_and_postgres_compare_equal():
+    assert normalize_timestamp("2024-03-01T10:15:00.123") == "2024-03-01T10:15:00.123"
+    assert normalize_timestamp("2024-03-01 10:15:00.123+00:00") == "2024-03-01T10:15:00.123"
+    assert normalize_timestamp("2024-03-01") == "2024-03-01T00:00:00"
+    assert odata_datetime("2024-03-01T10:15:00Z") == "datetime'2024-03-01T10:15:00'"
+
+
+def test_first_run_fetches_everything_and_sets_the_high_water_mark(tmp_path):
+    checkpoint = ImportCheckpoint(str(tmp_path / "checkpoint.json"))
+    assert checkpoint.odata_filter() is None
+
+    checkpoint.begin()
+    checkpoint.commit(rows("2024-01-01T00:00:00", "2024-02-01T00:00:00"))
+    checkpoint.commit(rows("2024-03-01T00:00:00"))
+    checkpoint.finish()
+
+    reloaded = ImportCheckpoint(checkpoint.path)
+    assert reloaded.high_water_mark == "2024-03-01T00:00:00"
+    assert reloaded.run is None
+    assert reloaded.odata_filter() == "opdateringsdato gt datetime'2024-03-01T00:00:00'"
+
+
+def test_interrupted_run_resumes_from_the_last_committed_row(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = ImportCheckpoint(path)
+    checkpoint.high_water_mark = "2024-01-01T00:00:00"
+    checkpoint.begin()
+    checkpoint.commit(rows("2024-02-01T00:00:00", "2024-02-02T00:00:00"))
+    # The process dies here, before finish()
+
+    resumed = ImportCheckpoint(path)
+    assert resumed.resuming()
+    assert resumed.run["rows"] == 2
+    # ge: rows sharing the cursor's timestamp in the unfinished batch are fetched again
+    assert resumed.odata_filter() == "opdateringsdato ge datetime'2024-02-02T00:00:00'"
+
+    resumed.begin()  # Keeps the run in progress
+    resumed.commit(rows("2024-02-02T00:00:00", "2024-02-03T00:00:00"))
+    resumed.finish()
+    assert ImportCheckpoint(path).high_water_mark == "2024-02-03T00:00:00"
+
+
+def test_run_without_changes_keeps_the_high_water_mark(tmp_path):
+    checkpoint = ImportCheckpoint(str(tmp_path / "checkpoint.json"))
+    checkpoint.high_water_mark = "2024-01-01T00:00:00"
+    checkpoint.begin()
+    checkpoint.finish()
+
+    assert ImportCheckpoint(checkpoint.path).high_water_mark == "2024-01-01T00:00:00"
+
+
+def test_unreadable_checkpoint_starts_over(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text("{not json")
+
+    assert ImportCheckpoint(str(path)).odata_filter() is None
+
+
+def test_high_water_mark_does_not_pass_rows_that_failed(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = ImportCheckpoint(path)
+    checkpoint.high_water_mark = "2024-01-01T00:00:00"
+    checkpoint.begin()
+    checkpoint.commit(rows("2024-02-01T00:00:00"))
+    checkpoint.commit(rows("2024-02-02T00:00:00", "2024-02-03T00:00:00"), failed=1)
+    checkpoint.commit(rows("2024-02-04T00:00:00"))  # Later batches still land
+
+    assert not checkpoint.finish()
+    resumed = ImportCheckpoint(path)
+    assert resumed.high_water_mark == "2024-01-01T00:00:00"
+    assert resumed.odata_filter() == "opdateringsdato ge datetime'2024-02-01T00:00:00'"
+
+    resumed.begin()
+    resumed.commit(rows("2024-02-01T00:00:00", "2024-02-02T00:00:00", "2024-02-03T00:00:00", "2024-02-04T00:00:00"))
+    assert resumed.finish()
+    assert ImportCheckpoint(path).high_water_mark == "2024-02-04T00:00:00"
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from folketingetApi.util.import_pipeline import PipelineStats, run_import_pipeline
+
+
+async def pages(count: int, page_size: int = 100, delay: float = 0.0):
+    for page in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield [{"id": page * page_size + i} for i in range(page_size)]
+
+
+def prepare(record):
+    return {"afstemning_id": record["id"], "embedding_text": f"tekst {record['id']}"}
+
+
+def encode(texts):
+    return np.array([[float(text.split()[1]), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_every_row_is_embedded_and_uploaded_once():
+    uploaded = []
+
+    stats = await run_import_pipeline(pages(7), prepare, encode, uploaded.append, upload_batch_size=30,
+                                      embed_batch_size=64)
+
+    rows = [row for batch in uploaded for row in batch]
+    assert [row["afstemning_id"] for row in rows] == list(range(700))
+    assert rows[123]["embedding_v5"] == [123.0, 1.0]
+    assert max(len(batch) for batch in uploaded) == 30
+    assert (stats.fetched, stats.embedded, stats.uploaded) == (700, 700, 700)
+
+
+@pytest.mark.asyncio
+async def test_stages_overlap_and_memory_stays_bounded():
+    in_flight = {"rows": 0, "max": 0}
+
+    def counting_prepare(record):
+        in_flight["rows"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["rows"])
+        return prepare(record)
+
+    def slow_encode(texts):
+        time.sleep(0.02)
+        return encode(texts)
+
+    def slow_upload(batch):
+        time.sleep(0.02)
+        in_flight["rows"] -= len(batch)
+
+    started = time.perf_counter()
+    await run_import_pipeline(pages(20, delay=0.02), counting_prepare, slow_encode, slow_upload,
+                              upload_batch_size=100, embed_batch_size=100, queue_size=2)
+    elapsed = time.perf_counter() - started
+
+    # Serial would be 20 * (0.02 + 0.02 + 0.02) = 1.2s
+    assert elapsed < 0.9
+    # At most a few pages between fetch and upload, not all 2000 rows
+    assert in_flight["max"] <= 800
+
+
+@pytest.mark.asyncio
+async def test_a_failing_stage_stops_the_pipeline_and_raises():
+    uploaded = []
+
+    def failing_encode(texts):
+        if "tekst 300" in texts:
+            raise RuntimeError("model crashed")
+        return encode(texts)
+
+    stats = PipelineStats()
+    with pytest.raises(RuntimeError, match="model crashed"):
+        await run_import_pipeline(pages(1000), prepare, failing_encode, uploaded.append, upload_batch_size=100,
+                                  embed_batch_size=100, stats=stats)
+
+    assert stats.fetched < 1000 * 100
+    assert stats.uploaded <= 300
+
+
+@pytest.mark.asyncio
+async def test_uploaded_batches_are_reported_in_fetch_order():
+    committed = []
+
+    await run_import_pipeline(pages(5), prepare, encode, lambda batch: None, upload_batch_size=40,
+                              embed_batch_size=64, on_uploaded=lambda batch, failed: committed.extend(
+                                  row["afstemning_id"] for row in batch))
+
+    assert committed == list(range(500))
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pytest
+from folketingetApi.util.embedding_backends import load_encoder, onnx_model_path, onnx_int8_file_name
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "embedding_model", "danishbert-cosine-embeddings")
+
+SAMPLE_TEXTS = [
+    "klima",
+    "L 123",
+    "Forslag til lov om ændring af lov om indkomstskat for personer.",
+    "Forslag til folketingsbeslutning om en grøn omstilling af landbruget.",
+]
+
+# Minimum cosine similarity with the PyTorch fp32 reference, per backend
+MIN_COSINE = {
+    "torch-int8": 0.95,
+    "onnx": 0.999,
+    "onnx-int8": 0.95,
+}
+
+
+def model_weights_available():
+    weights = os.path.join(MODEL_PATH, "model.safetensors")
+    # Without git-lfs the checkout only contains a small pointer file
+    return os.path.exists(weights) and os.path.getsize(weights) > 1_000_000
+
+
+pytestmark = pytest.mark.skipif(not model_weights_available(), reason="model weights not available")
+
+
+@pytest.fixture(scope="module")
+def reference_embeddings():
+    return load_encoder(MODEL_PATH, "torch", device="cpu").encode(SAMPLE_TEXTS)
+
+
+@pytest.mark.parametrize("backend", sorted(MIN_COSINE))
+def test_backend_agrees_with_reference(backend, reference_embeddings):
+    if backend.startswith("onnx"):
+        pytest.importorskip("optimum.onnxruntime")
+        file_name = "onnx/model.onnx" if backend == "onnx" else onnx_int8_file_name()
+        if not os.path.exists(os.path.join(onnx_model_path(MODEL_PATH), file_name)):
+            pytest.skip("ONNX artifacts not exported, run export_model.py")
+
+    embeddings = load_encoder(MODEL_PATH, backend).encode(SAMPLE_TEXTS)
+
+    reference = reference_embeddings / np.linalg.norm(reference_embeddings, axis=1, keepdims=True)
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    assert np.sum(reference * embeddings, axis=1).min() >= MIN_COSINE[backend]
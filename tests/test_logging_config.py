@@ -0,0 +1,90 @@
+import json
+import logging
+import queue
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import folketingetApi.util.logging_config as logging_config
+from folketingetApi.util.logging_config import DroppingQueueHandler, JsonFormatter, RequestIdMiddleware, log_payload
+
+
+def capture(logger_name: str):
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger(logger_name)
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    return logger, records
+
+
+def test_log_payload_is_sampled_and_truncated(monkeypatch):
+    logger, records = capture("test.payload")
+    monkeypatch.setattr(logging_config, "LOG_PAYLOAD_MAX_CHARS", 20)
+
+    log_payload(logger, "rows", [{"titel": "x"}] * 10, sample_rate=0.0)
+    assert records == []
+
+    log_payload(logger, "rows", [{"titel": "x"}] * 10, sample_rate=1.0, results=10)
+    assert len(records) == 1
+    assert records[0].results == 10
+    assert records[0].payload.startswith('[{"titel": "x"}, {"t') and records[0].payload.endswith("chars)")
+
+
+def test_log_payload_skips_serialization_when_debug_is_off():
+    logger = logging.getLogger("test.payload.info")
+    logger.setLevel(logging.INFO)
+
+    class Unserializable:
+        def __repr__(self):
+            raise AssertionError("payload was serialized")
+
+    log_payload(logger, "rows", Unserializable(), sample_rate=1.0)
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger("test.dropping")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    for i in range(5):
+        logger.warning("record %d", i)
+
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    assert handler.queue.get_nowait().msg == "record 0"
+
+
+def test_request_id_is_returned_and_added_to_log_records():
+    handler = DroppingQueueHandler(queue.Queue())
+    logger = logging.getLogger("test.request_id")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/")
+    async def index():
+        logger.warning("handled", extra={"rows": 3})
+        return {}
+
+    client = TestClient(app)
+    generated = client.get("/").headers["X-Request-ID"]
+    assert len(generated) == 16
+    assert client.get("/", headers={"X-Request-ID": "abc"}).headers["X-Request-ID"] == "abc"
+
+    first, second = handler.queue.get_nowait(), handler.queue.get_nowait()
+    assert first.request_id == generated
+    entry = json.loads(JsonFormatter().format(second))
+    assert entry["request_id"] == "abc" and entry["msg"] == "handled" and entry["rows"] == 3
+
+
+def test_http_client_request_lines_are_not_logged():
+    logging_config.configure_logging("INFO")
+
+    assert not logging.getLogger("httpx").isEnabledFor(logging.INFO)
+    assert logging.getLogger("httpx").isEnabledFor(logging.WARNING)
+    assert not logging.getLogger("httpcore").isEnabledFor(logging.INFO)
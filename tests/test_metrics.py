@@ -0,0 +1,72 @@
+import gc
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from folketingetApi.util.metrics import (
+    CallbackMetric,
+    Counter,
+    Histogram,
+    MetricsMiddleware,
+    gc_pause_seconds,
+    render_metrics,
+    track_gc_pauses,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_stage_seconds", "Test.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, "tokenize")
+    histogram.observe(0.5, "tokenize")
+    histogram.observe(5.0, "tokenize")
+
+    lines = histogram.samples()
+
+    assert 'test_stage_seconds_bucket{stage="tokenize",le="0.1"} 1' in lines
+    assert 'test_stage_seconds_bucket{stage="tokenize",le="1.0"} 2' in lines
+    assert 'test_stage_seconds_bucket{stage="tokenize",le="+Inf"} 3' in lines
+    assert 'test_stage_seconds_count{stage="tokenize"} 3' in lines
+
+
+def test_counters_and_callbacks_are_rendered():
+    counter = Counter("test_requests_total", "Test.", ["result"])
+    counter.inc("hit")
+    counter.inc("hit", amount=2)
+    CallbackMetric("test_cache_entries", "Test.", lambda: {("a",): 7}, ["cache"])
+
+    text = render_metrics()
+
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{result="hit"} 3.0' in text
+    assert 'test_cache_entries{cache="a"} 7' in text
+
+
+def test_middleware_labels_by_route_template_and_counts_bytes():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.post("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.post("/items/1", content=b"x" * 10)
+    client.post("/items/2", content=b"x" * 10)
+    client.get("/missing")
+
+    text = render_metrics()
+    assert 'http_request_duration_seconds_count{method="POST",route="/items/{item_id}",status="200"} 2' in text
+    assert 'http_request_size_bytes_sum{route="/items/{item_id}"} 20.0' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="other",status="404"} 1' in text
+
+
+def test_gc_pauses_are_recorded():
+    track_gc_pauses()
+    before = sum(count for line in gc_pause_seconds.samples() if line.startswith("gc_pause_seconds_count")
+                 for count in [float(line.rsplit(" ", 1)[1])])
+
+    gc.collect()
+
+    after = sum(count for line in gc_pause_seconds.samples() if line.startswith("gc_pause_seconds_count")
+                for count in [float(line.rsplit(" ", 1)[1])])
+    assert after > before
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+import folketingetApi.util.model_artifacts as model_artifacts
+from folketingetApi.util.model_artifacts import ensure_model_artifacts, model_version, verify_artifacts
+
+
+PINNED_SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+def write_model(tmp_path, files):
+    model_dir = tmp_path / "embedding_model"
+    manifest = {"repo_id": "org/model", "revision": PINNED_SHA, "model_name": "model", "files": {}}
+    for rel_path, content in files.items():
+        path = model_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        manifest["files"][rel_path] = {"sha256": hashlib.sha256(content).hexdigest(), "size": len(content)}
+    manifest_path = tmp_path / "model_manifest.json"
+    manifest_path.write_text(json.dumps(manifest))
+    return str(model_dir), str(manifest_path), manifest
+
+
+def fail_download(**kwargs):
+    raise AssertionError("the hub must not be contacted")
+
+
+def test_verified_files_skip_the_hub(tmp_path, monkeypatch):
+    model_dir, manifest_path, _ = write_model(tmp_path, {"model/config.json": b"{}", "model/weights.bin": b"\x00" * 64})
+    monkeypatch.setattr("huggingface_hub.snapshot_download", fail_download, raising=False)
+
+    assert ensure_model_artifacts(model_dir, manifest_path, offline=False) == os.path.join(model_dir, "model")
+
+
+def test_unchanged_files_are_not_rehashed(tmp_path, monkeypatch):
+    model_dir, _, manifest = write_model(tmp_path, {"model/weights.bin": b"\x01" * 64})
+    assert verify_artifacts(model_dir, manifest) == []
+
+    monkeypatch.setattr(model_artifacts, "sha256_file", lambda path: pytest.fail("re-hashed an unchanged file"))
+    assert verify_artifacts(model_dir, manifest) == []
+
+
+def test_corrupt_or_missing_files_are_reported(tmp_path):
+    model_dir, manifest_path, manifest = write_model(tmp_path, {"model/a.bin": b"aaaa", "model/b.bin": b"bbbb"})
+    assert verify_artifacts(model_dir, manifest) == []
+
+    # Same size, different content, and a newer mtime than the verified state
+    path = os.path.join(model_dir, "model/a.bin")
+    with open(path, "wb") as f:
+        f.write(b"xxxx")
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000))
+    os.remove(os.path.join(model_dir, "model/b.bin"))
+
+    assert sorted(verify_artifacts(model_dir, manifest)) == ["model/a.bin", "model/b.bin"]
+    with pytest.raises(RuntimeError, match="HF_HUB_OFFLINE"):
+        ensure_model_artifacts(model_dir, manifest_path, offline=True)
+
+
+def test_only_failed_files_are_downloaded_at_the_pinned_revision(tmp_path, monkeypatch):
+    model_dir, manifest_path, _ = write_model(tmp_path, {"model/a.bin": b"aaaa", "model/b.bin": b"bbbb"})
+    os.remove(os.path.join(model_dir, "model/b.bin"))
+    calls = []
+
+    def fake_download(repo_id, revision, local_dir, allow_patterns, token):
+        calls.append((repo_id, revision, allow_patterns))
+        with open(os.path.join(local_dir, "model/b.bin"), "wb") as f:
+            f.write(b"bbbb")
+
+    monkeypatch.setattr("huggingface_hub.snapshot_download", fake_download, raising=False)
+    ensure_model_artifacts(model_dir, manifest_path, offline=False)
+
+    assert calls == [("org/model", PINNED_SHA, ["model/b.bin"])]
+
+
+@pytest.mark.parametrize("revision", ["main", "v1.0", "0123abc", None, PINNED_SHA.upper()])
+def test_download_refuses_a_revision_that_is_not_a_commit_sha(tmp_path, monkeypatch, revision):
+    model_dir, manifest_path, manifest = write_model(tmp_path, {"model/a.bin": b"aaaa"})
+    os.remove(os.path.join(model_dir, "model/a.bin"))
+    manifest["revision"] = revision
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    monkeypatch.delenv("MODEL_REVISION", raising=False)
+    monkeypatch.setattr("huggingface_hub.snapshot_download", fail_download, raising=False)
+
+    with pytest.raises(RuntimeError, match="not a 40-character commit sha"):
+        ensure_model_artifacts(model_dir, manifest_path, offline=False)
+
+
+def test_model_version_follows_checksums(tmp_path):
+    _, _, manifest = write_model(tmp_path, {"model/a.bin": b"aaaa"})
+    changed = json.loads(json.dumps(manifest))
+    changed["files"]["model/a.bin"]["sha256"] = "0" * 64
+
+    assert model_version(manifest) == model_version(json.loads(json.dumps(manifest)))
+    assert model_version(manifest) != model_version(changed)
@@ -0,0 +1,98 @@
+import asyncio
+import random
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+
+from folketingetApi.util.odata_fetcher import ODataFetcher, ODataFetchError
+
+QUERY = "https://oda.example/api/Afstemning?$inlinecount=allpages&$orderby=opdateringsdato desc"
+
+
+def odata_transport(total: int, page_size: int = 100, failures=None, delays=True, requested=None):
+    """Serves ids 0..total-1; failures maps $skip to the status codes to answer first."""
+    failures = {skip: list(codes) for skip, codes in (failures or {}).items()}
+
+    async def handler(request: httpx.Request):
+        skip = int(parse_qs(urlsplit(str(request.url)).query)["$skip"][0])
+        if requested is not None:
+            requested.append(skip)
+        if delays:
+            await asyncio.sleep(random.uniform(0, 0.01))  # Pages complete out of order
+        if failures.get(skip):
+            return httpx.Response(failures[skip].pop(0))
+        records = [{"id": i} for i in range(skip, min(skip + page_size, total))]
+        return httpx.Response(200, json={"odata.count": str(total), "value": records})
+
+    return httpx.MockTransport(handler)
+
+
+async def collect(fetcher):
+    return [record["id"] async for page in fetcher.pages() for record in page.records]
+
+
+@pytest.mark.asyncio
+async def test_pages_are_fetched_concurrently_and_reassembled_in_order():
+    requested = []
+    fetcher = ODataFetcher(QUERY, concurrency=4, transport=odata_transport(1234, requested=requested))
+
+    assert await collect(fetcher) == list(range(1234))
+    assert sorted(requested) == list(range(0, 1300, 100))
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried():
+    fetcher = ODataFetcher(QUERY, concurrency=3, backoff_seconds=0.001,
+                           transport=odata_transport(450, failures={200: [503, 502], 0: [429]}))
+
+    assert await collect(fetcher) == list(range(450))
+    assert fetcher.retries == 3
+
+
+@pytest.mark.asyncio
+async def test_a_page_that_keeps_failing_raises_instead_of_truncating():
+    fetcher = ODataFetcher(QUERY, concurrency=3, max_retries=2, backoff_seconds=0.001,
+                           transport=odata_transport(450, failures={300: [500, 500, 500]}))
+
+    with pytest.raises(ODataFetchError, match=r"\$skip=300"):
+        await collect(fetcher)
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    fetcher = ODataFetcher(QUERY, transport=odata_transport(450, failures={100: [400]}))
+
+    with pytest.raises(ODataFetchError):
+        await collect(fetcher)
+    assert fetcher.retries == 0
+
+
+@pytest.mark.asyncio
+async def test_records_added_during_the_crawl_are_still_fetched():
+    # The count says 250 but the server has 320 by the time the last pages are read
+    state = {"first": True}
+
+    async def handler(request):
+        skip = int(parse_qs(urlsplit(str(request.url)).query)["$skip"][0])
+        total = 250 if state.pop("first", False) else 320
+        records = [{"id": i} for i in range(skip, min(skip + 100, total))]
+        return httpx.Response(200, json={"odata.count": str(total), "value": records})
+
+    fetcher = ODataFetcher(QUERY, concurrency=2, transport=httpx.MockTransport(handler))
+
+    assert await collect(fetcher) == list(range(320))
+
+
+@pytest.mark.asyncio
+async def test_stopping_early_cancels_the_remaining_requests():
+    requested = []
+    fetcher = ODataFetcher(QUERY, concurrency=2, transport=odata_transport(10000, requested=requested))
+
+    pages = fetcher.pages()
+    async for page in pages:
+        if page.skip == 200:
+            break
+    await pages.aclose()
+
+    assert len(requested) <= 5
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import folketingetApi.controllers.admin as admin
+import folketingetApi.util.profiler as profiler
+from folketingetApi.util.profiler import SlowRequestProfiler, sample_stacks
+
+
+def busy_loop_for_profiler(stop: threading.Event):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sample_stacks_returns_collapsed_stacks():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop_for_profiler, args=(stop,), name="busy")
+    thread.start()
+    try:
+        stacks = sample_stacks(0.1, interval_ms=1)
+    finally:
+        stop.set()
+        thread.join()
+
+    busy = [line for line in stacks.splitlines() if line.startswith("busy;")]
+    assert busy and "busy_loop_for_profiler" in busy[0]
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks.splitlines())
+
+
+def admin_client():
+    app = FastAPI()
+    app.include_router(admin.router)
+    return TestClient(app)
+
+
+def test_profile_endpoint_needs_the_admin_token(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    assert admin_client().post("/admin/profile?seconds=0.01").status_code == 404
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    client = admin_client()
+    assert client.post("/admin/profile?seconds=0.01").status_code == 403
+    assert client.post("/admin/profile?seconds=0.01", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    response = client.post("/admin/profile?seconds=0.05&interval_ms=1", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+
+def test_slow_requests_are_dumped_fast_ones_are_not(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+    app.add_middleware(SlowRequestProfiler, threshold_ms=20, sample_rate=1.0)
+
+    @app.get("/sleep")
+    async def sleep(seconds: float):
+        await asyncio.sleep(seconds)
+        return {}
+
+    client = TestClient(app)
+    client.get("/sleep?seconds=0")
+    assert os.listdir(tmp_path) == []
+
+    client.get("/sleep?seconds=0.05")
+    assert [name.endswith(".pstats") for name in os.listdir(tmp_path)] == [True]
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pytest
+from folketingetApi.repositories.search_backends import (
+    AnnSearchBackend,
+    LocalVectorSearchBackend,
+    SearchCorpus,
+    top_k_above_threshold,
+)
+from folketingetApi.util.ivf_index import IVFIndex
+from folketingetApi.util.quantization import QuantizedMatrix
+
+# ----- Unit tests (no database needed) -----
+
+def make_rows():
+    return [
+        {"afstemning_id": 1, "titel": "Klima", "embedding_v5": "[1.0, 0.0, 0.0]"},
+        {"afstemning_id": 2, "titel": "Skat", "embedding_v5": [0.0, 1.0, 0.0]},
+        {"afstemning_id": 3, "titel": "Klima og skat", "embedding_v5": [1.0, 1.0, 0.0]},
+        {"afstemning_id": 4, "titel": "Uden vektor", "embedding_v5": None},
+    ]
+
+
+def test_corpus_builds_normalized_matrix_without_embedding_column():
+    corpus = SearchCorpus.from_rows(make_rows())
+
+    assert len(corpus) == 3
+    assert corpus.matrix.dtype == np.float32
+    assert corpus.matrix.flags["C_CONTIGUOUS"]
+    assert np.allclose(np.linalg.norm(corpus.matrix, axis=1), 1.0)
+    assert all("embedding_v5" not in row for row in corpus.rows)
+
+
+def test_top_k_above_threshold_orders_and_filters():
+    scores = np.array([0.1, 0.9, 0.6, 0.8, 0.4], dtype=np.float32)
+
+    assert top_k_above_threshold(scores, 2, 0.5).tolist() == [1, 3]
+    assert top_k_above_threshold(scores, 10, 0.5).tolist() == [1, 3, 2]
+    assert top_k_above_threshold(scores, 10, 0.95).tolist() == []
+
+
+def test_local_backend_matches_rpc_result_shape():
+    backend = LocalVectorSearchBackend(loader=lambda: SearchCorpus.from_rows(make_rows()))
+
+    results = backend.search_sync("klima", [2.0, 0.0, 0.0], match_count=2, match_threshold=0.5)
+
+    assert [row["afstemning_id"] for row in results] == [1, 3]
+    assert results[0]["titel"] == "Klima"
+    assert np.isclose(results[0]["similarity"], 1.0)
+    assert np.isclose(results[1]["similarity"], np.sqrt(0.5))
+
+
+def random_corpus(n_rows=500, dim=16, seed=1):
+    rng = np.random.default_rng(seed)
+    rows = [{"afstemning_id": i, "embedding_v5": rng.normal(size=dim).tolist()} for i in range(n_rows)]
+    return SearchCorpus.from_rows(rows)
+
+
+def test_ivf_index_with_all_lists_probed_is_exact():
+    corpus = random_corpus()
+    index = IVFIndex.build(corpus.matrix, n_lists=10)
+    query = corpus.matrix[7]
+
+    ids, scores = index.search(corpus.matrix, query, nprobe=index.n_lists)
+
+    assert sorted(ids.tolist()) == list(range(len(corpus)))
+    assert ids[np.argmax(scores)] == 7
+
+
+def test_ann_backend_saves_and_reuses_index(tmp_path, monkeypatch):
+    corpus = random_corpus()
+    index_path = str(tmp_path / "ivf_index.npz")
+    backend = AnnSearchBackend(loader=lambda: corpus, index_path=index_path, nprobe=4, n_lists=10)
+
+    results = backend.search_sync("", corpus.matrix[3].tolist(), match_count=5, match_threshold=0.0)
+    assert results[0]["afstemning_id"] == 3
+
+    def fail_build(*args, **kwargs):
+        raise AssertionError("index should be loaded from disk, not rebuilt")
+
+    monkeypatch.setattr(IVFIndex, "build", fail_build)
+    reloaded = AnnSearchBackend(loader=lambda: corpus, index_path=index_path, nprobe=4, n_lists=10)
+    assert np.array_equal(reloaded.corpus.index.centroids, backend.corpus.index.centroids)
+
+
+@pytest.mark.parametrize("kind", ["float16", "int8"])
+def test_quantized_scores_are_close_to_exact(kind):
+    corpus = random_corpus(dim=64)
+    quantized = QuantizedMatrix.from_matrix(corpus.matrix, kind)
+    query = corpus.matrix[0]
+
+    assert quantized.nbytes < corpus.matrix.nbytes
+    assert np.allclose(quantized.scores(query), corpus.matrix @ query, atol=0.05)
+
+
+@pytest.mark.parametrize("kind", ["float16", "int8"])
+def test_quantized_backend_rescores_to_exact_results(kind, tmp_path):
+    exact = LocalVectorSearchBackend(loader=lambda: random_corpus(dim=64))
+    quantized = LocalVectorSearchBackend(loader=lambda: random_corpus(dim=64), quantization=kind,
+                                         vectors_path=str(tmp_path / "embeddings.npy"))
+    query = random_corpus(dim=64).matrix[11].tolist()
+
+    expected = exact.search_sync("", query, match_count=10, match_threshold=0.0)
+    results = quantized.search_sync("", query, match_count=10, match_threshold=0.0)
+
+    assert isinstance(quantized.corpus.matrix, np.memmap)
+    assert [row["afstemning_id"] for row in results] == [row["afstemning_id"] for row in expected]
+    assert np.allclose([row["similarity"] for row in results], [row["similarity"] for row in expected])
+
+
+def test_ivf_index_save_uses_a_per_process_temp_file_and_cleans_up(tmp_path, monkeypatch):
+    index = IVFIndex.build(random_corpus().matrix, n_lists=4)
+    written = []
+
+    def failing_savez(path, **arrays):
+        written.append(path)
+        open(path, "wb").close()
+        raise OSError("disk full")
+
+    monkeypatch.setattr(np, "savez", failing_savez)
+    with pytest.raises(OSError):
+        index.save(str(tmp_path / "ivf.npz"))
+
+    assert written[0].endswith(f".{os.getpid()}.tmp.npz")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import time
+import numpy as np
+import pytest
+import folketingetApi.services.search_service as search_service
+from folketingetApi.services.search_service import EmbeddingBatcher
+from folketingetApi.util.cache import ContentHashEmbeddingCache, LRUTTLCache, SQLiteVectorCache
+
+# ----- Unit tests (no model or database needed) -----
+
+def fake_encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+    return encode
+
+
+@pytest.mark.asyncio
+async def test_batcher_encodes_concurrent_queries_in_one_call():
+    calls = []
+    batcher = EmbeddingBatcher(fake_encoder(calls), max_batch_size=8, window_ms=50)
+
+    results = await asyncio.gather(*(batcher.encode(text) for text in ["a", "bb", "ccc"]))
+
+    assert calls == [["a", "bb", "ccc"]]
+    assert [r[0] for r in results] == [1.0, 2.0, 3.0]
+
+
+@pytest.mark.asyncio
+async def test_batcher_respects_max_batch_size_and_dedupes():
+    calls = []
+    batcher = EmbeddingBatcher(fake_encoder(calls), max_batch_size=2, window_ms=50)
+
+    results = await asyncio.gather(*(batcher.encode(text) for text in ["klima", "klima", "skat"]))
+
+    assert calls == [["klima"], ["skat"]]
+    assert [r[0] for r in results] == [5.0, 5.0, 4.0]
+
+
+@pytest.mark.asyncio
+async def test_batcher_propagates_encoding_errors():
+    def failing_encode(texts):
+        raise ValueError("boom")
+
+    batcher = EmbeddingBatcher(failing_encode, max_batch_size=4, window_ms=1)
+
+    with pytest.raises(ValueError):
+        await batcher.encode("klima")
+
+
+def test_lru_ttl_cache_evicts_least_recently_used():
+    cache = LRUTTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = LRUTTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("klima", 1)
+
+    assert cache.get("klima") == 1
+    now[0] += 61
+    assert cache.get("klima") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_sqlite_vector_cache_roundtrip(tmp_path):
+    cache = SQLiteVectorCache(str(tmp_path / "embeddings.sqlite"), max_entries=10)
+    vector = np.arange(4, dtype=np.float32)
+    cache.set("skat", vector)
+
+    assert np.array_equal(cache.get("skat"), vector)
+    assert cache.get("klima") is None
+
+
+@pytest.mark.asyncio
+async def test_embed_query_uses_cache_for_normalized_text(monkeypatch):
+    calls = []
+    monkeypatch.setattr(search_service, "embedding_cache", LRUTTLCache(max_entries=10))
+    monkeypatch.setattr(search_service, "embedding_disk_cache", None)
+    monkeypatch.setattr(search_service, "embedding_batcher",
+                        EmbeddingBatcher(fake_encoder(calls), max_batch_size=8, window_ms=1))
+
+    first = await search_service.embed_query("klima  politik")
+    second = await search_service.embed_query(" klima politik ")
+
+    assert first == second
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_data_version_change_clears_result_cache(monkeypatch):
+    versions = ["2025-01-01"]
+
+    class Response:
+        def __init__(self, version):
+            self.data = [{"version": version}]
+
+    async def fetch_data_version():
+        return Response(versions[0])
+
+    monkeypatch.setattr(search_service, "fetch_data_version", fetch_data_version)
+    monkeypatch.setattr(search_service, "DATA_VERSION_POLL_SECONDS", 0)
+    monkeypatch.setattr(search_service, "search_result_cache", LRUTTLCache(max_entries=10))
+    monkeypatch.setattr(search_service, "_data_version", None)
+
+    assert await search_service.get_cached_search_results("klima", 10, 0.5) == (None, "2025-01-01")
+    search_service.cache_search_results("klima", 10, 0.5, [{"afstemning_id": 1}], "2025-01-01")
+    assert (await search_service.get_cached_search_results(" klima", 10, 0.5))[0] == [{"afstemning_id": 1}]
+    assert (await search_service.get_cached_search_results("klima", 20, 0.5))[0] is None
+
+    versions[0] = "2025-01-02"
+    assert await search_service.get_cached_search_results("klima", 10, 0.5) == (None, "2025-01-02")
+
+
+@pytest.mark.asyncio
+async def test_results_fetched_before_an_import_are_not_cached_under_the_new_version(monkeypatch):
+    versions = ["v1"]
+
+    class Response:
+        def __init__(self, version):
+            self.data = [{"version": version}]
+
+    async def fetch_data_version():
+        return Response(versions[0])
+
+    monkeypatch.setattr(search_service, "fetch_data_version", fetch_data_version)
+    monkeypatch.setattr(search_service, "DATA_VERSION_POLL_SECONDS", 0)
+    monkeypatch.setattr(search_service, "search_result_cache", LRUTTLCache(max_entries=10))
+    monkeypatch.setattr(search_service, "_data_version", None)
+
+    _, looked_up_under = await search_service.get_cached_search_results("klima", 10, 0.5)
+    # Another request sees the import finish while this search is still fetching
+    versions[0] = "v2"
+    await search_service.get_data_version()
+    search_service.cache_search_results("klima", 10, 0.5, [{"afstemning_id": "stale"}], looked_up_under)
+
+    assert (await search_service.get_cached_search_results("klima", 10, 0.5))[0] is None
+
+
+def test_paginate_search_results_walks_all_pages():
+    results = [{"afstemning_id": i} for i in range(45)]
+    seen, cursor = [], None
+
+    while True:
+        page, cursor = search_service.paginate_search_results(results, 20, cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert seen == results
+
+
+def test_single_page_does_not_issue_cursor():
+    page, cursor = search_service.paginate_search_results([{"afstemning_id": 1}], 20)
+
+    assert page == [{"afstemning_id": 1}]
+    assert cursor is None
+
+
+def test_iter_ndjson_writes_one_row_per_line():
+    results = [{"afstemning_id": i, "titel": "Æblemost"} for i in range(120)]
+
+    lines = b"".join(search_service.iter_ndjson(results)).decode("utf-8").splitlines()
+
+    assert len(lines) == 120
+    assert json.loads(lines[0]) == {"afstemning_id": 0, "titel": "Æblemost"}
+
+
+def test_reciprocal_rank_fusion_merges_on_afstemning_id():
+    vector_items = [{"afstemning_id": 1, "similarity": 0.9}, {"afstemning_id": 2, "similarity": 0.8}]
+    lexical_items = [{"afstemning_id": 3, "bm25_score": 4.0}, {"afstemning_id": 2, "bm25_score": 2.0}]
+
+    fused = search_service.reciprocal_rank_fusion([vector_items, lexical_items], match_count=10)
+
+    assert [row["afstemning_id"] for row in fused] == [2, 1, 3]
+    assert fused[0]["similarity"] == 0.8 and fused[0]["bm25_score"] == 2.0
+    assert fused[2]["similarity"] is None
+
+
+def test_project_fields_keeps_only_requested_fields():
+    rows = [{"afstemning_id": 1, "titel": "Klima", "resume": "Lang tekst", "similarity": 0.9}]
+
+    assert search_service.project_fields(rows, None) is rows
+    assert search_service.project_fields(rows, ["afstemning_id", "similarity", "bm25_score"]) == [
+        {"afstemning_id": 1, "similarity": 0.9}]
+
+
+def test_search_request_rejects_unknown_fields():
+    with pytest.raises(ValueError, match="embedding_v5"):
+        search_service.SearchRequest(query_text="klima", fields=["titel", "embedding_v5"])
+
+
+def test_dumps_json_handles_numpy_values():
+    row = {"afstemning_id": np.int64(3), "similarity": np.float32(0.5), "titel": "Æblemost"}
+
+    assert json.loads(search_service.dumps_json(row)) == {"afstemning_id": 3, "similarity": 0.5, "titel": "Æblemost"}
+
+
+def test_sqlite_vector_cache_bulk_roundtrip(tmp_path):
+    cache = SQLiteVectorCache(str(tmp_path / "embeddings.sqlite"), max_entries=2000)
+    vectors = {f"key-{i}": np.full(4, i, dtype=np.float32) for i in range(1500)}
+
+    cache.set_many(vectors)
+    found = cache.get_many([f"key-{i}" for i in range(1490, 1510)])
+
+    assert sorted(found) == [f"key-{i}" for i in range(1490, 1500)]
+    assert found["key-1495"].tolist() == [1495.0] * 4
+
+
+def test_content_hash_cache_encodes_each_new_text_once(tmp_path):
+    path = str(tmp_path / "import.sqlite")
+    calls = []
+    encode = fake_encoder(calls)
+
+    cache = ContentHashEmbeddingCache(path, "model@1", max_entries=100)
+    first = cache.encode(["a", "bb", "a", "ccc"], encode)
+    assert calls == [["a", "bb", "ccc"]]
+    assert first[:, 0].tolist() == [1.0, 2.0, 1.0, 3.0]
+
+    # A later run only encodes what changed
+    cache = ContentHashEmbeddingCache(path, "model@1", max_entries=100)
+    cache.encode(["bb", "dddd", "ccc"], encode)
+    assert calls[-1] == ["dddd"]
+    assert cache.stats()["reused"] == 2
+
+    # A new model version re-encodes everything
+    ContentHashEmbeddingCache(path, "model@2", max_entries=100).encode(["bb"], encode)
+    assert calls[-1] == ["bb"]
+
+
+def test_content_hash_cache_prunes_least_recently_used(tmp_path):
+    calls = []
+    encode = fake_encoder(calls)
+    cache = ContentHashEmbeddingCache(str(tmp_path / "import.sqlite"), "model@1", max_entries=2)
+
+    cache.encode(["a", "bb"], encode)
+    time.sleep(0.01)
+    cache.encode(["a"], encode)  # A hit keeps "a" fresh
+    time.sleep(0.01)
+    cache.encode(["ccc"], encode)  # Over max_entries: "bb" goes, not "a"
+    cache.encode(["a", "bb"], encode)
+
+    assert calls[-1] == ["bb"]
+
+
+@pytest.mark.asyncio
+async def test_keyword_only_search_returns_null_similarity_and_bm25_score(monkeypatch):
+    import folketingetApi.controllers.search as search_controller
+
+    async def lexical_search(query_text, match_count):
+        return [{"afstemning_id": 1, "titel": "Klimalov", "bm25_score": 3.2},
+                {"afstemning_id": 2, "titel": "Klimaaftale", "bm25_score": 1.1}]
+
+    async def get_cached_search_results(query_text, match_count, match_threshold):
+        return None, "v1"
+
+    async def embed_query(query_text):
+        raise AssertionError("keyword-only queries must not run the model")
+
+    monkeypatch.setattr(search_controller, "HYBRID_SEARCH", True)
+    monkeypatch.setattr(search_controller, "lexical_search", lexical_search)
+    monkeypatch.setattr(search_controller, "get_cached_search_results", get_cached_search_results)
+    monkeypatch.setattr(search_controller, "cache_search_results", lambda *args: None)
+    monkeypatch.setattr(search_controller, "embed_query", embed_query)
+
+    # match_threshold is not applied: both rows come back even with a threshold of 0.99
+    results = await search_controller.run_search("klima", 10, 0.99)
+    assert [row["afstemning_id"] for row in results] == [1, 2]
+    for row in results:
+        assert row["similarity"] is None
+        assert isinstance(row["bm25_score"], float)
+        search_service.SearchResult.model_validate(row)
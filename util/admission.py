@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of queueing work the service cannot finish in time."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a bounded wait queue and a per-request deadline.
+
+    At most max_concurrency callers hold a slot at a time. Up to max_queue more
+    wait for one; anyone beyond that is rejected at once (429), and a waiter that
+    does not get a slot within deadline_seconds is rejected as well (503).
+    Both carry a Retry-After estimate from the recent time slots were held.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, deadline_seconds: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.deadline_seconds = deadline_seconds
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._recent_hold_seconds: Deque[float] = deque(maxlen=100)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        # Semaphores belong to the loop they were first used on
+        if self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.in_flight = 0
+            self.queue_depth = 0
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained, at least 1."""
+        if not self._recent_hold_seconds:
+            return 1
+        average_hold = sum(self._recent_hold_seconds) / len(self._recent_hold_seconds)
+        waves = (self.queue_depth + self.in_flight) / self.max_concurrency
+        return max(1, round(average_hold * waves + 0.5))
+
+    @asynccontextmanager
+    async def slot(self, deadline_seconds: Optional[float] = None):
+        semaphore = self._get_semaphore()
+        deadline_seconds = self.deadline_seconds if deadline_seconds is None else deadline_seconds
+
+        started = time.perf_counter()
+        if not semaphore.locked():
+            await semaphore.acquire()  # A slot is free, nothing to wait for
+        elif self.queue_depth >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(429, "Too many requests waiting for the model", self.retry_after())
+        else:
+            self.queue_depth += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), deadline_seconds)
+            except asyncio.TimeoutError:
+                self.rejected_deadline += 1
+                raise AdmissionRejected(503, "Timed out waiting for the model", self.retry_after())
+            finally:
+                self.queue_depth -= 1
+
+        waited = time.perf_counter() - started
+        self.admitted += 1
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.in_flight += 1
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._recent_hold_seconds.append(time.perf_counter() - acquired)
+            semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_deadline": self.rejected_deadline,
+            "avg_wait_ms": round(self.total_wait_seconds / self.admitted * 1000, 3) if self.admitted else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 3),
+        }
@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# Batches uploading at the same time
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "4"))
+# Rows per upsert start at UPLOAD_BATCH_SIZE and adapt between the min and max to
+# keep each request near UPLOAD_TARGET_SECONDS and under UPLOAD_MAX_BATCH_BYTES
+UPLOAD_BATCH_SIZE = int(os.environ.get("UPLOAD_BATCH_SIZE", "100"))
+UPLOAD_MIN_BATCH_SIZE = int(os.environ.get("UPLOAD_MIN_BATCH_SIZE", "10"))
+UPLOAD_MAX_BATCH_SIZE = int(os.environ.get("UPLOAD_MAX_BATCH_SIZE", "1000"))
+UPLOAD_MAX_BATCH_BYTES = int(os.environ.get("UPLOAD_MAX_BATCH_BYTES", str(4 * 1024 * 1024)))
+UPLOAD_TARGET_SECONDS = float(os.environ.get("UPLOAD_TARGET_SECONDS", "2"))
+# Upsert requests per second; halved on every 429 and recovered gradually
+UPLOAD_RATE_PER_SECOND = float(os.environ.get("UPLOAD_RATE_PER_SECOND", "10"))
+UPLOAD_MAX_RETRIES = int(os.environ.get("UPLOAD_MAX_RETRIES", "5"))
+UPLOAD_BACKOFF_SECONDS = float(os.environ.get("UPLOAD_BACKOFF_SECONDS", "1"))
+UPLOAD_BACKOFF_MAX_SECONDS = float(os.environ.get("UPLOAD_BACKOFF_MAX_SECONDS", "30"))
+
+RATE_LIMITED = "rate_limited"
+RETRY = "retry"
+FATAL = "fatal"
+
+# Postgres error classes worth retrying: serialization failures and deadlocks,
+# statement timeouts, too many connections, out of memory, connection errors
+_RETRY_SQLSTATES = ("40001", "40P01", "57014", "53300", "53400", "08")
+# PostgREST could not reach the database
+_RETRY_POSTGREST_CODES = ("PGRST000", "PGRST001", "PGRST002", "PGRST003")
+
+
+def classify_upload_error(error: Exception) -> str:
+    """
+    RATE_LIMITED, RETRY or FATAL for an exception raised by an upsert.
+
+    postgrest's APIError carries the HTTP status as `code` when the body was
+    not JSON, and the PostgREST or Postgres error code otherwise.
+    """
+    if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+        return RETRY
+    code = str(getattr(error, "code", "") or "")
+    message = str(getattr(error, "message", "") or error).lower()
+    if code == "429" or "rate limit" in message or "too many requests" in message:
+        return RATE_LIMITED
+    if (code.isdigit() and len(code) == 3 and code.startswith("5")) or code.startswith(_RETRY_SQLSTATES) \
+            or code in _RETRY_POSTGREST_CODES or "timeout" in message or "timed out" in message:
+        return RETRY
+    return FATAL
+
+
+def _same_error(a: Exception, b: Exception) -> bool:
+    return (type(a), getattr(a, "code", None), str(getattr(a, "message", "") or a)) == \
+        (type(b), getattr(b, "code", None), str(getattr(b, "message", "") or b))
+
+
+class TokenBucket:
+    """
+    Request rate limiter shared by all upload workers.
+
+    Tokens refill at `rate` per second up to `burst`. A 429 halves the rate and
+    pauses everyone for the backoff; every success raises it again by a small
+    step, up to max_rate (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float = 0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:  # FIFO: waiters are served in order
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttle(self, pause_seconds: float):
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.paused_until = max(self.paused_until, time.monotonic() + pause_seconds)
+        logger.warning(f"Upload rate limited; {self.rate:.1f} requests/s, pausing {pause_seconds:.1f}s")
+
+    def succeeded(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class AdaptiveBatchSize:
+    """
+    Rows per upsert. Grows by a quarter while requests finish well under the
+    target latency and halves when one takes longer; never more rows than fit
+    in max_bytes at the average row size seen so far.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, max_bytes: int, target_seconds: float):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.max_bytes = max_bytes
+        self.target_seconds = target_seconds
+        self.row_bytes = 0.0
+
+    def observe_rows(self, rows: int, size_bytes: int):
+        row_bytes = size_bytes / max(1, rows)
+        self.row_bytes = row_bytes if not self.row_bytes else 0.8 * self.row_bytes + 0.2 * row_bytes
+
+    def observe_latency(self, rows: int, seconds: float):
+        if seconds > self.target_seconds:
+            self.size = max(self.minimum, self.size // 2)
+        elif seconds < self.target_seconds / 2 and rows >= self.size:
+            self.size = min(self.maximum, max(self.size + 1, int(self.size * 1.25)))
+
+    def shrink(self):
+        self.size = max(self.minimum, self.size // 2)
+
+    def current(self) -> int:
+        if self.row_bytes:
+            return max(self.minimum, min(self.size, int(self.max_bytes // self.row_bytes)))
+        return self.size
+
+
+class BatchUploader:
+    """
+    Uploads rows with a blocking upsert function from several worker threads.
+
+    Incoming rows are regrouped into batches sized by AdaptiveBatchSize; at most
+    `concurrency` batches are in flight and requests pass a TokenBucket. Failed
+    batches are retried with jittered backoff. A batch that fails with a
+    non-retryable error is split in halves until the bad rows are isolated
+    (unless both halves fail with the same error, which means every row does), and
+    rows that still fail are appended to the dead-letter file (JSON lines) with
+    their error, to be replayed by replay_dead_letters().
+
+    on_committed(rows, failed) is called per batch in the order the rows came in,
+    after every earlier batch has also finished, so callers can checkpoint.
+    """
+
+    def __init__(self, upsert: Callable[[List[Dict[str, Any]]], Any], dead_letter_path: Optional[str] = None,
+                 concurrency: int = UPLOAD_CONCURRENCY, batch_size: int = UPLOAD_BATCH_SIZE,
+                 min_batch_size: int = UPLOAD_MIN_BATCH_SIZE, max_batch_size: int = UPLOAD_MAX_BATCH_SIZE,
+                 max_batch_bytes: int = UPLOAD_MAX_BATCH_BYTES, target_seconds: float = UPLOAD_TARGET_SECONDS,
+                 rate_per_second: float = UPLOAD_RATE_PER_SECOND, max_retries: int = UPLOAD_MAX_RETRIES,
+                 backoff_seconds: float = UPLOAD_BACKOFF_SECONDS,
+                 classify_error: Callable[[Exception], str] = classify_upload_error):
+        self.upsert = upsert
+        self.dead_letter_path = dead_letter_path
+        self.concurrency = max(1, concurrency)
+        self.batch_size = AdaptiveBatchSize(batch_size, min_batch_size, max_batch_size, max_batch_bytes,
+                                            target_seconds)
+        self.bucket = TokenBucket(rate_per_second, burst=self.concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.classify_error = classify_error
+
+        self.requests = 0
+        self.retries = 0
+        self.rows_uploaded = 0
+        self.rows_dead_lettered = 0
+        self.busy_seconds = 0.0
+        self._in_flight = 0
+        self._busy_since = 0.0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(UPLOAD_BACKOFF_MAX_SECONDS, self.backoff_seconds * 2 ** attempt))
+
+    def _dead_letter(self, rows: List[Dict[str, Any]], error: Exception):
+        self.rows_dead_lettered += len(rows)
+        logger.error(f"{len(rows)} rows failed permanently: {error!r}")
+        if not self.dead_letter_path:
+            return
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        failed_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with open(self.dead_letter_path, "ab") as f:
+            for row in rows:
+                f.write(orjson.dumps({"error": repr(error), "failed_at": failed_at, "row": row},
+                                     option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
+
+    async def _attempt(self, rows: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[Exception]]:
+        """Upload rows, retrying transient errors. Returns (None, None), or the kind and error that ended it."""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            started = time.perf_counter()
+            try:
+                self.requests += 1
+                await asyncio.to_thread(self.upsert, rows)
+            except Exception as e:
+                kind = self.classify_error(e)
+                if kind == FATAL or attempt == self.max_retries:
+                    return kind, e
+                self.retries += 1
+                delay = self._backoff(attempt)
+                if kind == RATE_LIMITED:
+                    self.bucket.throttle(delay)
+                else:
+                    self.batch_size.shrink()  # Timeouts and overload: send less per request
+                    logger.warning(f"Upload of {len(rows)} rows failed ({e!r}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                continue
+
+            self.bucket.succeeded()
+            self.batch_size.observe_latency(len(rows), time.perf_counter() - started)
+            self.rows_uploaded += len(rows)
+            return None, None
+
+    async def _send(self, rows: List[Dict[str, Any]]) -> int:
+        """Upload rows, retrying and splitting as needed. Returns the number of rows dead-lettered."""
+        kind, error = await self._attempt(rows)
+        if kind is None:
+            return 0
+        if kind == FATAL and len(rows) > 1:
+            return await self._split(rows, error)
+        self._dead_letter(rows, error)
+        return len(rows)
+
+    async def _split(self, rows: List[Dict[str, Any]], error: Exception) -> int:
+        """Bisect a rejected batch to isolate the bad rows."""
+        middle = len(rows) // 2
+        halves = [rows[:middle], rows[middle:]]
+        outcomes = [await self._attempt(half) for half in halves]
+        # Both halves failing like the whole batch means every row does (a missing
+        # column, say); splitting further would only cost about two requests per row
+        if all(kind == FATAL and _same_error(half_error, error) for kind, half_error in outcomes):
+            self._dead_letter(rows, error)
+            return len(rows)
+
+        failed = 0
+        for half, (kind, half_error) in zip(halves, outcomes):
+            if kind is None:
+                continue
+            if kind == FATAL and len(half) > 1:
+                failed += await self._split(half, half_error)
+            else:
+                self._dead_letter(half, half_error)
+                failed += len(half)
+        return failed
+
+    async def upload_all(self, batches: AsyncIterator[List[Dict[str, Any]]],
+                         on_committed: Optional[Callable[[List[Dict[str, Any]], int], Any]] = None):
+        """Upload every row of `batches`; raises only if on_committed or the input does."""
+        slots = asyncio.Semaphore(self.concurrency)
+        finished: Dict[int, tuple] = {}
+        next_to_commit = 0
+        tasks = set()
+        error: List[BaseException] = []
+
+        def commit_ready():
+            nonlocal next_to_commit
+            while next_to_commit in finished:
+                rows, failed = finished.pop(next_to_commit)
+                next_to_commit += 1
+                if on_committed is not None:
+                    on_committed(rows, failed)
+
+        async def run(sequence: int, rows: List[Dict[str, Any]]):
+            try:
+                failed = await self._send(rows)
+                finished[sequence] = (rows, failed)
+                commit_ready()
+            except Exception as e:
+                error.append(e)  # Raised by upload_all; stops new batches, the ones in flight finish
+            finally:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    self.busy_seconds += time.perf_counter() - self._busy_since
+                slots.release()
+
+        async def dispatch(sequence: int, rows: List[Dict[str, Any]]):
+            await slots.acquire()
+            if error:
+                slots.release()
+                raise error[0]
+            if self._in_flight == 0:
+                self._busy_since = time.perf_counter()
+            self._in_flight += 1
+            task = asyncio.create_task(run(sequence, rows))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        sequence = 0
+        pending: List[Dict[str, Any]] = []
+        pending_bytes = 0
+        try:
+            async for rows in batches:
+                sizes = [len(orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY)) for row in rows]
+                self.batch_size.observe_rows(len(rows), sum(sizes))
+                for row, row_bytes in zip(rows, sizes):
+                    pending.append(row)
+                    pending_bytes += row_bytes
+                    if len(pending) >= self.batch_size.current() or pending_bytes >= self.batch_size.max_bytes:
+                        await dispatch(sequence, pending)
+                        sequence += 1
+                        pending, pending_bytes = [], 0
+            if pending:
+                await dispatch(sequence, pending)
+            if tasks:
+                await asyncio.gather(*tasks)
+            if error:
+                raise error[0]
+        finally:
+            for task in list(tasks):
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def replay_dead_letters(self) -> int:
+        """Upload the rows of the dead-letter file again; rows that still fail are written back. Returns rows replayed."""
+        if not self.dead_letter_path:
+            return 0
+        # Rows move to a side file first, so failures can be appended to the dead-letter
+        # file during the replay; a side file left by a crashed replay is picked up again
+        replaying_path = f"{self.dead_letter_path}.replaying"
+        rows = []
+        for path in (replaying_path, self.dead_letter_path):
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    rows.extend(orjson.loads(line)["row"] for line in f if line.strip())
+        if not rows:
+            return 0
+        tmp_path = f"{replaying_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(orjson.dumps({"row": row}) + b"\n" for row in rows)
+        os.replace(tmp_path, replaying_path)
+        if os.path.exists(self.dead_letter_path):
+            os.remove(self.dead_letter_path)
+
+        async def one_batch():
+            yield rows
+
+        before = self.rows_uploaded
+        await self.upload_all(one_batch())
+        os.remove(replaying_path)
+        return self.rows_uploaded - before
+
+    def summary(self) -> str:
+        return (f"{self.rows_uploaded} rows in {self.requests} requests ({self.retries} retried, "
+                f"{self.bucket.throttled} rate limited, {self.rows_dead_lettered} dead-lettered), "
+                f"last batch size {self.batch_size.current()}")
@@ -0,0 +1,123 @@
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Bill and case numbers as written in Folketinget data: "L 123", "B 45", "F 12", "V 3", ...
+CASE_NUMBER_PATTERN = re.compile(r"\b([LBFVRSEUK])\s?(\d{1,4})\b", re.IGNORECASE)
+TOKEN_PATTERN = re.compile(r"[0-9a-zæøåäöüé]+")
+
+DANISH_STOPWORDS = frozenset("""
+af alle alt anden andet andre at bare begge blev blive bliver da de dem den denne der deres det dette
+dig din disse dog du efter eller en end er et for fra ham han hans har havde have hende hendes her hos
+hun hvad hvis hvor i ikke ind jeg jer jo kunne man mange med meget men mig min mine mit mod ned noget
+nogle nu når og også om op os over på selv sig sin sine sit skal skulle som sådan thi til ud under var
+vi vil ville vor være været
+""".split())
+
+# Light Danish stemming: common inflection suffixes, longest first
+DANISH_SUFFIXES = (
+    "erendes", "erende", "hedens", "ernes", "endes", "heden", "erets", "erne", "ende", "ene", "ens",
+    "ers", "ets", "er", "en", "et", "es", "e", "s",
+)
+MIN_STEM_LENGTH = 3
+
+
+VOWELS = frozenset("aeiouyæøå")
+
+
+def stem_danish(token: str) -> str:
+    for suffix in DANISH_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            token = token[:-len(suffix)]
+            break
+    # "skatterne" -> "skatt" -> "skat", so it matches "skat"
+    if len(token) > MIN_STEM_LENGTH and token[-1] == token[-2] and token[-1] not in VOWELS:
+        token = token[:-1]
+    return token
+
+
+def tokenize_danish(text: str) -> List[str]:
+    """
+    Lowercased, stemmed tokens without stopwords.
+
+    Case numbers such as "L 123" or "l 123" become a single token ("l123"),
+    and their digits are not also kept on their own, so a search for a bill
+    number does not match every text containing "123".
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKC", text)
+    tokens = [f"{letter.lower()}{number}" for letter, number in CASE_NUMBER_PATTERN.findall(text)]
+    for token in TOKEN_PATTERN.findall(CASE_NUMBER_PATTERN.sub(" ", text).lower()):
+        if token.isdigit():
+            tokens.append(token)
+        elif len(token) > 1 and token not in DANISH_STOPWORDS:
+            tokens.append(stem_danish(token))
+    return tokens
+
+
+def is_case_number_query(text: str) -> bool:
+    """True for queries that are only a case number, e.g. "L 123"."""
+    return bool(CASE_NUMBER_PATTERN.fullmatch(text.strip()))
+
+
+class BM25Index:
+    """
+    In-memory Okapi BM25 inverted index.
+
+    Each term maps to the ids of the documents containing it and the term
+    frequency in each, so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.n_docs = 0
+
+    @classmethod
+    def build(cls, documents: Sequence[str], **kwargs) -> "BM25Index":
+        index = cls(**kwargs)
+        postings = defaultdict(lambda: ([], []))
+        doc_lengths = []
+
+        for doc_id, document in enumerate(documents):
+            tokens = tokenize_danish(document)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                ids, frequencies = postings[term]
+                ids.append(doc_id)
+                frequencies.append(frequency)
+
+        index.n_docs = len(doc_lengths)
+        index.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        for term, (ids, frequencies) in postings.items():
+            index.postings[term] = (np.asarray(ids, dtype=np.int32), np.asarray(frequencies, dtype=np.float32))
+            # BM25+ style idf that never goes negative for very common terms
+            index.idf[term] = math.log(1 + (index.n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+        return index
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and scores of the k best matching documents, best first."""
+        terms = [term for term in set(tokenize_danish(query)) if term in self.postings]
+        if not terms or self.n_docs == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        average_length = float(self.doc_lengths.mean()) or 1.0
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in terms:
+            ids, frequencies = self.postings[term]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[ids] / average_length)
+            scores[ids] += self.idf[term] * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return candidates, scores[candidates]
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+
+class LRUTTLCache:
+    """
+    Thread-safe in-process cache with a bounded number of entries.
+
+    Entries are evicted least-recently-used first once max_entries is reached,
+    and expire ttl_seconds after they were stored (ttl_seconds=None never expires).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Stays under SQLite's limit on parameters per statement in older builds (999)
+SQLITE_MAX_PARAMS = 900
+
+
+class SQLiteVectorCache:
+    """
+    Small on-disk vector cache that several worker processes can share.
+
+    Vectors are stored as raw float32 bytes keyed by a string. Entries older than
+    ttl_seconds are ignored, and the oldest rows are pruned when the table grows
+    past max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        # WAL lets readers in other workers proceed while one worker writes
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        min_created = time.time() - self.ttl_seconds if self.ttl_seconds else 0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM vectors WHERE key = ? AND created > ?", (key, min_created)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def set(self, key: str, vector: np.ndarray):
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO vectors (key, vector, created) VALUES (?, ?, ?)",
+                (key, blob, time.time()),
+            )
+            self._writes += 1
+            # Prune occasionally rather than on every write
+            if self._writes % 100 == 0:
+                self._conn.execute(
+                    "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def get_many(self, keys: List[str], touch: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Vectors of the keys that are cached; one query per SQLITE_MAX_PARAMS keys.
+
+        touch=True resets the timestamp of the hits, so pruning drops the least
+        recently used entries instead of the oldest (and the TTL restarts).
+        """
+        now = time.time()
+        min_created = now - self.ttl_seconds if self.ttl_seconds else 0
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+                chunk = keys[start:start + SQLITE_MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(chunk))}) AND created > ?",
+                    (*chunk, min_created),
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+            if touch and found:
+                self._conn.executemany("UPDATE vectors SET created = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, vectors: Dict[str, np.ndarray]):
+        """Store several vectors in one transaction."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, vector, created) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in vectors.items()],
+            )
+            self._conn.execute(
+                "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ContentHashEmbeddingCache:
+    """
+    Embeddings keyed by a hash of the model version and the exact text, stored
+    in a SQLiteVectorCache that outlives the process.
+
+    encode() sends each distinct text that is not stored yet to the model once,
+    however often it repeats in the batch or was seen in earlier runs. Meant for
+    the import job, where most texts are unchanged from one run to the next.
+    """
+
+    def __init__(self, path: str, model_version: str, max_entries: int):
+        self.model_version = model_version
+        self.store = SQLiteVectorCache(path, max_entries)
+        self.texts = 0
+        self.encoded = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_version}\x00{text}".encode("utf-8")).hexdigest()
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        keys = [self.key(text) for text in texts]
+        vectors = self.store.get_many(list(dict.fromkeys(keys)), touch=True)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            encoded = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            new_vectors = dict(zip(missing, encoded))
+            self.store.set_many(new_vectors)
+            vectors.update(new_vectors)
+
+        self.texts += len(texts)
+        self.encoded += len(missing)
+        return np.stack([vectors[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"texts": self.texts, "encoded": self.encoded, "reused": self.texts - self.encoded,
+                "path": self.store.path}
@@ -0,0 +1,70 @@
+import os
+from typing import Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+# "torch"       - the fine-tuned model as-is (PyTorch fp32)
+# "torch-int8"  - PyTorch with the Linear layers dynamically quantized to int8 at load time
+# "onnx"        - the exported ONNX graph run by onnxruntime
+# "onnx-int8"   - the exported ONNX graph with dynamically quantized int8 weights
+INFERENCE_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+# Instruction set the onnx-int8 weights are quantized for: avx2, avx512, avx512_vnni or arm64
+ONNX_QUANTIZATION_CONFIG = os.environ.get("ONNX_QUANTIZATION_CONFIG", "avx2")
+
+
+def onnx_model_path(model_path: str) -> str:
+    """Exported ONNX artifacts live next to the reference model, never inside it."""
+    return os.environ.get("ONNX_MODEL_PATH") or f"{model_path.rstrip('/')}-onnx"
+
+
+def onnx_int8_file_name(quantization_config: str = ONNX_QUANTIZATION_CONFIG) -> str:
+    return f"onnx/model_qint8_{quantization_config}.onnx"
+
+
+def set_torch_threads(threads: int):
+    """Intra-op threads per process; one forward pass runs at a time, so no inter-op pool."""
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Only allowed before the first parallel operation
+
+
+def load_encoder(model_path: str, backend: str = "torch", device: Optional[str] = None) -> "SentenceTransformer":
+    """
+    Load the embedding model with the given inference backend.
+
+    Every backend returns a SentenceTransformer, so callers use the same
+    encode() API. The ONNX backends need the artifacts written by export_model.py
+    and the optional 'optimum[onnxruntime]' package.
+    """
+    # Imported here so importing the API does not pull in torch before the loader runs
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_path, device=device)
+
+    if backend == "torch-int8":
+        import torch
+
+        # Dynamic quantization is a CPU-only feature in PyTorch
+        model = SentenceTransformer(model_path, device="cpu")
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return model
+
+    if backend in ("onnx", "onnx-int8"):
+        path = onnx_model_path(model_path)
+        file_name = "onnx/model.onnx" if backend == "onnx" else onnx_int8_file_name()
+        if not os.path.exists(os.path.join(path, file_name)):
+            raise RuntimeError(f"{os.path.join(path, file_name)} not found. Run export_model.py first.")
+        try:
+            return SentenceTransformer(path, backend="onnx", device="cpu", model_kwargs={"file_name": file_name})
+        except ImportError as e:
+            raise RuntimeError(f"The {backend} backend needs 'optimum[onnxruntime]': {e}")
+
+    raise RuntimeError(f"Unknown inference backend '{backend}', expected one of {INFERENCE_BACKENDS}")
@@ -0,0 +1,72 @@
+import base64
+from typing import Callable, Iterator, List
+
+import numpy as np
+import orjson
+
+# Little-endian, whatever the host byte order, so clients can read the bytes with
+# np.frombuffer(body, "<f4") (or "<f2") on any machine
+WIRE_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+
+
+def iter_embedding_chunks(encode: Callable[[List[str]], np.ndarray], texts: List[str], batch_size: int,
+                          dtype: str = "float32") -> Iterator[np.ndarray]:
+    """Encode texts batch_size at a time, yielding each batch as a (n, dim) array of the wire dtype."""
+    wire_dtype = WIRE_DTYPES[dtype]
+    for start in range(0, len(texts), batch_size):
+        yield np.ascontiguousarray(encode(texts[start:start + batch_size]), dtype=wire_dtype)
+
+
+def encode_all(encode: Callable[[List[str]], np.ndarray], texts: List[str], batch_size: int, dim: int,
+               dtype: str = "float32") -> np.ndarray:
+    """All embeddings in one preallocated array, so peak memory is the result plus one batch."""
+    result = np.empty((len(texts), dim), dtype=WIRE_DTYPES[dtype])
+    offset = 0
+    for chunk in iter_embedding_chunks(encode, texts, batch_size, dtype):
+        result[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+    return result
+
+
+def json_body(matrix: np.ndarray) -> bytes:
+    """{"embeddings": [[...], ...]}, the original /embed response."""
+    # orjson writes float32 arrays natively but not float16
+    if matrix.dtype != np.float32:
+        matrix = matrix.astype(np.float32)
+    return orjson.dumps({"embeddings": matrix}, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def base64_body(matrix: np.ndarray, dtype: str) -> bytes:
+    return orjson.dumps({"dtype": dtype, "count": matrix.shape[0], "dim": matrix.shape[1],
+                         "data": base64.b64encode(matrix.tobytes()).decode("ascii")})
+
+
+def iter_json_body(chunks: Iterator[np.ndarray]) -> Iterator[bytes]:
+    """The same document as json_body, written one batch at a time."""
+    yield b'{"embeddings":['
+    first = True
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        rows = json_body(chunk)[len(b'{"embeddings":['):-len(b"]}")]
+        yield rows if first else b"," + rows
+        first = False
+    yield b"]}"
+
+
+def iter_binary_body(chunks: Iterator[np.ndarray]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield chunk.tobytes()
+
+
+def iter_base64_body(chunks: Iterator[np.ndarray], dtype: str, count: int, dim: int) -> Iterator[bytes]:
+    """The same document as base64_body, written one batch at a time."""
+    yield orjson.dumps({"dtype": dtype, "count": count, "dim": dim})[:-1] + b',"data":"'
+    pending = b""
+    for chunk in chunks:
+        pending += chunk.tobytes()
+        # base64 maps 3 bytes to 4 characters; carry the remainder to the next batch
+        usable = len(pending) - len(pending) % 3
+        yield base64.b64encode(pending[:usable])
+        pending = pending[usable:]
+    yield base64.b64encode(pending) + b'"}'
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Wire format between the API workers and embedding_server.py. Every message is
+# a little-endian uint32 payload length followed by the payload.
+#   request:  op (uint8), then for ENCODE: count (uint32) and per text its
+#             UTF-8 length (uint32) and bytes
+#   response: status (uint8), then for ENCODE: rows, dim (uint32) and
+#             rows * dim float32 values; INFO: UTF-8 JSON; errors: UTF-8 message
+OP_ENCODE = 1
+OP_INFO = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+_LENGTH = struct.Struct("<I")
+_SHAPE = struct.Struct("<II")
+
+
+def pack_encode_request(texts: List[str]) -> bytes:
+    parts = [bytes([OP_ENCODE]), _LENGTH.pack(len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def unpack_encode_request(payload: bytes) -> List[str]:
+    (count,) = _LENGTH.unpack_from(payload, 1)
+    offset = 1 + _LENGTH.size
+    texts = []
+    for _ in range(count):
+        (length,) = _LENGTH.unpack_from(payload, offset)
+        offset += _LENGTH.size
+        texts.append(payload[offset:offset + length].decode("utf-8"))
+        offset += length
+    return texts
+
+
+def pack_embeddings(embeddings: np.ndarray) -> bytes:
+    embeddings = np.ascontiguousarray(embeddings, dtype="<f4")
+    rows, dim = embeddings.shape
+    return bytes([STATUS_OK]) + _SHAPE.pack(rows, dim) + embeddings.tobytes()
+
+
+def unpack_embeddings(payload: bytes) -> np.ndarray:
+    rows, dim = _SHAPE.unpack_from(payload, 1)
+    return np.frombuffer(payload, dtype="<f4", count=rows * dim, offset=1 + _SHAPE.size).reshape(rows, dim)
+
+
+def frame(payload: bytes) -> bytes:
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError("Embedding server closed the connection")
+        received += count
+    return bytes(buffer)
+
+
+class ConnectionClosedError(ConnectionError):
+    """The connection broke before the server answered, so the request can be sent again."""
+
+
+class RemoteEncoder:
+    """
+    Client for embedding_server.py with the subset of the SentenceTransformer API the app uses.
+
+    encode() blocks on the socket without holding the GIL, so it is called from
+    the thread pool like the in-process model. Connections are pooled and
+    re-created after a fork or a broken connection.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._info: Optional[Dict[str, Any]] = None
+
+    def info(self) -> Dict[str, Any]:
+        if self._info is None:
+            payload = self._request(bytes([OP_INFO]))
+            self._info = json.loads(payload[1:].decode("utf-8"))
+        return self._info
+
+    @property
+    def tokenizer(self):
+        return SimpleNamespace(do_lower_case=self.info().get("do_lower_case", False))
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.info()["dim"]), dtype=np.float32)
+        return unpack_embeddings(self._request(pack_encode_request(texts)))
+
+    def _request(self, payload: bytes) -> bytes:
+        # A pooled connection may have been closed by a server restart, which shows up
+        # before the server answers; only then is the request sent again, once, on a
+        # fresh connection. A timeout means the server may still be encoding it.
+        sock, pooled = self._acquire()
+        while True:
+            try:
+                response = self._exchange(sock, payload)
+                break
+            except ConnectionClosedError:
+                sock.close()
+                if not pooled:
+                    raise
+                sock, pooled = self._acquire(fresh=True)
+            except BaseException:
+                sock.close()
+                raise
+
+        self._release(sock)
+        if response[0] != STATUS_OK:
+            raise RuntimeError(f"Embedding server error: {response[1:].decode('utf-8', 'replace')}")
+        return response
+
+    @staticmethod
+    def _exchange(sock: socket.socket, payload: bytes) -> bytes:
+        try:
+            sock.sendall(frame(payload))
+        except socket.timeout:
+            raise
+        except OSError as e:
+            raise ConnectionClosedError(f"Could not send to the embedding server: {e}") from e
+        try:
+            first = sock.recv(_LENGTH.size)
+        except (ConnectionResetError, BrokenPipeError) as e:
+            raise ConnectionClosedError(f"Embedding server closed the connection: {e}") from e
+        if not first:
+            raise ConnectionClosedError("Embedding server closed the connection")
+
+        (length,) = _LENGTH.unpack(first + _recv_exactly(sock, _LENGTH.size - len(first)))
+        if length > MAX_FRAME_BYTES:
+            raise ConnectionError(f"Embedding server response too large ({length} bytes)")
+        return _recv_exactly(sock, length)
+
+    def _acquire(self, fresh: bool = False) -> Tuple[socket.socket, bool]:
+        """A connection, and whether it came from the pool."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the inherited sockets belong to the parent
+                self._idle = []
+                self._pid = os.getpid()
+            if self._idle and not fresh:
+                return self._idle.pop(), True
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock, False
+
+    def _release(self, sock: socket.socket):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._idle.append(sock)
+                return
+        sock.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
+
+
+def connect_embedding_server(socket_path: str, model_version: str, backend: str,
+                             wait_seconds: float = 120.0) -> RemoteEncoder:
+    """
+    Wait for the embedding server to answer and check it serves the expected model.
+
+    The server only opens its socket once the model is loaded, so this also
+    covers the API starting before the server.
+    """
+    encoder = RemoteEncoder(socket_path)
+    deadline = time.monotonic() + wait_seconds
+    while True:
+        try:
+            info = encoder.info()
+            break
+        except (OSError, ConnectionError) as e:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Embedding server at {socket_path} is not answering: {e}")
+            time.sleep(0.5)
+
+    # Query embeddings are cached under the API's model version and backend
+    if info.get("model_version") != model_version or info.get("backend") != backend:
+        raise RuntimeError(
+            f"Embedding server serves {info.get('model_version')} ({info.get('backend')}), "
+            f"expected {model_version} ({backend})"
+        )
+    return encoder
+
+
+class EmbeddingServer:
+    """
+    Owns the model and encodes for every API worker on the host.
+
+    Connections are handled on an asyncio loop; texts from all pending
+    requests are merged into one model.encode call of at most max_batch_size
+    texts on a single inference thread.
+    """
+
+    def __init__(self, model, info: Dict[str, Any], max_batch_size: int = 64):
+        self.model = model
+        self.info = info
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: "queue.Queue[Tuple[List[str], asyncio.Future]]" = queue.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _inference_loop(self):
+        while True:
+            batch = [self._pending.get()]
+            size = len(batch[0][0])
+            while size < self.max_batch_size:
+                try:
+                    item = self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            unique_texts = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            try:
+                embeddings = np.asarray(self.model.encode(unique_texts, batch_size=len(unique_texts)), dtype=np.float32)
+            except Exception as e:
+                for _, future in batch:
+                    self._loop.call_soon_threadsafe(_set_exception, future, e)
+                continue
+
+            rows = {text: i for i, text in enumerate(unique_texts)}
+            for texts, future in batch:
+                result = embeddings[[rows[text] for text in texts]]
+                self._loop.call_soon_threadsafe(_set_result, future, result)
+
+    async def _encode(self, texts: List[str]) -> np.ndarray:
+        future = self._loop.create_future()
+        self._pending.put((texts, future))
+        return await future
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                except asyncio.IncompleteReadError:
+                    break  # Client closed the connection
+                if length > MAX_FRAME_BYTES:
+                    break
+                payload = await reader.readexactly(length)
+
+                try:
+                    if payload[0] == OP_ENCODE:
+                        response = pack_embeddings(await self._encode(unpack_encode_request(payload)))
+                    elif payload[0] == OP_INFO:
+                        response = bytes([STATUS_OK]) + json.dumps(self.info).encode("utf-8")
+                    else:
+                        response = bytes([STATUS_ERROR]) + f"Unknown op {payload[0]}".encode("utf-8")
+                except Exception as e:
+                    response = bytes([STATUS_ERROR]) + str(e).encode("utf-8")
+
+                writer.write(frame(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str):
+        self._loop = asyncio.get_running_loop()
+        threading.Thread(target=self._inference_loop, name="embedding-inference", daemon=True).start()
+
+        # A socket file left behind by a previous run would make bind fail
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        os.chmod(socket_path, 0o660)
+        logger.info(f"Embedding server listening on {socket_path}")
+        async with server:
+            await server.serve_forever()
+
+
+def _set_result(future: asyncio.Future, result):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exception: Exception):
+    if not future.done():
+        future.set_exception(exception)
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    An opdateringsdato as returned by the API or by Postgres, as "YYYY-MM-DDTHH:MM:SS[.fff]".
+
+    The API's timestamps are local time without an offset; a timestamptz column
+    returns them with "+00:00", which is dropped so the two compare equal.
+    """
+    date, _, time_part = value.strip().replace(" ", "T").partition("T")
+    for marker in ("Z", "+", "-"):
+        time_part = time_part.split(marker)[0]
+    return f"{date}T{time_part or '00:00:00'}"
+
+
+def odata_datetime(value: str) -> str:
+    return f"datetime'{normalize_timestamp(value)}'"
+
+
+class ImportCheckpoint:
+    """
+    Progress of the delta import, saved as JSON after every committed batch.
+
+    high_water_mark is the newest opdateringsdato of the last finished run; the
+    next run asks the API only for votes updated after it. While a run is in
+    progress, `run` holds the opdateringsdato of the last uploaded row (the
+    cursor) and the rows uploaded so far. The delta query is sorted by
+    opdateringsdato, so an interrupted run resumes from its cursor: only the
+    rows sharing the cursor's timestamp are fetched again, and the upsert makes
+    that harmless. A keyset cursor is used instead of $skip because $skip
+    offsets shift whenever votes are updated between two runs.
+
+    The cursor stops at the first batch with rows that did not land. Later
+    batches still upload, but the run is not finished: the next one resumes
+    from before the failed rows and fetches them again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.high_water_mark: Optional[str] = None
+        self.run: Optional[Dict[str, Any]] = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            # Starting over is safe (every write is an upsert), only slower
+            logger.warning(f"Ignoring unreadable import checkpoint {self.path}: {e}")
+            return
+        self.high_water_mark = state.get("high_water_mark")
+        self.run = state.get("run")
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"high_water_mark": self.high_water_mark, "run": self.run}, f, indent=2)
+        os.replace(tmp_path, self.path)  # Atomic, so a crash never leaves half a checkpoint
+
+    def odata_filter(self) -> Optional[str]:
+        """The opdateringsdato condition for the next query, or None to fetch everything."""
+        if self.run and self.run.get("cursor"):
+            return f"opdateringsdato ge {odata_datetime(self.run['cursor'])}"
+        if self.high_water_mark:
+            return f"opdateringsdato gt {odata_datetime(self.high_water_mark)}"
+        return None
+
+    def resuming(self) -> bool:
+        return bool(self.run and self.run.get("cursor"))
+
+    def begin(self):
+        if self.run is None:
+            self.run = {"started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                        "since": self.high_water_mark, "cursor": None, "rows": 0, "failed_rows": 0}
+        else:
+            self.run["failed_rows"] = 0  # A resumed run fetches the failed rows again
+        self.save()
+
+    def commit(self, rows: List[Dict[str, Any]], failed: int = 0):
+        """
+        Record a finished batch, `failed` of whose rows did not land. Batches must be
+        committed in query order.
+        """
+        if self.run is None:
+            self.begin()
+        self.run["failed_rows"] = self.run.get("failed_rows", 0) + failed
+        dates = [normalize_timestamp(row["opdateringsdato"]) for row in rows if row.get("opdateringsdato")]
+        if dates and not self.run["failed_rows"]:
+            self.run["cursor"] = max([self.run["cursor"], *dates] if self.run["cursor"] else dates)
+        self.run["rows"] += len(rows) - failed
+        self.save()
+
+    def finish(self) -> bool:
+        """
+        The run fetched everything: its cursor becomes the new high-water mark.
+        Returns False, and keeps the run to resume, if any rows failed.
+        """
+        if self.run is not None:
+            if self.run.get("failed_rows"):
+                self.save()
+                return False
+            candidates = [date for date in (self.high_water_mark, self.run.get("cursor")) if date]
+            self.high_water_mark = max(candidates) if candidates else None
+            self.run = None
+        self.save()
+        return True
+
+    def reset(self):
+        """Forget all progress; the next run fetches everything."""
+        self.high_water_mark = None
+        self.run = None
+        self.save()
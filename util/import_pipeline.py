@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows per model.encode call in the import
+IMPORT_EMBED_BATCH_SIZE = int(os.environ.get("IMPORT_EMBED_BATCH_SIZE", "256"))
+# Batches waiting between two stages. With the defaults at most a few thousand rows
+# are in memory at once, however many the import covers.
+IMPORT_QUEUE_SIZE = int(os.environ.get("IMPORT_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+
+class PipelineStats:
+    def __init__(self):
+        self.fetched = 0
+        self.embedded = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.busy_seconds = {"fetch": 0.0, "embed": 0.0, "upload": 0.0}
+        self.started = time.perf_counter()
+
+    def summary(self) -> str:
+        busy = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.busy_seconds.items())
+        failed = f", {self.failed} failed" if self.failed else ""
+        return (f"{self.fetched} fetched, {self.embedded} embedded, {self.uploaded} uploaded{failed} in "
+                f"{time.perf_counter() - self.started:.1f}s (busy: {busy})")
+
+
+async def run_import_pipeline(
+    record_pages: AsyncIterator[List[Dict[str, Any]]],
+    prepare: Callable[[Dict[str, Any]], Dict[str, Any]],
+    encode: Callable[[List[str]], np.ndarray],
+    upload: Union[Callable[[List[Dict[str, Any]]], Any], Any],
+    upload_batch_size: int,
+    embed_batch_size: int = IMPORT_EMBED_BATCH_SIZE,
+    queue_size: int = IMPORT_QUEUE_SIZE,
+    stats: Optional[PipelineStats] = None,
+    on_uploaded: Optional[Callable[[List[Dict[str, Any]], int], Any]] = None,
+) -> PipelineStats:
+    """
+    Fetch, embed and upload as three concurrent stages joined by bounded queues.
+
+    prepare turns an API record into a row with 'embedding_text'; encode and
+    upload are blocking and run in worker threads, so the model, the uploads and
+    the next page downloads all make progress at the same time. upload may also
+    be an uploader with `async upload_all(batches, on_committed)`, such as
+    util/batch_uploader.py's BatchUploader, which then regroups and parallelizes
+    the uploads itself. A full queue
+    pauses the stage before it, which bounds memory. If a stage fails the
+    others are cancelled and the error is raised; pass `stats` to see how far
+    the import got. on_uploaded(rows, failed) is called with every batch once
+    it is stored, `failed` of its rows having been dead-lettered by the uploader,
+    in the order the records were fetched, e.g. to checkpoint progress.
+    """
+    stats = stats if stats is not None else PipelineStats()
+    to_embed: asyncio.Queue = asyncio.Queue(queue_size)
+    to_upload: asyncio.Queue = asyncio.Queue(queue_size)
+
+    async def fetch_stage():
+        batch = []
+        waited = time.perf_counter()
+        async for records in record_pages:
+            stats.busy_seconds["fetch"] += time.perf_counter() - waited
+            stats.fetched += len(records)
+            batch.extend(prepare(record) for record in records)
+            while len(batch) >= embed_batch_size:
+                await to_embed.put(batch[:embed_batch_size])
+                batch = batch[embed_batch_size:]
+            waited = time.perf_counter()
+        if batch:
+            await to_embed.put(batch)
+        await to_embed.put(_DONE)
+
+    async def embed_stage():
+        while (rows := await to_embed.get()) is not _DONE:
+            started = time.perf_counter()
+            embeddings = await asyncio.to_thread(encode, [row["embedding_text"] for row in rows])
+            for row, embedding in zip(rows, embeddings):
+                row["embedding_v5"] = embedding.tolist()
+            del embeddings
+            stats.embedded += len(rows)
+            stats.busy_seconds["embed"] += time.perf_counter() - started
+            for start in range(0, len(rows), upload_batch_size):
+                await to_upload.put(rows[start:start + upload_batch_size])
+        await to_upload.put(_DONE)
+
+    def committed(rows: List[Dict[str, Any]], failed: int = 0):
+        stats.uploaded += len(rows) - failed
+        stats.failed += failed
+        if on_uploaded is not None:
+            on_uploaded(rows, failed)
+
+    async def queued_batches():
+        while (rows := await to_upload.get()) is not _DONE:
+            yield rows
+
+    async def upload_stage():
+        if hasattr(upload, "upload_all"):
+            try:
+                await upload.upload_all(queued_batches(), committed)
+            finally:
+                stats.busy_seconds["upload"] = upload.busy_seconds
+            return
+        async for rows in queued_batches():
+            started = time.perf_counter()
+            await asyncio.to_thread(upload, rows)
+            stats.busy_seconds["upload"] += time.perf_counter() - started
+            committed(rows)
+
+    tasks = [asyncio.create_task(stage()) for stage in (fetch_stage, embed_stage, upload_stage)]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        close = getattr(record_pages, "aclose", None)
+        if close is not None:
+            await close()
+
+    logger.info(f"Import pipeline finished: {stats.summary()}")
+    return stats
@@ -0,0 +1,112 @@
+import hashlib
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF) index for approximate cosine search over normalized vectors.
+
+    Vectors are grouped into n_lists clusters with spherical k-means. A search
+    only scores the vectors in the nprobe clusters whose centroids are closest
+    to the query, so nprobe trades recall (higher) against speed (lower).
+    The index stores row ids only; the vectors stay in the caller's matrix.
+    """
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_ids: np.ndarray, fingerprint: str = ""):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.fingerprint = fingerprint
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, n_lists: Optional[int] = None, n_iter: int = 10,
+              max_training_points: int = 50000, seed: int = 0, fingerprint: str = "") -> "IVFIndex":
+        """Cluster a normalized float32 matrix into n_lists inverted lists (default ~sqrt(N))."""
+        n_rows = len(matrix)
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(n_rows)))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        rng = np.random.default_rng(seed)
+        training = matrix
+        if n_rows > max_training_points:
+            training = matrix[rng.choice(n_rows, max_training_points, replace=False)]
+
+        centroids = training[rng.choice(len(training), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = assign_to_centroids(training, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, training)
+            counts = np.bincount(assignment, minlength=n_lists)
+
+            # Empty clusters are re-seeded with random training points
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = training[rng.choice(len(training), int(empty.sum()), replace=False)]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+            centroids = centroids.astype(np.float32)
+
+        assignment = assign_to_centroids(matrix, centroids)
+        list_ids = np.argsort(assignment, kind="stable").astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+
+        return cls(centroids, list_offsets, list_ids, fingerprint)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Row ids in the nprobe lists closest to the query."""
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.n_lists)
+        return np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probe])
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row ids, cosine scores) for every candidate in the probed lists."""
+        ids = self.candidates(query, nprobe)
+        return ids, matrix[ids] @ query
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temp file first so a concurrent reader never sees half an index.
+        # One per process: gunicorn workers may build and save the index at the same time.
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp_path, centroids=self.centroids, list_offsets=self.list_offsets,
+                     list_ids=self.list_ids, fingerprint=np.array(self.fingerprint))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["list_offsets"], data["list_ids"], str(data["fingerprint"]))
+
+
+def assign_to_centroids(matrix: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """Index of the most similar centroid for each row, computed in chunks to bound memory."""
+    assignment = np.empty(len(matrix), dtype=np.int64)
+    for start in range(0, len(matrix), chunk_size):
+        assignment[start:start + chunk_size] = np.argmax(matrix[start:start + chunk_size] @ centroids.T, axis=1)
+    return assignment
+
+
+def matrix_fingerprint(matrix: np.ndarray, ids) -> str:
+    """Identifies the exact data (row ids and vectors) an index was built from."""
+    digest = hashlib.sha1(repr(list(ids)).encode())
+    digest.update(np.ascontiguousarray(matrix).data)
+    return digest.hexdigest()
@@ -0,0 +1,193 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import sys
+import time
+from typing import Any, Optional
+
+# DEBUG, INFO, WARNING or ERROR
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "json" writes one JSON object per line, "text" a plain line for local development
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+# Records waiting for the writer thread; when full, new records are dropped instead of blocking requests
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Share of payload logs (queries, result rows) that are written at DEBUG level, and their size cap
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", "2000"))
+# Requests slower than this are logged at WARNING with their request id (0 = off)
+LOG_SLOW_REQUEST_MS = float(os.environ.get("LOG_SLOW_REQUEST_MS", "1000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# HTTP client libraries log every request at INFO (one line per Supabase call on
+# the search path); only their warnings are kept
+QUIET_LOGGERS = ("httpx", "httpcore", "hpack")
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra= and is written as a field
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["DroppingQueueHandler"] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text  # Formatted by DroppingQueueHandler.prepare
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        if getattr(record, "request_id", None):
+            fields["request_id"] = record.request_id
+        return line + "".join(f" {key}={value}" for key, value in fields.items())
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks the caller. Formatting and writing happen on
+    the listener thread; if it falls LOG_QUEUE_SIZE records behind, new records
+    are counted and dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (its arguments may change later) but leave formatting to the writer
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start_listener():
+    global _listener
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    _listener = logging.handlers.QueueListener(_handler.queue, stream)
+    _listener.start()
+
+
+def _restart_listener_after_fork():
+    # The writer thread does not survive fork (gunicorn preload); each child starts its own
+    if _handler is not None:
+        _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+        _handler.dropped = 0
+        _start_listener()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """
+    Send every log record through a bounded queue to a writer thread. Safe to
+    call more than once; only the first call installs the handler.
+    """
+    global _handler
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(max(logging.WARNING, root.level))
+    if _handler is not None:
+        return
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    root.addHandler(_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def dropped_log_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+def log_payload(logger: logging.Logger, msg: str, payload: Any, sample_rate: float = LOG_PAYLOAD_SAMPLE_RATE, **fields):
+    """
+    Log a large value (result rows, raw responses) at DEBUG for a sample of calls.
+    Costs a level check when DEBUG is off; the payload is only serialized when sampled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= sample_rate:
+        return
+    text = json.dumps(payload, ensure_ascii=False, default=str)
+    if len(text) > LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:LOG_PAYLOAD_MAX_CHARS]}... ({len(text)} chars)"
+    logger.debug(msg, extra={**fields, "payload": text})
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware giving each request an id (the incoming X-Request-ID or a new
+    one) that is added to every log record written while it is handled and
+    returned in the X-Request-ID response header. Slow requests are logged.
+    """
+
+    def __init__(self, app, slow_request_ms: float = LOG_SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request = slow_request_ms / 1000
+        self.logger = logging.getLogger("folketinget.requests")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = next((value for name, value in scope["headers"] if name == b"x-request-id"), None)
+        request_id = incoming.decode("latin-1")[:64] if incoming else secrets.token_hex(8)
+        token = request_id_var.set(request_id)
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed = time.perf_counter() - started
+            if self.slow_request and elapsed >= self.slow_request:
+                self.logger.warning("Slow request", extra={"method": scope["method"], "path": scope["path"],
+                                                           "status": status["code"],
+                                                           "duration_ms": round(elapsed * 1000, 1)})
+            request_id_var.reset(token)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# The model is committed with git LFS and mirrored on the Hugging Face hub.
+# model_manifest.json pins the hub revision and the sha256 of every file, so a
+# checkout with the LFS files present starts without touching the network.
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_DIR = os.path.join(ROOT_DIR, "embedding_model")
+MANIFEST_PATH = os.environ.get("MODEL_MANIFEST_PATH", os.path.join(ROOT_DIR, "model_manifest.json"))
+MODEL_PATH = os.path.join(MODEL_DIR, "danishbert-cosine-embeddings")
+
+# "stat" re-hashes a file only when its size or mtime changed since it was last
+# verified, "full" re-hashes every file on every start.
+MODEL_VERIFY = os.environ.get("MODEL_VERIFY", "stat").lower()
+# Never contact the hub; missing or corrupt files are an error instead
+HF_HUB_OFFLINE = os.environ.get("HF_HUB_OFFLINE", "0") == "1"
+HF_TOKEN = os.environ.get("HF_TOKEN")
+
+# Size and mtime of files that matched the manifest, per checkout (not committed)
+VERIFIED_STATE_FILE = ".verified.json"
+
+# Downloads must name the commit the checksums were taken from: a branch or tag can move
+COMMIT_SHA_PATTERN = re.compile(r"[0-9a-f]{40}")
+
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def model_version(manifest: Optional[Dict[str, Any]] = None) -> str:
+    """Short, stable id of the pinned model files. Changes whenever any checksum does."""
+    manifest = manifest or load_manifest()
+    digest = hashlib.sha256(json.dumps(manifest["files"], sort_keys=True).encode("utf-8")).hexdigest()
+    return f"{manifest['model_name']}@{digest[:12]}"
+
+
+def pinned_revision(manifest: Dict[str, Any]) -> str:
+    """The hub commit to download from: MODEL_REVISION or the manifest's revision."""
+    revision = os.environ.get("MODEL_REVISION", manifest.get("revision"))
+    if not isinstance(revision, str) or not COMMIT_SHA_PATTERN.fullmatch(revision):
+        raise RuntimeError(f"Model revision {revision!r} is not a 40-character commit sha. "
+                           f"Pin the manifest with: python pin_model_revision.py")
+    return revision
+
+
+def sha256_file(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_verified_state(model_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(model_dir, VERIFIED_STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_verified_state(model_dir: str, state: Dict[str, Any]):
+    path = os.path.join(model_dir, VERIFIED_STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # Read-only checkouts just verify by hash on every start
+        logger.warning(f"Could not save model verification state: {e}")
+
+
+def verify_artifacts(model_dir: str = MODEL_DIR, manifest: Optional[Dict[str, Any]] = None,
+                     full: bool = MODEL_VERIFY == "full") -> List[str]:
+    """
+    Check the files under model_dir against the manifest.
+
+    Returns the manifest paths that are missing or do not match (an empty list
+    means the model can be loaded as-is). Git LFS pointer files fail the size check.
+    """
+    manifest = manifest or load_manifest()
+    state = {} if full else _load_verified_state(model_dir)
+    new_state: Dict[str, Any] = {}
+    problems = []
+
+    for rel_path, expected in manifest["files"].items():
+        path = os.path.join(model_dir, rel_path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            problems.append(rel_path)
+            continue
+
+        if stat.st_size != expected["size"]:
+            problems.append(rel_path)
+            continue
+
+        signature = [expected["sha256"], stat.st_size, stat.st_mtime_ns]
+        if state.get(rel_path) != signature and sha256_file(path) != expected["sha256"]:
+            problems.append(rel_path)
+            continue
+        new_state[rel_path] = signature
+
+    if new_state != state:
+        _save_verified_state(model_dir, new_state)
+    return problems
+
+
+def ensure_model_artifacts(model_dir: str = MODEL_DIR, manifest_path: str = MANIFEST_PATH,
+                           offline: bool = HF_HUB_OFFLINE) -> str:
+    """
+    Make sure the pinned model files are present and intact, and return the model path.
+
+    Only the files that fail verification are downloaded, at the revision pinned
+    in the manifest. With HF_HUB_OFFLINE=1 a failed verification raises instead.
+    """
+    manifest = load_manifest(manifest_path)
+    model_path = os.path.join(model_dir, manifest["model_name"])
+    problems = verify_artifacts(model_dir, manifest)
+    if not problems:
+        return model_path
+
+    if offline:
+        raise RuntimeError(f"Model files missing or corrupt and HF_HUB_OFFLINE=1: {', '.join(problems)}")
+
+    repo_id = os.environ.get("MODEL_REPO_ID", manifest["repo_id"])
+    revision = pinned_revision(manifest)
+    logger.info(f"Downloading {len(problems)} model files from {repo_id}@{revision}...")
+
+    from huggingface_hub import snapshot_download
+
+    os.makedirs(model_dir, exist_ok=True)
+    snapshot_download(
+        repo_id=repo_id,
+        revision=revision,
+        local_dir=model_dir,
+        allow_patterns=problems,
+        token=HF_TOKEN,
+    )
+
+    problems = verify_artifacts(model_dir, manifest, full=True)
+    if problems:
+        raise RuntimeError(f"Downloaded model files do not match {manifest_path}: {', '.join(problems)}")
+    return model_path
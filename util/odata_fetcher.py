@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import random
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Pages requested at the same time. oda.ft.dk is a public service; keep this modest.
+ODATA_CONCURRENCY = int(os.environ.get("ODATA_CONCURRENCY", "8"))
+ODATA_MAX_RETRIES = int(os.environ.get("ODATA_MAX_RETRIES", "6"))
+# First retry waits about this long, doubling per attempt (with jitter) up to ODATA_BACKOFF_MAX_SECONDS
+ODATA_BACKOFF_SECONDS = float(os.environ.get("ODATA_BACKOFF_SECONDS", "1"))
+ODATA_BACKOFF_MAX_SECONDS = float(os.environ.get("ODATA_BACKOFF_MAX_SECONDS", "60"))
+ODATA_TIMEOUT_SECONDS = float(os.environ.get("ODATA_TIMEOUT_SECONDS", "30"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ODataFetchError(Exception):
+    """A page could not be fetched after all retries. The import must not continue with a partial dataset."""
+
+
+class ODataPage:
+    def __init__(self, skip: int, records: List[Dict[str, Any]], total_count: Optional[int]):
+        self.skip = skip
+        self.records = records
+        self.total_count = total_count
+
+
+class ODataFetcher:
+    """
+    Fetches every page of an OData query ($inlinecount=allpages) concurrently
+    and yields them in $skip order.
+
+    The first page gives odata.count and the server's page size, so every other
+    page URL is known up front. At most `concurrency` requests are in flight and
+    completed pages wait at most `concurrency` deep for the ones before them, so
+    memory stays bounded however large the result. Failed requests (connection
+    errors, timeouts, 429 and 5xx) are retried with exponential backoff; a page
+    that still fails raises ODataFetchError instead of ending the import early.
+    """
+
+    def __init__(self, query_url: str, concurrency: int = ODATA_CONCURRENCY, max_retries: int = ODATA_MAX_RETRIES,
+                 backoff_seconds: float = ODATA_BACKOFF_SECONDS, timeout: float = ODATA_TIMEOUT_SECONDS,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.query_url = query_url
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.transport = transport  # For tests
+        self.requests = 0
+        self.retries = 0
+
+    def page_url(self, skip: int) -> str:
+        return f"{self.query_url}&$skip={skip}"
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), ODATA_BACKOFF_MAX_SECONDS)
+        # Full jitter, so concurrent pages that failed together do not retry together
+        return random.uniform(0, min(ODATA_BACKOFF_MAX_SECONDS, self.backoff_seconds * 2 ** attempt))
+
+    async def fetch_page(self, client: httpx.AsyncClient, skip: int) -> ODataPage:
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                self.requests += 1
+                response = await client.get(self.page_url(skip))
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    data = response.json()
+                    count = data.get("odata.count")
+                    return ODataPage(skip, data.get("value", []), int(count) if count is not None else None)
+                error = f"HTTP {response.status_code}"
+            except (httpx.TransportError, ValueError) as e:  # ValueError: truncated or invalid JSON
+                error = repr(e)
+            except httpx.HTTPStatusError as e:
+                raise ODataFetchError(f"Page $skip={skip} failed: {e}") from e
+
+            if attempt == self.max_retries:
+                raise ODataFetchError(f"Page $skip={skip} failed after {self.max_retries + 1} attempts: {error}")
+            delay = self._backoff(attempt, response)
+            self.retries += 1
+            logger.warning(f"Page $skip={skip} failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def pages(self) -> AsyncIterator[ODataPage]:
+        """
+        All pages in order. Stopping iteration early (break, or closing the generator)
+        cancels the requests still in flight.
+        """
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, transport=self.transport,
+                                     headers={"Accept": "application/json"}) as client:
+            first = await self.fetch_page(client, 0)
+            yield first
+            page_size = len(first.records)
+            total = first.total_count or 0
+            if page_size == 0 or (first.total_count is not None and page_size >= total):
+                return
+
+            skips = iter(range(page_size, total, page_size))
+            in_flight: Deque[asyncio.Task] = deque()
+            last_page: Optional[ODataPage] = first
+
+            def schedule():
+                skip = next(skips, None)
+                if skip is not None:
+                    in_flight.append(asyncio.create_task(self.fetch_page(client, skip)))
+
+            try:
+                for _ in range(self.concurrency):
+                    schedule()
+                while in_flight:
+                    last_page = await in_flight.popleft()
+                    schedule()
+                    yield last_page
+            finally:
+                for task in in_flight:
+                    task.cancel()
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+            # Records added while crawling push the rest back by a few rows: keep going
+            # while pages come back full instead of trusting the first count
+            skip = last_page.skip + page_size
+            while len(last_page.records) >= page_size:
+                last_page = await self.fetch_page(client, skip)
+                if not last_page.records:
+                    break
+                yield last_page
+                skip += page_size
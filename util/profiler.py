@@ -0,0 +1,142 @@
+import cProfile
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Where signal-triggered profiles and slow-request cProfile dumps are written
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp")
+PROFILE_SIGNAL_SECONDS = float(os.environ.get("PROFILE_SIGNAL_SECONDS", "30"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+# cProfile requests slower than this (unset = off). PROFILE_SLOW_REQUESTS_SAMPLE_RATE
+# limits how many requests run under cProfile at all, since it slows them down.
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", "0"))
+PROFILE_SLOW_REQUESTS_SAMPLE_RATE = float(os.environ.get("PROFILE_SLOW_REQUESTS_SAMPLE_RATE", "0.01"))
+
+# Only one sampling run per process at a time
+_sampling_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, interval_ms: float = PROFILE_INTERVAL_MS) -> str:
+    """
+    Sample the stacks of every thread in this process for `seconds`.
+
+    Returns collapsed stacks ("thread;outer;...;inner count" per line), the input
+    format of flamegraph.pl and speedscope. Runs on the calling thread, so call
+    it from a worker thread to profile the event loop. Raises RuntimeError if
+    another sampling run is in progress.
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already being recorded")
+    try:
+        own_thread = threading.get_ident()
+        interval = max(0.001, interval_ms / 1000)
+        stacks: Dict[str, int] = Counter()
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+    finally:
+        _sampling_lock.release()
+
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def _write_profile(suffix: str, content) -> str:
+    path = os.path.join(PROFILE_DIR, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.{suffix}")
+    if isinstance(content, cProfile.Profile):
+        content.dump_stats(path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    return path
+
+
+def install_profile_signal_handler(signum: int = signal.SIGUSR2):
+    """
+    `kill -USR2 <worker pid>` samples that process for PROFILE_SIGNAL_SECONDS and
+    writes the collapsed stacks to PROFILE_DIR. Nothing runs until the signal arrives.
+
+    Must be called in the serving process itself (e.g. from a startup hook), since
+    gunicorn resets signal handlers in forked workers.
+    """
+    def record():
+        try:
+            path = _write_profile("collapsed", sample_stacks(PROFILE_SIGNAL_SECONDS))
+            logger.info(f"Profile written to {path}")
+        except RuntimeError as e:
+            logger.warning(f"Profile not recorded: {e}")
+
+    def handler(signum, frame):
+        # Signal handlers run on the main thread between bytecodes; do the work elsewhere
+        threading.Thread(target=record, name="profiler", daemon=True).start()
+
+    try:
+        signal.signal(signum, handler)
+    except ValueError:
+        pass  # Not on the main thread (e.g. under a test client); the endpoint still works
+
+
+class SlowRequestProfiler:
+    """
+    ASGI middleware that runs a sample of requests under cProfile and keeps the
+    profile (as .pstats in PROFILE_DIR) of those slower than threshold_ms.
+
+    cProfile sees every coroutine the event loop runs while the request is in
+    flight, so the profile can include other requests' work. Only one request
+    is profiled at a time. Add it only when PROFILE_SLOW_REQUESTS_MS is set.
+    """
+
+    def __init__(self, app, threshold_ms: float = PROFILE_SLOW_REQUESTS_MS,
+                 sample_rate: float = PROFILE_SLOW_REQUESTS_SAMPLE_RATE):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+        self.every = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+        self._count = 0
+        self._active = False
+
+    async def __call__(self, scope, receive, send):
+        self._count += 1
+        if scope["type"] != "http" or not self.every or self._active or self._count % self.every:
+            await self.app(scope, receive, send)
+            return
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active (e.g. a debugger); serve the request unprofiled
+            await self.app(scope, receive, send)
+            return
+        self._active = True
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.disable()
+            self._active = False
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold:
+                path = _write_profile("pstats", profile)
+                logger.warning(f"Slow request {scope['method']} {scope['path']} ({elapsed * 1000:.0f} ms), profile written to {path}")
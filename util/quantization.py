@@ -0,0 +1,52 @@
+from typing import Optional
+
+import numpy as np
+
+QUANTIZATION_KINDS = ("none", "float16", "int8")
+
+
+class QuantizedMatrix:
+    """
+    Reduced-precision copy of an embedding matrix for first-pass similarity scans.
+
+    float16 halves the memory; int8 stores one signed byte per value with a
+    per-dimension scale (max |value| / 127), a quarter of float32. Scores are
+    approximate and should be rescored against the full-precision vectors.
+    """
+
+    def __init__(self, kind: str, codes: np.ndarray, scale: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, kind: str) -> "QuantizedMatrix":
+        if kind == "float16":
+            return cls(kind, matrix.astype(np.float16))
+        if kind == "int8":
+            scale = np.abs(matrix).max(axis=0) / 127.0
+            scale[scale == 0] = 1.0
+            codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+            return cls(kind, codes, scale.astype(np.float32))
+        raise ValueError(f"Unknown quantization '{kind}', expected one of {QUANTIZATION_KINDS[1:]}")
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    def dequantize(self, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self.codes if rows is None else self.codes[rows]
+        values = codes.astype(np.float32)
+        return values * self.scale if self.scale is not None else values
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None, chunk_size: int = 256) -> np.ndarray:
+        """Approximate dot products with the query, for all rows or the given row ids."""
+        # Folding the int8 scale into the query avoids rescaling the whole matrix
+        query = (query * self.scale if self.scale is not None else query).astype(np.float32)
+        codes = self.codes if rows is None else self.codes[rows]
+
+        # NumPy has no BLAS path for float16/int8, so upcast small cache-friendly chunks
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), chunk_size):
+            scores[start:start + chunk_size] = codes[start:start + chunk_size].astype(np.float32) @ query
+        return scores
@@ -1,16 +1,91 @@
+import asyncio
+import logging
 from functools import lru_cache
-from supabase import create_client, Client
+from typing import Dict, Optional
+
+import httpx
+from supabase import create_client, Client, acreate_client, AsyncClient, AsyncClientOptions
 from dotenv import load_dotenv
 import os
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()  # loads .env into environ
 url: str = os.environ.get("SUPABASE_URL")
 key: str = os.environ.get("SUPABASE_KEY")
 
+# Shared HTTP connection pool for the async clients
+SUPABASE_TIMEOUT_SECONDS = float(os.environ.get("SUPABASE_TIMEOUT_SECONDS", "10"))
+SUPABASE_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("SUPABASE_CONNECT_TIMEOUT_SECONDS", "3"))
+SUPABASE_MAX_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_CONNECTIONS", "50"))
+SUPABASE_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("SUPABASE_MAX_KEEPALIVE_CONNECTIONS", "20"))
+
+_http_client: Optional[httpx.AsyncClient] = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_async_clients: Dict[str, AsyncClient] = {}
+
 @lru_cache(maxsize=1)
 def get_supabase_client() -> Client:
-        print("Supabase Client created once with singleton")
+        logger.info("Supabase Client created once with singleton")
         try:
             return create_client(url, key)
         except Exception as e:
              raise RuntimeError(f"Failed to create Supabase Client {e}")
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """One keep-alive connection pool per event loop, shared by every async Supabase client."""
+    global _http_client, _http_client_loop
+
+    loop = asyncio.get_running_loop()
+    # Pooled connections belong to the loop that opened them
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(SUPABASE_TIMEOUT_SECONDS, connect=SUPABASE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30,
+            ),
+            http2=True,
+            follow_redirects=True,
+        )
+        _http_client_loop = loop
+        _async_clients.clear()
+    return _http_client
+
+
+async def get_async_supabase_client(api_key: Optional[str] = None, name: str = "default") -> AsyncClient:
+    """
+    Async Supabase client on the shared connection pool, created once per name.
+
+    Use a separate name for clients that sign users in, since the client keeps
+    the signed-in session and would otherwise send it with later queries.
+    """
+    http_client = get_async_http_client()
+    client = _async_clients.get(name)
+    if client is None:
+        logger.info(f"Async Supabase Client '{name}' created")
+        try:
+            client = await acreate_client(
+                url,
+                api_key or key,
+                options=AsyncClientOptions(
+                    httpx_client=http_client,
+                    auto_refresh_token=False,
+                    persist_session=False,
+                ),
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to create async Supabase Client {e}")
+        _async_clients[name] = client
+    return client
+
+
+async def close_async_supabase_clients():
+    """Close the shared connection pool (on app shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    _async_clients.clear()